@@ -1,21 +1,21 @@
+import os
+
 from flask import Flask, session
 from flask_migrate import Migrate
 from models import db, EmployeeInfo
-from config import Config
+from config import Config, config
 from routes.dashboard import dashboard_bp
 from routes.basic_info import basic_bp
 from routes.inventory_mgmt import inventory_bp
 from routes.sales_mgmt import sales_bp
 
 from routes.auth import auth_bp
+from services.scheduler import start_scheduler
+from services import admission, fragment_cache, http_cache, live_feed, pos_ingest, replica, sqlite_profile
 
-app = Flask(__name__)
-app.config.from_object(Config)
+migrate = Migrate()
 
-db.init_app(app)
-migrate = Migrate(app, db)
 
-@app.context_processor
 def inject_current_employee():
     """向所有模板注入当前登录员工信息"""
     employee = None
@@ -23,12 +23,40 @@ def inject_current_employee():
         employee = EmployeeInfo.query.get(session['employee_id'])
     return dict(current_employee=employee)
 
-# 注册蓝图
-app.register_blueprint(dashboard_bp)
-app.register_blueprint(basic_bp)
-app.register_blueprint(inventory_bp)
-app.register_blueprint(sales_bp)
-app.register_blueprint(auth_bp)
+
+def create_app(config_class=Config, **overrides):
+    """应用工厂：按配置类创建应用，overrides 可覆盖单项配置（如数据库地址）"""
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    app.config.update(overrides)
+
+    replica.init_app(app)  # 只读副本注册为 binds，需在 db.init_app 之前
+    db.init_app(app)
+    sqlite_profile.init_app(app)  # SQLITE_PROFILE 开启时配置 WAL、PRAGMA 与单写者
+    migrate.init_app(app, db)
+    admission.init_app(app)  # 按视图类别准入，需最先注册 before_request
+
+    app.context_processor(inject_current_employee)
+    fragment_cache.init_app(app)  # {% cache %} 片段缓存标签与模板字节码缓存
+    http_cache.init_app(app)  # 文本响应 gzip 压缩
+    live_feed.init_app(app)  # 仪表盘 SSE 实时推送
+    pos_ingest.init_app(app)  # 收银终端提交的组提交线程
+
+    # 注册蓝图
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(basic_bp)
+    app.register_blueprint(inventory_bp)
+    app.register_blueprint(sales_bp)
+    app.register_blueprint(auth_bp)
+
+    # 进程内夜间日结调度（也可改用 cron 运行 python -m tools.nightly_close）
+    if app.config.get('SCHEDULER_ENABLED'):
+        start_scheduler(app)
+    return app
+
+
+# APP_CONFIG 选择 config.config 中的配置（如 sqlite），未设置时使用 Config
+app = create_app(config.get(os.environ.get('APP_CONFIG'), Config))
 
 from models import init_basic_tables
 
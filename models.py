@@ -10,8 +10,27 @@ def log_system_action(employee_id, action_type, table_name, action_content):
     db.session.add(log)
     db.session.commit()
 def init_basic_tables():
-    """初始化基础表数据（角色、权限、角色权限、用户角色、系统管理员）"""
-    from sqlalchemy.exc import IntegrityError
+    """初始化基础表数据（角色、权限、角色权限、用户角色、系统管理员）
+
+    可重复执行：每张表一次查询取出已有的键，只批量插入缺少的行，
+    系统日志在最后一次性写入，与数据一起在同一事务内提交。
+    """
+    from sqlalchemy import insert, select
+    now = datetime.now()
+    logs = []
+
+    def log(employee_id, table_name, content):
+        logs.append({'employee_id': employee_id, 'action_type': 'insert', 'table_name': table_name,
+                     'action_content': json.dumps(content, ensure_ascii=False), 'action_time': now})
+
+    def insert_missing(model, key, rows):
+        existing = set(db.session.scalars(select(getattr(model, key))))
+        missing = [row for row in rows if row[key] not in existing]
+        if missing:
+            db.session.execute(insert(model), missing)
+            for row in missing:
+                log(None, model.__tablename__, row)
+
     # 1. 初始化权限
     default_permissions = [
         {'name': '系统管理', 'description': '系统管理权限'},
@@ -22,78 +41,63 @@ def init_basic_tables():
         {'name': '供应商管理', 'description': '供应商信息管理'},
         {'name': '财务统计', 'description': '财务统计查看'},
     ]
-    for perm in default_permissions:
-        if not Permission.query.filter_by(name=perm['name']).first():
-            db.session.add(Permission(**perm))
-            db.session.flush()
-            log_system_action(None, 'insert', 'permission', perm)
-    db.session.commit()
+    insert_missing(Permission, 'name', default_permissions)
 
     # 2. 初始化角色
     default_roles = [
         {'name': '系统管理员', 'description': '拥有全部权限'},
         {'name': '普通员工', 'description': '普通操作权限'},
     ]
-    for role in default_roles:
-        if not Role.query.filter_by(name=role['name']).first():
-            db.session.add(Role(**role))
-            db.session.flush()
-            log_system_action(None, 'insert', 'role', role)
-    db.session.commit()
+    insert_missing(Role, 'name', default_roles)
 
     # 3. 角色权限分配（系统管理员拥有全部权限，普通员工部分权限）
-    admin_role = Role.query.filter_by(name='系统管理员').first()
-    employee_role = Role.query.filter_by(name='普通员工').first()
-    all_permissions = Permission.query.all()
-    for perm in all_permissions:
-        if not RolePermission.query.filter_by(role_id=admin_role.role_id, permission_id=perm.permission_id).first():
-            db.session.add(RolePermission(role_id=admin_role.role_id, permission_id=perm.permission_id))
-            db.session.flush()
-            log_system_action(None, 'insert', 'role_permission', {'role_id': admin_role.role_id, 'permission_id': perm.permission_id})
-    # 普通员工只分配部分权限
-    for perm in all_permissions:
-        if perm.name in ['药品管理', '库存管理', '销售管理', '客户管理', '供应商管理']:
-            if not RolePermission.query.filter_by(role_id=employee_role.role_id, permission_id=perm.permission_id).first():
-                db.session.add(RolePermission(role_id=employee_role.role_id, permission_id=perm.permission_id))
-                db.session.flush()
-                log_system_action(None, 'insert', 'role_permission', {'role_id': employee_role.role_id, 'permission_id': perm.permission_id})
-    db.session.commit()
+    roles = dict(db.session.execute(select(Role.name, Role.role_id)).all())
+    permissions = db.session.execute(select(Permission.permission_id, Permission.name).
+                                     order_by(Permission.permission_id)).all()
+    admin_role_id, employee_role_id = roles['系统管理员'], roles['普通员工']
+    employee_permissions = {'药品管理', '库存管理', '销售管理', '客户管理', '供应商管理'}
+    wanted = [(admin_role_id, perm_id) for perm_id, _ in permissions]
+    wanted += [(employee_role_id, perm_id) for perm_id, name in permissions if name in employee_permissions]
+    existing = set(db.session.execute(select(RolePermission.role_id, RolePermission.permission_id)).all())
+    missing = [{'role_id': role_id, 'permission_id': perm_id}
+               for role_id, perm_id in wanted if (role_id, perm_id) not in existing]
+    if missing:
+        db.session.execute(insert(RolePermission), missing)
+        for row in missing:
+            log(None, 'role_permission', row)
 
     # 4. 初始化系统管理员账号
-    admin = EmployeeInfo.query.filter_by(account='admin').first()
-    if not admin:
-        admin = EmployeeInfo(
-            name='系统管理员',
-            account='admin',
-            password='admin123',
-            phone='13000000000',
-            department='管理',
-            position='系统管理员',
-            status='在职'
-        )
-        db.session.add(admin)
-        db.session.commit()
-        log_system_action(None, 'insert', 'employee_info', {
+    admin_id = db.session.scalar(select(EmployeeInfo.employee_id).where(EmployeeInfo.account == 'admin'))
+    if admin_id is None:
+        admin = {
             'name': '系统管理员',
             'account': 'admin',
             'phone': '13000000000',
             'department': '管理',
             'position': '系统管理员',
-            'status': '在职'
-        })
+            'status': '在职',
+        }
+        admin_id = db.session.execute(insert(EmployeeInfo).values(password='admin123', **admin)).\
+            inserted_primary_key[0]
+        log(None, 'employee_info', admin)
 
     # 5. 管理员分配角色
-    if not UserRole.query.filter_by(employee_id=admin.employee_id, role_id=admin_role.role_id).first():
-        db.session.add(UserRole(employee_id=admin.employee_id, role_id=admin_role.role_id))
-        db.session.commit()
-        log_system_action(admin.employee_id, 'insert', 'user_role', {'employee_id': admin.employee_id, 'role_id': admin_role.role_id})
+    if db.session.scalar(select(UserRole.id).where(UserRole.employee_id == admin_id,
+                                                   UserRole.role_id == admin_role_id)) is None:
+        db.session.execute(insert(UserRole).values(employee_id=admin_id, role_id=admin_role_id))
+        log(admin_id, 'user_role', {'employee_id': admin_id, 'role_id': admin_role_id})
 
-    # 6. 系统日志表可不插入默认数据
+    # 6. 系统日志表可不插入默认数据；以上初始化操作的日志一次写入
+    if logs:
+        db.session.execute(insert(SystemLog), logs)
+    db.session.commit()
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
-db = SQLAlchemy()
+from services.replica import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # 读写分离路由见 services.replica
 
 # 药品信息表
 class DrugInfo(db.Model):
@@ -114,6 +118,8 @@ class DrugInfo(db.Model):
     status = db.Column(db.String(20), default='在售', nullable=False)
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
     update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False, index=True)  # 软删除标记，False 表示已归档
+    deleted_time = db.Column(db.DateTime)  # 归档时间
 
 # 员工信息表
 class EmployeeInfo(db.Model):
@@ -132,6 +138,8 @@ class EmployeeInfo(db.Model):
     status = db.Column(db.String(20), default='在职', nullable=False)
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
     update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False, index=True)  # 软删除标记，False 表示已归档
+    deleted_time = db.Column(db.DateTime)  # 归档时间
 
 # 客户信息表
 class CustomerInfo(db.Model):
@@ -147,6 +155,8 @@ class CustomerInfo(db.Model):
     address = db.Column(db.String(200))
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
     update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False, index=True)  # 软删除标记，False 表示已归档
+    deleted_time = db.Column(db.DateTime)  # 归档时间
 
 # 供应商信息表
 class SupplierInfo(db.Model):
@@ -159,6 +169,8 @@ class SupplierInfo(db.Model):
     qualification_no = db.Column(db.String(100), unique=True, index=True)
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
     update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False, index=True)  # 软删除标记，False 表示已归档
+    deleted_time = db.Column(db.DateTime)  # 归档时间
 
 # 权限表
 class Permission(db.Model):
@@ -216,6 +228,7 @@ class StockIn(db.Model):
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier_info.supplier_id', ondelete='CASCADE'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     stock_in_date = db.Column(db.Date, nullable=False)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouse.warehouse_id', ondelete='SET NULL'), index=True)  # 入库仓库
     employee_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
     remark = db.Column(db.String(200))
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
@@ -243,6 +256,7 @@ class Warehouse(db.Model):
     address = db.Column(db.String(200))
     manager_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
 
 # 库存盘点表
 class InventoryCheck(db.Model):
@@ -257,6 +271,57 @@ class InventoryCheck(db.Model):
     employee_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
 
+# 批量盘点单（整仓盘点）
+class StocktakeSession(db.Model):
+    __tablename__ = 'stocktake_session'
+    session_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouse.warehouse_id', ondelete='CASCADE'), nullable=False, index=True)
+    check_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), default='进行中', nullable=False, index=True)  # 进行中/已完成/已取消
+    item_count = db.Column(db.Integer, default=0, nullable=False)  # 冻结的库存行数
+    counted_count = db.Column(db.Integer, default=0, nullable=False)  # 完成时已录入实盘数的行数
+    diff_count = db.Column(db.Integer, default=0, nullable=False)  # 完成时存在差异的行数
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
+    create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    finish_time = db.Column(db.DateTime)
+
+# 批量盘点明细：开单时冻结的账面数量与录入的实盘数量
+class StocktakeItem(db.Model):
+    __tablename__ = 'stocktake_item'
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'drug_id', name='uq_stocktake_item_drug'),
+    )
+    item_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('stocktake_session.session_id', ondelete='CASCADE'), nullable=False)
+    drug_id = db.Column(db.Integer, db.ForeignKey('drug_info.drug_id', ondelete='CASCADE'), nullable=False)
+    expected_quantity = db.Column(db.Integer, nullable=False)  # 开单时的账面数量
+    counted_quantity = db.Column(db.Integer)  # 实盘数量，未录入为空
+    diff_reason = db.Column(db.String(200))
+
+# 调拨单（仓库间移库）
+class StockTransfer(db.Model):
+    __tablename__ = 'stock_transfer'
+    transfer_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    from_warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouse.warehouse_id', ondelete='CASCADE'), nullable=False, index=True)
+    to_warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouse.warehouse_id', ondelete='CASCADE'), nullable=False, index=True)
+    transfer_date = db.Column(db.Date, nullable=False, index=True)
+    line_count = db.Column(db.Integer, default=0, nullable=False)
+    total_quantity = db.Column(db.Integer, default=0, nullable=False)
+    remark = db.Column(db.String(200))
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
+    create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+# 调拨明细
+class StockTransferItem(db.Model):
+    __tablename__ = 'stock_transfer_item'
+    __table_args__ = (
+        db.UniqueConstraint('transfer_id', 'drug_id', name='uq_stock_transfer_item_drug'),
+    )
+    item_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    transfer_id = db.Column(db.Integer, db.ForeignKey('stock_transfer.transfer_id', ondelete='CASCADE'), nullable=False)
+    drug_id = db.Column(db.Integer, db.ForeignKey('drug_info.drug_id', ondelete='CASCADE'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+
 # 退货处理表
 class ReturnStock(db.Model):
     __tablename__ = 'return_stock'
@@ -266,28 +331,42 @@ class ReturnStock(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     reason = db.Column(db.String(200))
     return_date = db.Column(db.Date, nullable=False, index=True)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouse.warehouse_id', ondelete='SET NULL'), index=True)  # 出库仓库
     employee_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
 
 # 销售登记表
 class Sales(db.Model):
     __tablename__ = 'sales'
+    __table_args__ = (
+        db.Index('ix_sales_date_amount', 'sales_date', 'quantity', 'unit_price', 'unit_cost'),  # 覆盖按日期的金额聚合
+    )
     sales_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     drug_id = db.Column(db.Integer, db.ForeignKey('drug_info.drug_id', ondelete='CASCADE'), nullable=False, index=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer_info.customer_id', ondelete='CASCADE'), nullable=False, index=True)
+    customer_type = db.Column(db.String(20), nullable=False)  # 销售时的客户类型（零售/批发），之后客户改类型不影响历史
     quantity = db.Column(db.Integer, nullable=False)
-    sales_date = db.Column(db.Date, nullable=False, index=True)
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False)  # 成交单价（销售时的售价）
+    unit_cost = db.Column(db.Numeric(10, 2), nullable=False)  # 成本单价（销售时的进价）
+    sales_date = db.Column(db.Date, nullable=False)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouse.warehouse_id', ondelete='SET NULL'), index=True)  # 出库仓库
     employee_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
 
 # 销售退货表
 class SalesReturn(db.Model):
     __tablename__ = 'sales_return'
+    __table_args__ = (
+        db.Index('ix_sales_return_date_amount', 'return_date', 'quantity', 'unit_price', 'unit_cost'),  # 覆盖按日期的金额聚合
+    )
     sales_return_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     sales_id = db.Column(db.Integer, db.ForeignKey('sales.sales_id', ondelete='CASCADE'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False)  # 退款单价（取原销售单价）
+    unit_cost = db.Column(db.Numeric(10, 2), nullable=False)  # 成本单价（取原销售成本）
     reason = db.Column(db.String(200))
-    return_date = db.Column(db.Date, nullable=False, index=True)
+    return_date = db.Column(db.Date, nullable=False)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouse.warehouse_id', ondelete='SET NULL'), index=True)  # 回补库存的仓库
     employee_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
 
@@ -305,3 +384,172 @@ class FinanceStat(db.Model):
     total_profit = db.Column(db.Numeric(15, 2), default=0, nullable=False)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
     create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+# 销售多维汇总表（日粒度，销售与退货按维度预聚合）
+class SalesCubeDaily(db.Model):
+    __tablename__ = 'sales_cube_daily'
+    __table_args__ = (
+        db.UniqueConstraint('stat_date', 'drug_id', 'customer_type', 'employee_id', 'warehouse_id',
+                            name='uq_sales_cube_bucket'),
+        db.Index('ix_sales_cube_customer_type', 'customer_type', 'stat_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    stat_date = db.Column(db.Date, nullable=False)
+    drug_id = db.Column(db.Integer, nullable=False, index=True)
+    customer_type = db.Column(db.String(20), nullable=False)  # 零售/批发（销售时）
+    employee_id = db.Column(db.Integer, nullable=False, default=0)  # 经办人，0表示未知
+    warehouse_id = db.Column(db.Integer, nullable=False, default=0)  # 出库仓库，0表示未知
+    sales_count = db.Column(db.Integer, default=0, nullable=False)
+    quantity = db.Column(db.Integer, default=0, nullable=False)
+    amount = db.Column(db.Numeric(15, 2), default=0, nullable=False)
+    cost = db.Column(db.Numeric(15, 2), default=0, nullable=False)
+    return_quantity = db.Column(db.Integer, default=0, nullable=False)
+    return_amount = db.Column(db.Numeric(15, 2), default=0, nullable=False)
+    return_cost = db.Column(db.Numeric(15, 2), default=0, nullable=False)
+
+# 后台任务表
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_job'
+    __table_args__ = (
+        db.UniqueConstraint('dedupe_key', name='uq_job_dedupe_key'),
+    )
+    job_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_type = db.Column(db.String(50), nullable=False, index=True)
+    job_key = db.Column(db.String(200), nullable=False, index=True)
+    dedupe_key = db.Column(db.String(200))  # 排队/运行中等于job_key，结束后置空，用于合并重复任务
+    params = db.Column(db.Text)  # json字符串
+    status = db.Column(db.String(20), default='排队中', nullable=False, index=True)  # 排队中/运行中/已完成/失败
+    progress = db.Column(db.Integer, default=0, nullable=False)
+    total = db.Column(db.Integer, default=0, nullable=False)
+    message = db.Column(db.String(500))
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee_info.employee_id', ondelete='SET NULL'))
+    create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    start_time = db.Column(db.DateTime)
+    finish_time = db.Column(db.DateTime)
+
+# 收银终端提交记录表：按 (终端, 幂等键) 去重，终端重发同一笔交易时返回首次入账的记录
+class PosTransaction(db.Model):
+    __tablename__ = 'pos_transaction'
+    __table_args__ = (
+        db.UniqueConstraint('terminal_id', 'idempotency_key', name='uq_pos_terminal_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    terminal_id = db.Column(db.String(50), nullable=False)
+    idempotency_key = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # sale / return
+    record_id = db.Column(db.Integer, nullable=False)  # sales_id 或 sales_return_id
+    create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+# 客户 RFM 分析表：每位有购买记录的客户一行，由客户分析任务增量维护
+class CustomerRfm(db.Model):
+    __tablename__ = 'customer_rfm'
+    __table_args__ = (
+        db.Index('ix_customer_rfm_segment', 'customer_type', 'segment'),
+        db.Index('ix_customer_rfm_score', 'customer_type', 'r_score', 'f_score', 'm_score'),
+    )
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer_info.customer_id', ondelete='CASCADE'), primary_key=True)
+    customer_type = db.Column(db.String(20), nullable=False)  # 零售/批发，评分在同类客户内计算
+    first_purchase = db.Column(db.Date, nullable=False)
+    last_purchase = db.Column(db.Date, nullable=False)
+    frequency = db.Column(db.Integer, nullable=False)  # 购买笔数
+    monetary = db.Column(db.Numeric(15, 2), nullable=False)  # 净消费额（销售-退货）
+    avg_interval_days = db.Column(db.Numeric(10, 2))  # 平均购买间隔（天），只购买过一次为空
+    r_score = db.Column(db.SmallInteger, nullable=False)  # 1~5，越近越高
+    f_score = db.Column(db.SmallInteger, nullable=False)
+    m_score = db.Column(db.SmallInteger, nullable=False)
+    segment = db.Column(db.String(20), nullable=False)
+    update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+# 客户分析运行记录表：每次运行一行，最新一行的水位之后的销售/退货为下次增量
+class CustomerRfmRun(db.Model):
+    __tablename__ = 'customer_rfm_run'
+    run_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    last_sales_id = db.Column(db.Integer, nullable=False)
+    last_return_id = db.Column(db.Integer, nullable=False)
+    full = db.Column(db.Boolean, default=False, nullable=False)  # 是否全量重算
+    customers = db.Column(db.Integer, nullable=False)  # 分析表客户总数
+    changed = db.Column(db.Integer, nullable=False)  # 本次写入（新增或变化）的行数
+    seconds = db.Column(db.Float, nullable=False)
+    create_time = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+# ==================== 冷存储（历史明细分层） ====================
+# 归档表结构与在线表相同、主键沿用原值，不设外键：主数据清理后历史明细仍可查询
+
+# 销售登记归档表
+class SalesArchive(db.Model):
+    __tablename__ = 'sales_archive'
+    sales_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    drug_id = db.Column(db.Integer, nullable=False, index=True)
+    customer_id = db.Column(db.Integer, nullable=False, index=True)
+    customer_type = db.Column(db.String(20), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False)
+    unit_cost = db.Column(db.Numeric(10, 2), nullable=False)
+    sales_date = db.Column(db.Date, nullable=False, index=True)
+    warehouse_id = db.Column(db.Integer)
+    employee_id = db.Column(db.Integer)
+    create_time = db.Column(db.DateTime, nullable=False)
+
+# 销售退货归档表
+class SalesReturnArchive(db.Model):
+    __tablename__ = 'sales_return_archive'
+    sales_return_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sales_id = db.Column(db.Integer, nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False)
+    unit_cost = db.Column(db.Numeric(10, 2), nullable=False)
+    reason = db.Column(db.String(200))
+    return_date = db.Column(db.Date, nullable=False, index=True)
+    warehouse_id = db.Column(db.Integer)
+    employee_id = db.Column(db.Integer)
+    create_time = db.Column(db.DateTime, nullable=False)
+
+# 入库登记归档表
+class StockInArchive(db.Model):
+    __tablename__ = 'stock_in_archive'
+    stock_in_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    drug_id = db.Column(db.Integer, nullable=False, index=True)
+    supplier_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    stock_in_date = db.Column(db.Date, nullable=False, index=True)
+    warehouse_id = db.Column(db.Integer)
+    employee_id = db.Column(db.Integer)
+    remark = db.Column(db.String(200))
+    create_time = db.Column(db.DateTime, nullable=False)
+
+# 退货处理归档表
+class ReturnStockArchive(db.Model):
+    __tablename__ = 'return_stock_archive'
+    return_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    drug_id = db.Column(db.Integer, nullable=False, index=True)
+    supplier_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(200))
+    return_date = db.Column(db.Date, nullable=False, index=True)
+    warehouse_id = db.Column(db.Integer)
+    employee_id = db.Column(db.Integer)
+    create_time = db.Column(db.DateTime, nullable=False)
+
+# 进退货日汇总表（冷存储转移时按 日期 × 药品 × 供应商 汇总转出的入库/退货明细）
+class StockFlowDaily(db.Model):
+    __tablename__ = 'stock_flow_daily'
+    __table_args__ = (
+        db.UniqueConstraint('stat_date', 'drug_id', 'supplier_id', name='uq_stock_flow_bucket'),
+        db.Index('ix_stock_flow_drug_supplier', 'drug_id', 'supplier_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    stat_date = db.Column(db.Date, nullable=False)
+    drug_id = db.Column(db.Integer, nullable=False)
+    supplier_id = db.Column(db.Integer, nullable=False)
+    stock_in_count = db.Column(db.Integer, default=0, nullable=False)
+    stock_in_quantity = db.Column(db.Integer, default=0, nullable=False)
+    return_count = db.Column(db.Integer, default=0, nullable=False)
+    return_quantity = db.Column(db.Integer, default=0, nullable=False)
+
+# 冷热分界表：每张在线表一行，早于 cold_before 的明细可能已转入归档表
+class DataTier(db.Model):
+    __tablename__ = 'data_tier'
+    table_name = db.Column(db.String(50), primary_key=True)
+    cold_before = db.Column(db.Date, nullable=False)
+    archived_rows = db.Column(db.Integer, default=0, nullable=False)
+    update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
@@ -1,16 +1,45 @@
-from flask import Blueprint, session, redirect, url_for, render_template, request
+from flask import Blueprint, session, redirect, url_for, render_template, request, flash, jsonify
+from sqlalchemy import or_
 from models import EmployeeInfo
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+# 员工搜索接口单次最多返回的条数
+EMPLOYEE_SEARCH_MAX_LIMIT = 50
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
-    employees = EmployeeInfo.query.all()
     if request.method == 'POST':
-        employee_id = int(request.form['employee_id'])
-        session['employee_id'] = employee_id
+        # 按唯一账号单次索引查找，不再加载全部员工
+        account = (request.form.get('account') or '').strip()
+        employee = EmployeeInfo.query.filter_by(account=account, is_active=True).first() if account else None
+        if not employee:
+            flash('账号不存在，请检查后重试！', 'danger')
+            return redirect(url_for('auth.login', next=request.args.get('next')))
+        session['employee_id'] = employee.employee_id
         return redirect(request.args.get('next') or url_for('dashboard.index'))
-    return render_template('login.html', employees=employees, current_id=session.get('employee_id'))
+    return render_template('login.html')
+
+@auth_bp.route('/employees/search')
+def employee_search():
+    """员工选择器搜索接口（按账号/姓名前缀匹配，限制返回条数）"""
+    keyword = (request.args.get('q') or '').strip()
+    limit = request.args.get('limit', 20, type=int)
+    limit = max(1, min(limit, EMPLOYEE_SEARCH_MAX_LIMIT))
+    query = EmployeeInfo.query.with_entities(
+        EmployeeInfo.employee_id, EmployeeInfo.name, EmployeeInfo.account
+    ).filter(EmployeeInfo.is_active.is_(True))
+    if keyword:
+        # 前缀匹配可以利用 account / name 上的索引
+        query = query.filter(or_(
+            EmployeeInfo.account.startswith(keyword, autoescape=True),
+            EmployeeInfo.name.startswith(keyword, autoescape=True)
+        ))
+    rows = query.order_by(EmployeeInfo.account).limit(limit).all()
+    return jsonify([
+        {'employee_id': row.employee_id, 'name': row.name, 'account': row.account}
+        for row in rows
+    ])
 
 @auth_bp.route('/logout')
 def logout():
@@ -2,17 +2,44 @@
 基础信息管理模块路由
 包括：药品、员工、客户、供应商管理
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
-from models import db, DrugInfo, EmployeeInfo, CustomerInfo, SupplierInfo, Role, UserRole, log_system_action
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, current_app, abort
+from models import db, DrugInfo, EmployeeInfo, CustomerInfo, SupplierInfo, Role, UserRole, BackgroundJob, log_system_action
 from datetime import datetime
+from services.cache import REFERENCE_CACHE, DASHBOARD_CACHE, invalidate
+from services.http_cache import conditional, tables_version
+from services.archive import ARCHIVABLE, archive, restore
+from services.jobs import enqueue
+from services.search_index import index_record, remove_record, search as search_records, ENTITIES as SEARCH_ENTITIES
 
 basic_bp = Blueprint('basic', __name__, url_prefix='/basic')
 
+# ==================== 全文检索 ====================
+SEARCH_MAX_LIMIT = 50
+SEARCH_URLS = {
+    'drug': ('basic.drug_edit', 'drug_id'),
+    'customer': ('basic.customer_edit', 'customer_id'),
+    'supplier': ('basic.supplier_edit', 'supplier_id'),
+}
+
+@basic_bp.route('/search')
+def search():
+    """药品/客户/供应商检索（READ，JSON）：?q=关键字或拼音首字母&types=drug,customer&limit=20"""
+    q = request.args.get('q', '').strip()
+    types = [t for t in request.args.get('types', '').split(',') if t in SEARCH_ENTITIES] or None
+    limit = max(1, min(request.args.get('limit', 20, type=int), SEARCH_MAX_LIMIT))
+    results = []
+    for score, entity, pk, name, subtitle in search_records(q, types, limit, current_app.config.get('SEARCH_REFRESH_SECONDS', 30)):
+        endpoint, arg = SEARCH_URLS[entity]
+        results.append({'type': entity, 'id': pk, 'name': name, 'subtitle': subtitle, 'score': score,
+                        'url': url_for(endpoint, **{arg: pk})})
+    return jsonify({'q': q, 'results': results})
+
 # ==================== 药品管理 ====================
 @basic_bp.route('/drugs')
+@conditional(lambda: tables_version(DrugInfo))
 def drug_list():
     """药品列表"""
-    drugs = DrugInfo.query.all()
+    drugs = DrugInfo.query.filter_by(is_active=True).all()
     return render_template('basic/drug_list.html', drugs=drugs)
 
 @basic_bp.route('/drugs/add', methods=['GET', 'POST'])
@@ -36,6 +63,8 @@ def drug_add():
         # 数据库执行：写入药品表
         db.session.add(drug)
         db.session.commit()
+        invalidate(REFERENCE_CACHE, DASHBOARD_CACHE)
+        index_record('drug', drug)
         # 操作日志
         log_system_action(session.get('employee_id'), 'insert', 'drug_info', {
             'drug_id': drug.drug_id,
@@ -65,6 +94,8 @@ def drug_edit(drug_id):
         drug.update_time = datetime.now()
         # 数据库执行：提交更新
         db.session.commit()
+        invalidate(REFERENCE_CACHE, DASHBOARD_CACHE)  # 报表按销售时记录的单价计算，调价不影响报表缓存
+        index_record('drug', drug)
         # 操作日志
         log_system_action(session.get('employee_id'), 'update', 'drug_info', {
             'drug_id': drug.drug_id,
@@ -78,22 +109,25 @@ def drug_edit(drug_id):
 def drug_delete(drug_id):
     """删除药品（DELETE）"""
     drug = DrugInfo.query.get_or_404(drug_id)
-    # 数据库执行：删除记录
-    db.session.delete(drug)
+    # 数据库执行：软删除（归档），销售、入库等历史记录保留
+    archive(drug)
     db.session.commit()
+    invalidate(REFERENCE_CACHE, DASHBOARD_CACHE)
+    remove_record('drug', drug.drug_id)
     # 操作日志
     log_system_action(session.get('employee_id'), 'delete', 'drug_info', {
         'drug_id': drug.drug_id,
         'name': drug.name
     })
-    flash('药品删除成功！', 'success')
+    flash('药品已归档，历史记录保留，可在归档管理中恢复。', 'success')
     return redirect(url_for('basic.drug_list'))
 
 # ==================== 员工管理 ====================
 @basic_bp.route('/employees')
+@conditional(lambda: tables_version(EmployeeInfo))
 def employee_list():
     """员工列表（READ）"""
-    employees = EmployeeInfo.query.all()
+    employees = EmployeeInfo.query.filter_by(is_active=True).all()
     return render_template('basic/employee_list.html', employees=employees)
 
 @basic_bp.route('/employees/add', methods=['GET', 'POST'])
@@ -169,22 +203,23 @@ def employee_edit(employee_id):
 def employee_delete(employee_id):
     """删除员工（DELETE）"""
     employee = EmployeeInfo.query.get_or_404(employee_id)
-    # 数据库执行：删除记录
-    db.session.delete(employee)
+    # 数据库执行：软删除（归档），经办记录保留
+    archive(employee)
     db.session.commit()
     # 操作日志
     log_system_action(session.get('employee_id'), 'delete', 'employee_info', {
         'employee_id': employee.employee_id,
         'name': employee.name
     })
-    flash('员工删除成功！', 'success')
+    flash('员工已归档，可在归档管理中恢复。', 'success')
     return redirect(url_for('basic.employee_list'))
 
 # ==================== 客户管理 ====================
 @basic_bp.route('/customers')
+@conditional(lambda: tables_version(CustomerInfo))
 def customer_list():
     """客户列表（READ）"""
-    customers = CustomerInfo.query.all()
+    customers = CustomerInfo.query.filter_by(is_active=True).all()
     return render_template('basic/customer_list.html', customers=customers)
 
 @basic_bp.route('/customers/add', methods=['GET', 'POST'])
@@ -202,6 +237,8 @@ def customer_add():
         # 数据库执行：插入客户
         db.session.add(customer)
         db.session.commit()
+        invalidate(REFERENCE_CACHE)
+        index_record('customer', customer)
         # 操作日志
         log_system_action(session.get('employee_id'), 'insert', 'customer_info', {
             'customer_id': customer.customer_id,
@@ -225,6 +262,8 @@ def customer_edit(customer_id):
         customer.update_time = datetime.now()
         # 数据库执行：提交更新
         db.session.commit()
+        invalidate(REFERENCE_CACHE)
+        index_record('customer', customer)
         # 操作日志
         log_system_action(session.get('employee_id'), 'update', 'customer_info', {
             'customer_id': customer.customer_id,
@@ -238,22 +277,25 @@ def customer_edit(customer_id):
 def customer_delete(customer_id):
     """删除客户（DELETE）"""
     customer = CustomerInfo.query.get_or_404(customer_id)
-    # 数据库执行：删除记录
-    db.session.delete(customer)
+    # 数据库执行：软删除（归档），销售记录保留
+    archive(customer)
     db.session.commit()
+    invalidate(REFERENCE_CACHE)
+    remove_record('customer', customer.customer_id)
     # 操作日志
     log_system_action(session.get('employee_id'), 'delete', 'customer_info', {
         'customer_id': customer.customer_id,
         'name': customer.name
     })
-    flash('客户删除成功！', 'success')
+    flash('客户已归档，历史记录保留，可在归档管理中恢复。', 'success')
     return redirect(url_for('basic.customer_list'))
 
 # ==================== 供应商管理 ====================
 @basic_bp.route('/suppliers')
+@conditional(lambda: tables_version(SupplierInfo))
 def supplier_list():
     """供应商列表（READ）"""
-    suppliers = SupplierInfo.query.all()
+    suppliers = SupplierInfo.query.filter_by(is_active=True).all()
     return render_template('basic/supplier_list.html', suppliers=suppliers)
 
 @basic_bp.route('/suppliers/add', methods=['GET', 'POST'])
@@ -271,6 +313,8 @@ def supplier_add():
         # 数据库执行：插入供应商
         db.session.add(supplier)
         db.session.commit()
+        invalidate(REFERENCE_CACHE)
+        index_record('supplier', supplier)
         # 操作日志
         log_system_action(session.get('employee_id'), 'insert', 'supplier_info', {
             'supplier_id': supplier.supplier_id,
@@ -294,6 +338,8 @@ def supplier_edit(supplier_id):
         supplier.update_time = datetime.now()
         # 数据库执行：提交更新
         db.session.commit()
+        invalidate(REFERENCE_CACHE)
+        index_record('supplier', supplier)
         # 操作日志
         log_system_action(session.get('employee_id'), 'update', 'supplier_info', {
             'supplier_id': supplier.supplier_id,
@@ -307,13 +353,62 @@ def supplier_edit(supplier_id):
 def supplier_delete(supplier_id):
     """删除供应商（DELETE）"""
     supplier = SupplierInfo.query.get_or_404(supplier_id)
-    # 数据库执行：删除记录
-    db.session.delete(supplier)
+    # 数据库执行：软删除（归档），入库、退货记录保留
+    archive(supplier)
     db.session.commit()
+    invalidate(REFERENCE_CACHE)
+    remove_record('supplier', supplier.supplier_id)
     # 操作日志
     log_system_action(session.get('employee_id'), 'delete', 'supplier_info', {
         'supplier_id': supplier.supplier_id,
         'name': supplier.name
     })
-    flash('供应商删除成功！', 'success')
+    flash('供应商已归档，历史记录保留，可在归档管理中恢复。', 'success')
     return redirect(url_for('basic.supplier_list'))
+
+# ==================== 归档管理 ====================
+ARCHIVE_LABELS = {'drug': '药品', 'customer': '客户', 'supplier': '供应商', 'employee': '员工'}
+
+@basic_bp.route('/archive')
+def archive_list():
+    """已归档（软删除）的基础资料与清理任务（READ）"""
+    archived = {}
+    for entity, model in ARCHIVABLE.items():
+        pk = model.__table__.primary_key.columns.values()[0]
+        archived[entity] = db.session.query(pk.label('id'), model.name, model.deleted_time).\
+            filter(model.is_active.is_(False)).order_by(model.deleted_time.desc()).limit(200).all()
+    jobs = BackgroundJob.query.filter_by(job_type='purge_archived').\
+        order_by(BackgroundJob.job_id.desc()).limit(5).all()
+    return render_template('basic/archive_list.html', archived=archived, labels=ARCHIVE_LABELS, jobs=jobs)
+
+@basic_bp.route('/archive/<entity>/<int:record_id>/restore', methods=['POST'])
+def archive_restore(entity, record_id):
+    """恢复已归档的记录（UPDATE）"""
+    if entity not in ARCHIVABLE:
+        abort(404)
+    record = ARCHIVABLE[entity].query.get_or_404(record_id)
+    restore(record)
+    db.session.commit()
+    invalidate(REFERENCE_CACHE, DASHBOARD_CACHE)
+    if entity in SEARCH_ENTITIES:
+        index_record(entity, record)
+    log_system_action(session.get('employee_id'), 'update', ARCHIVABLE[entity].__tablename__, {
+        'id': record_id,
+        'name': record.name,
+        'action': 'restore'
+    })
+    flash(f'{ARCHIVE_LABELS[entity]}“{record.name}”已恢复。', 'success')
+    return redirect(url_for('basic.archive_list'))
+
+@basic_bp.route('/archive/purge', methods=['POST'])
+def archive_purge():
+    """提交后台任务，分批物理清理归档超过指定天数的记录（DELETE）"""
+    retention_days = request.form.get('retention_days', 30, type=int)
+    job, created = enqueue('purge_archived', 'purge_archived',
+                           params={'retention_days': retention_days},
+                           employee_id=session.get('employee_id'))
+    if created:
+        flash(f'已提交清理任务（任务 #{job.job_id}），将删除归档超过 {retention_days} 天的记录及其关联数据。', 'info')
+    else:
+        flash(f'清理任务正在执行（任务 #{job.job_id}），已合并本次请求。', 'info')
+    return redirect(url_for('basic.archive_list'))
@@ -1,12 +1,9 @@
 """
 数据分析和仪表盘模块
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, current_app
+from flask import Blueprint, Response, render_template, redirect, url_for, flash, current_app, jsonify
 from models import (
     db,
-    Sales,
-    DrugInfo,
-    Inventory,
     FinanceStat,
     EmployeeInfo,
     Permission,
@@ -14,90 +11,92 @@ from models import (
     RolePermission,
     UserRole,
     SystemLog,
-    init_basic_tables,
 )
-from datetime import datetime
-from sqlalchemy import func, extract
+from services.cache import REPORT_CACHE, REFERENCE_CACHE, DASHBOARD_CACHE, invalidate
+from services.snapshots import inventory_snapshot, sales_totals
+from services import admission, fixtures, live_feed
+from services.admission import admission_class
+from services.replica import replica_read
+from services.fragment_cache import FRAGMENT_CACHE, rbac_version, log_version
 import pathlib
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 @dashboard_bp.route('/')
+@replica_read
 def index():
     """仪表盘首页"""
-    # 今日销售额
-    today = datetime.now().date()
-    today_sales = db.session.query(func.sum(Sales.quantity * DrugInfo.sale_price)).\
-        join(DrugInfo, Sales.drug_id == DrugInfo.drug_id).\
-        filter(Sales.sales_date == today).scalar() or 0
-    
-    # 本月销售额
-    current_month = datetime.now()
-    month_sales = db.session.query(func.sum(Sales.quantity * DrugInfo.sale_price)).\
-        join(DrugInfo, Sales.drug_id == DrugInfo.drug_id).\
-        filter(extract('year', Sales.sales_date) == current_month.year).\
-        filter(extract('month', Sales.sales_date) == current_month.month).scalar() or 0
-    
-    # 库存总数
-    total_inventory = db.session.query(func.sum(Inventory.quantity)).scalar() or 0
-    
-    # 低库存药品数量（低于100）
-    low_stock_count = db.session.query(func.count(Inventory.inventory_id)).\
-        filter(Inventory.quantity < 100).scalar() or 0
-    
-    # 药品总数
-    total_drugs = db.session.query(func.count(DrugInfo.drug_id)).scalar() or 0
-    
-    # 低库存预警
-    low_stock_items = db.session.query(Inventory, DrugInfo.name, DrugInfo.unit).\
-        join(DrugInfo, Inventory.drug_id == DrugInfo.drug_id).\
-        filter(Inventory.quantity < 100).\
-        order_by(Inventory.quantity).limit(10).all()
-    
-    # 系统表概览
-    permissions = Permission.query.order_by(Permission.permission_id).all()
-    roles = Role.query.order_by(Role.role_id).all()
-    role_permissions = db.session.query(RolePermission, Role.name, Permission.name).\
-        join(Role, RolePermission.role_id == Role.role_id).\
-        join(Permission, RolePermission.permission_id == Permission.permission_id).\
-        order_by(RolePermission.id).all()
-    user_roles = db.session.query(UserRole, EmployeeInfo.name, Role.name).\
-        join(EmployeeInfo, UserRole.employee_id == EmployeeInfo.employee_id).\
-        join(Role, UserRole.role_id == Role.role_id).\
-        order_by(UserRole.id).all()
-    logs = SystemLog.query.order_by(SystemLog.action_time.desc()).limit(50).all()
+    # 今日、本月销售额
+    today_sales, month_sales = sales_totals()
 
+    # 库存总数、低库存数量（低于100）、药品总数、低库存预警：读取缓存快照
+    snapshot = inventory_snapshot()
+    
     return render_template('dashboard/index.html',
                          today_sales=today_sales,
                          month_sales=month_sales,
-                         total_inventory=total_inventory,
-                         low_stock_count=low_stock_count,
-                         total_drugs=total_drugs,
-                         low_stock_items=low_stock_items,
-                         permissions=permissions,
-                         roles=roles,
-                         role_permissions=role_permissions,
-                         user_roles=user_roles,
-                         logs=logs)
+                         total_inventory=snapshot['total_inventory'],
+                         low_stock_count=snapshot['low_stock_count'],
+                         total_drugs=snapshot['total_drugs'],
+                         low_stock_items=snapshot['low_stock_items'],
+                         rbac_version=rbac_version(),
+                         rbac_overview=_rbac_overview,
+                         log_version=log_version(),
+                         recent_logs=_recent_logs)
+
+
+@dashboard_bp.route('/dashboard/stream')
+@admission_class(None)  # 长连接，不占用准入容量
+def stream():
+    """仪表盘指标实时推送（text/event-stream），未启用时返回 404"""
+    if 'live_feed' not in current_app.extensions:
+        return Response(status=404)
+    keepalive = current_app.config.get('LIVE_FEED_KEEPALIVE_SECONDS', 15)
+    return Response(live_feed.stream(live_feed.get_feed(), keepalive), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@dashboard_bp.route('/admission/metrics')
+@admission_class(None)
+def admission_metrics():
+    """本 worker 进程各准入类别的执行中/排队数、拒绝数与排队等待时间（JSON），未启用时返回 404"""
+    controller = admission.get_controller()
+    if controller is None:
+        return Response(status=404)
+    return jsonify(controller.metrics())
+
+
+def _rbac_overview():
+    """系统表概览（权限、角色及关联），仅在仪表盘片段缓存未命中时查询"""
+    return {
+        'permissions': Permission.query.order_by(Permission.permission_id).all(),
+        'roles': Role.query.order_by(Role.role_id).all(),
+        'role_permissions': db.session.query(RolePermission, Role.name, Permission.name).
+        join(Role, RolePermission.role_id == Role.role_id).
+        join(Permission, RolePermission.permission_id == Permission.permission_id).
+        order_by(RolePermission.id).all(),
+        'user_roles': db.session.query(UserRole, EmployeeInfo.name, Role.name).
+        join(EmployeeInfo, UserRole.employee_id == EmployeeInfo.employee_id).
+        join(Role, UserRole.role_id == Role.role_id).
+        order_by(UserRole.id).all(),
+    }
+
+
+def _recent_logs():
+    """最近50条系统日志，仅在片段缓存未命中时查询"""
+    return SystemLog.query.order_by(SystemLog.action_time.desc()).limit(50).all()
 
 
 @dashboard_bp.route('/reset_db', methods=['POST'])
 def reset_db():
     """清空并重新初始化数据库，仅保留系统管理员"""
     try:
-        # 完整重建所有表，防止外键遗留
-        db.session.remove()
-        db.drop_all()
-        db.create_all()
-
-        # 初始化基础数据（含管理员账号）
-        init_basic_tables()
-
-        # 仅保留账号 admin 的系统管理员，删除其他员工
-        EmployeeInfo.query.filter(EmployeeInfo.account != 'admin').delete()
-        db.session.commit()
+        # 有快照时直接恢复（毫秒级），否则完整重建所有表、初始化基础数据（含管理员账号）并保存快照
+        restored, seconds = fixtures.reset()
+        invalidate(REPORT_CACHE, REFERENCE_CACHE, DASHBOARD_CACHE, FRAGMENT_CACHE)
 
-        flash('数据库已重建，已恢复基础数据并仅保留系统管理员。', 'success')
+        how = '从快照恢复' if restored else '重建'
+        flash(f'数据库已{how}（{seconds:.2f}s），已恢复基础数据并仅保留系统管理员。', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'数据库重置失败: {e}', 'danger')
@@ -2,37 +2,45 @@
 库存管理模块路由
 包括：入库、库存、仓库、盘点、退货管理
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from models import db, StockIn, Inventory, Warehouse, InventoryCheck, ReturnStock, DrugInfo, SupplierInfo, EmployeeInfo
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from models import db, StockIn, Inventory, Warehouse, InventoryCheck, ReturnStock, DrugInfo, SupplierInfo, EmployeeInfo, StocktakeSession, StocktakeItem, StockTransfer, StockTransferItem
 from datetime import datetime
-from sqlalchemy import func
+from services.cache import REFERENCE_CACHE, DASHBOARD_CACHE, invalidate
+from services.snapshots import drug_options, supplier_options, warehouse_options
+from services.http_cache import conditional, tables_version
+from services.replica import replica_read
+from services import stocktake as stocktake_service
+from services import transfer as transfer_service
+from services import read_models
+from services import live_feed
+from services.admission import admission_class
+from services.cold_tier import supplier_totals
 
 inventory_bp = Blueprint('inventory', __name__, url_prefix='/inventory')
 
 # ==================== 入库管理 ====================
 @inventory_bp.route('/stock_in')
+@admission_class('report')
+@replica_read
 def stock_in_list():
     """入库列表（READ）"""
-    stock_ins = db.session.query(StockIn, DrugInfo.name, SupplierInfo.name, EmployeeInfo.name, DrugInfo.purchase_price).\
-        join(DrugInfo, StockIn.drug_id == DrugInfo.drug_id).\
-        join(SupplierInfo, StockIn.supplier_id == SupplierInfo.supplier_id).\
-        join(EmployeeInfo, StockIn.employee_id == EmployeeInfo.employee_id).all()
-    return render_template('inventory/stock_in_list.html', stock_ins=stock_ins)
+    return render_template('inventory/stock_in_list.html', stock_ins=read_models.stock_in_rows())
 
 @inventory_bp.route('/stock_in/add', methods=['GET', 'POST'])
+@admission_class('transaction')
 def stock_in_add():
     """添加入库（CREATE）"""
     if request.method == 'POST':
         location = (request.form.get('location') or '').strip() or None
         # 输入校验：药品、供应商、仓库必须存在
         drug = DrugInfo.query.get(request.form['drug_id'])
-        if not drug:
+        if not drug or not drug.is_active:
             flash('指定的药品不存在，请先添加药品信息！', 'danger')
             return redirect(url_for('inventory.stock_in_add'))
         
         # 验证供应商是否存在
         supplier = SupplierInfo.query.get(request.form['supplier_id'])
-        if not supplier:
+        if not supplier or not supplier.is_active:
             flash('指定的供应商不存在，请先添加供应商信息！', 'danger')
             return redirect(url_for('inventory.stock_in_add'))
         
@@ -50,16 +58,17 @@ def stock_in_add():
             supplier_id=request.form['supplier_id'],
             quantity=quantity,
             stock_in_date=datetime.strptime(request.form['stock_in_date'], '%Y-%m-%d').date(),
+            warehouse_id=warehouse_id,
             employee_id=request.form.get('employee_id', 1),  # 实际应从session获取
             remark=request.form.get('remark')
         )
         db.session.add(stock_in)
         
-        # 数据库执行：更新库存（存在则累加，不存在则创建）
+        # 数据库执行：更新库存（存在则累加，不存在则创建；锁定库存行，与调拨、收银等并发变动互斥）
         inventory = Inventory.query.filter_by(
             drug_id=stock_in.drug_id,
             warehouse_id=request.form.get('warehouse_id', 1)
-        ).first()
+        ).with_for_update().first()
         
         if inventory:
             inventory.quantity += int(request.form['quantity'])
@@ -75,34 +84,36 @@ def stock_in_add():
             db.session.add(inventory)
         
         db.session.commit()
+        invalidate(DASHBOARD_CACHE)
+        live_feed.notify()  # 推送仪表盘指标变化
         flash('入库登记成功！', 'success')
         return redirect(url_for('inventory.stock_in_list'))
     
-    drugs = DrugInfo.query.all()
-    suppliers = SupplierInfo.query.all()
-    warehouses = Warehouse.query.all()
+    drugs = drug_options()
+    suppliers = supplier_options()
+    warehouses = warehouse_options()
     return render_template('inventory/stock_in_form.html', drugs=drugs, suppliers=suppliers, warehouses=warehouses)
 
 # ==================== 库存查询 ====================
 @inventory_bp.route('/stock')
+@admission_class('report')
+@replica_read
+@conditional(lambda: tables_version(Inventory, DrugInfo, Warehouse))
 def stock_list():
     """库存列表（READ）"""
-    stocks = db.session.query(Inventory, DrugInfo.name, DrugInfo.unit, Warehouse.name).\
-        join(DrugInfo, Inventory.drug_id == DrugInfo.drug_id).\
-        join(Warehouse, Inventory.warehouse_id == Warehouse.warehouse_id).all()
-    return render_template('inventory/stock_list.html', stocks=stocks)
+    return render_template('inventory/stock_list.html', stocks=read_models.stock_rows())
 
 @inventory_bp.route('/stock/low')
+@admission_class('report')
+@replica_read
+@conditional(lambda: tables_version(Inventory, DrugInfo, Warehouse))
 def stock_low():
     """库存预警（READ，低于100）"""
-    stocks = db.session.query(Inventory, DrugInfo.name, DrugInfo.unit, Warehouse.name).\
-        join(DrugInfo, Inventory.drug_id == DrugInfo.drug_id).\
-        join(Warehouse, Inventory.warehouse_id == Warehouse.warehouse_id).\
-        filter(Inventory.quantity < 100).all()
-    return render_template('inventory/stock_low.html', stocks=stocks)
+    return render_template('inventory/stock_low.html', stocks=read_models.stock_rows(below=100))
 
 # ==================== 仓库管理 ====================
 @inventory_bp.route('/warehouses')
+@conditional(lambda: tables_version(Warehouse, EmployeeInfo))
 def warehouse_list():
     """仓库列表（READ）"""
     warehouses = db.session.query(Warehouse, EmployeeInfo.name).\
@@ -133,10 +144,11 @@ def warehouse_add():
         )
         db.session.add(warehouse)
         db.session.commit()
+        invalidate(REFERENCE_CACHE)
         flash('仓库添加成功！', 'success')
         return redirect(url_for('inventory.warehouse_list'))
     
-    employees = EmployeeInfo.query.all()
+    employees = EmployeeInfo.query.filter_by(is_active=True).all()
     return render_template('inventory/warehouse_form.html', warehouse=None, employees=employees)
 
 @inventory_bp.route('/warehouses/edit/<int:warehouse_id>', methods=['GET', 'POST'])
@@ -150,14 +162,17 @@ def warehouse_edit(warehouse_id):
         warehouse.manager_id = request.form['manager_id']
         # 数据库执行：提交更新
         db.session.commit()
+        invalidate(REFERENCE_CACHE)
         flash('仓库更新成功！', 'success')
         return redirect(url_for('inventory.warehouse_list'))
     
-    employees = EmployeeInfo.query.all()
+    employees = EmployeeInfo.query.filter_by(is_active=True).all()
     return render_template('inventory/warehouse_form.html', warehouse=warehouse, employees=employees)
 
 # ==================== 库存盘点 ====================
 @inventory_bp.route('/check')
+@admission_class('report')
+@replica_read
 def check_list():
     """盘点列表（READ）"""
     checks = db.session.query(InventoryCheck, DrugInfo.name, Warehouse.name, EmployeeInfo.name).\
@@ -167,6 +182,7 @@ def check_list():
     return render_template('inventory/check_list.html', checks=checks)
 
 @inventory_bp.route('/check/add', methods=['GET', 'POST'])
+@admission_class('transaction')
 def check_add():
     """添加盘点（CREATE）"""
     if request.method == 'POST':
@@ -174,12 +190,14 @@ def check_add():
         inventory = Inventory.query.filter_by(
             drug_id=request.form['drug_id'],
             warehouse_id=request.form['warehouse_id']
-        ).first()
+        ).with_for_update().first()
         if not inventory:
             flash('该药品在指定仓库中没有库存记录，无法进行盘点！', 'danger')
             return redirect(url_for('inventory.check_add'))
         
-        checked_qty = int(request.form['checked_quantity'])
+        # 账面数量取锁定的库存行（而非表单录入值），盘点记录的 实际-账面 即本次对库存的调整量，
+        # 库存核对（services.inventory_audit）按该差额推算应有库存
+        checked_qty = inventory.quantity
         actual_qty = int(request.form['actual_quantity'])
         
         # 数据库执行：插入盘点记录
@@ -194,26 +212,176 @@ def check_add():
         )
         db.session.add(check)
         
-        # 数据库执行：更新库存（同步数量与盘点日期）
-        inventory = Inventory.query.filter_by(
-            drug_id=check.drug_id,
-            warehouse_id=check.warehouse_id
-        ).first()
-        if inventory:
-            if checked_qty != actual_qty:
-                inventory.quantity = actual_qty
-            inventory.last_check_date = check.check_date
+        # 数据库执行：更新库存（同步数量与盘点日期，复用上面查到的库存记录）
+        if checked_qty != actual_qty:
+            inventory.quantity = actual_qty
+        inventory.last_check_date = check.check_date
         
         db.session.commit()
+        invalidate(DASHBOARD_CACHE)
+        live_feed.notify()  # 推送仪表盘指标变化
         flash('盘点完成！', 'success')
         return redirect(url_for('inventory.check_list'))
     
-    drugs = DrugInfo.query.all()
-    warehouses = Warehouse.query.all()
+    drugs = drug_options()
+    warehouses = warehouse_options()
     return render_template('inventory/check_form.html', drugs=drugs, warehouses=warehouses)
 
+# ==================== 批量盘点 ====================
+@inventory_bp.route('/stocktake')
+def stocktake_list():
+    """批量盘点单列表（READ）"""
+    stocktakes = db.session.query(StocktakeSession, Warehouse.name, EmployeeInfo.name).\
+        join(Warehouse, StocktakeSession.warehouse_id == Warehouse.warehouse_id).\
+        outerjoin(EmployeeInfo, StocktakeSession.employee_id == EmployeeInfo.employee_id).\
+        order_by(StocktakeSession.session_id.desc()).limit(100).all()
+    return render_template('inventory/stocktake_list.html', stocktakes=stocktakes,
+                           warehouses=warehouse_options(), today=datetime.now().date())
+
+@inventory_bp.route('/stocktake/open', methods=['POST'])
+def stocktake_open():
+    """开盘点单：冻结整个仓库的账面数量（CREATE）"""
+    warehouse_id = int(request.form['warehouse_id'])
+    if StocktakeSession.query.filter_by(warehouse_id=warehouse_id, status=stocktake_service.OPEN).first():
+        flash('该仓库已有进行中的盘点单，请先完成或取消！', 'danger')
+        return redirect(url_for('inventory.stocktake_list'))
+    check_date = datetime.strptime(request.form['check_date'], '%Y-%m-%d').date() \
+        if request.form.get('check_date') else datetime.now().date()
+    stocktake = stocktake_service.open_session(warehouse_id, check_date,
+                                               session.get('employee_id') or request.form.get('employee_id', 1))
+    flash(f'盘点单已创建，冻结 {stocktake.item_count} 条库存记录', 'success')
+    return redirect(url_for('inventory.stocktake_detail', session_id=stocktake.session_id))
+
+@inventory_bp.route('/stocktake/<int:session_id>')
+def stocktake_detail(session_id):
+    """盘点单明细：冻结账面数量与实盘录入（READ）"""
+    stocktake = StocktakeSession.query.get_or_404(session_id)
+    warehouse_name = db.session.query(Warehouse.name).filter_by(warehouse_id=stocktake.warehouse_id).scalar()
+    items = db.session.query(StocktakeItem, DrugInfo.name, DrugInfo.unit).\
+        join(DrugInfo, StocktakeItem.drug_id == DrugInfo.drug_id).\
+        filter(StocktakeItem.session_id == session_id).\
+        order_by(DrugInfo.name).all()
+    counted, diffs, diff_total = stocktake_service.session_summary(stocktake)
+    return render_template('inventory/stocktake_detail.html', stocktake=stocktake, warehouse_name=warehouse_name,
+                           items=items, counted=counted, diffs=diffs, diff_total=diff_total)
+
+@inventory_bp.route('/stocktake/<int:session_id>/counts', methods=['POST'])
+def stocktake_counts(session_id):
+    """批量录入实盘数量：JSON {"counts": [...]}、CSV 上传或明细表单（UPDATE）"""
+    stocktake = StocktakeSession.query.get_or_404(session_id)
+    try:
+        if request.is_json:
+            counts = (request.get_json(silent=True) or {}).get('counts', [])
+        elif request.files.get('file'):
+            counts = stocktake_service.parse_counts_csv(request.files['file'].stream)
+        else:
+            counts = [
+                {'drug_id': key[len('counted_'):], 'counted_quantity': value,
+                 'diff_reason': request.form.get('reason_' + key[len('counted_'):])}
+                for key, value in request.form.items()
+                if key.startswith('counted_') and value.strip() != ''
+            ]
+        updated, unknown = stocktake_service.record_counts(stocktake, counts)
+    except (stocktake_service.StocktakeError, KeyError, TypeError, ValueError) as e:
+        db.session.rollback()
+        if request.is_json:
+            return jsonify({'error': str(e)}), 400
+        flash(f'录入失败：{e}', 'danger')
+        return redirect(url_for('inventory.stocktake_detail', session_id=session_id))
+
+    if request.is_json:
+        return jsonify({'updated': updated, 'unknown_drug_ids': unknown})
+    flash(f'已录入 {updated} 条实盘数量', 'success')
+    if unknown:
+        flash(f'以下药品不在本盘点单中，已忽略：{", ".join(map(str, unknown[:20]))}', 'warning')
+    return redirect(url_for('inventory.stocktake_detail', session_id=session_id))
+
+@inventory_bp.route('/stocktake/<int:session_id>/finish', methods=['POST'])
+def stocktake_finish(session_id):
+    """完成盘点：一个事务内写入盘点记录并调整库存（UPDATE）"""
+    stocktake = StocktakeSession.query.get_or_404(session_id)
+    try:
+        counted, diffs = stocktake_service.finish_session(stocktake, session.get('employee_id'))
+    except stocktake_service.StocktakeError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('inventory.stocktake_detail', session_id=session_id))
+    invalidate(DASHBOARD_CACHE)
+    live_feed.notify()  # 推送仪表盘指标变化
+    flash(f'盘点完成！共盘点 {counted} 条，其中 {diffs} 条存在差异', 'success')
+    return redirect(url_for('inventory.check_list'))
+
+@inventory_bp.route('/stocktake/<int:session_id>/cancel', methods=['POST'])
+def stocktake_cancel(session_id):
+    """取消盘点单（不影响库存）"""
+    stocktake = StocktakeSession.query.get_or_404(session_id)
+    try:
+        stocktake_service.cancel_session(stocktake)
+    except stocktake_service.StocktakeError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('inventory.stocktake_detail', session_id=session_id))
+    flash('盘点单已取消', 'success')
+    return redirect(url_for('inventory.stocktake_list'))
+
+# ==================== 仓库调拨 ====================
+@inventory_bp.route('/transfer')
+def transfer_list():
+    """调拨单列表（READ）"""
+    transfers = StockTransfer.query.order_by(StockTransfer.transfer_id.desc()).limit(200).all()
+    warehouse_names = {w.warehouse_id: w.name for w in warehouse_options()}
+    return render_template('inventory/transfer_list.html', transfers=transfers, warehouse_names=warehouse_names)
+
+@inventory_bp.route('/transfer/add', methods=['GET', 'POST'])
+@admission_class('transaction')
+def transfer_add():
+    """新建调拨单：多种药品一次从调出仓移至调入仓（CREATE）"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) if request.is_json else None
+        try:
+            if data is not None:
+                lines = [(line['drug_id'], line['quantity']) for line in data.get('lines', [])]
+                form = data
+            else:
+                lines = transfer_service.parse_form_lines(request.form)
+                form = request.form
+            transfer_date = datetime.strptime(form['transfer_date'], '%Y-%m-%d').date() \
+                if form.get('transfer_date') else datetime.now().date()
+            transfer = transfer_service.create_transfer(
+                form['from_warehouse_id'], form['to_warehouse_id'], lines, transfer_date,
+                employee_id=session.get('employee_id') or form.get('employee_id', 1),
+                remark=form.get('remark')
+            )
+        except (transfer_service.TransferError, KeyError, TypeError, ValueError) as e:
+            if data is not None:
+                return jsonify({'error': str(e)}), 400
+            flash(f'调拨失败：{e}', 'danger')
+            return redirect(url_for('inventory.transfer_add'))
+
+        invalidate(DASHBOARD_CACHE)
+        live_feed.notify()  # 推送仪表盘指标变化
+        if data is not None:
+            return jsonify({'transfer_id': transfer.transfer_id, 'line_count': transfer.line_count,
+                            'total_quantity': transfer.total_quantity}), 201
+        flash(f'调拨完成！共 {transfer.line_count} 种药品，{transfer.total_quantity} 件', 'success')
+        return redirect(url_for('inventory.transfer_detail', transfer_id=transfer.transfer_id))
+
+    return render_template('inventory/transfer_form.html', drugs=drug_options(), warehouses=warehouse_options(),
+                           today=datetime.now().date())
+
+@inventory_bp.route('/transfer/<int:transfer_id>')
+def transfer_detail(transfer_id):
+    """调拨单明细（READ）"""
+    transfer = StockTransfer.query.get_or_404(transfer_id)
+    items = db.session.query(StockTransferItem, DrugInfo.name, DrugInfo.unit).\
+        join(DrugInfo, StockTransferItem.drug_id == DrugInfo.drug_id).\
+        filter(StockTransferItem.transfer_id == transfer_id).all()
+    warehouse_names = {w.warehouse_id: w.name for w in warehouse_options()}
+    return render_template('inventory/transfer_detail.html', transfer=transfer, items=items,
+                           warehouse_names=warehouse_names)
+
 # ==================== 退货处理 ====================
 @inventory_bp.route('/return')
+@admission_class('report')
+@replica_read
 def return_list():
     """退货列表（READ）"""
     returns = db.session.query(ReturnStock, DrugInfo.name, SupplierInfo.name, EmployeeInfo.name).\
@@ -223,6 +391,7 @@ def return_list():
     return render_template('inventory/return_list.html', returns=returns)
 
 @inventory_bp.route('/return/add', methods=['GET', 'POST'])
+@admission_class('transaction')
 def return_add():
     """添加退货（CREATE）"""
     if request.method == 'POST':
@@ -231,11 +400,11 @@ def return_add():
         drug_id = request.form['drug_id']
         supplier_id = request.form['supplier_id']
         
-        # 输入校验：库存存在且数量充足
+        # 输入校验：库存存在且数量充足（锁定库存行，与调拨、收银等并发变动互斥）
         inventory = Inventory.query.filter_by(
             drug_id=drug_id,
             warehouse_id=warehouse_id
-        ).first()
+        ).with_for_update().first()
         if not inventory:
             flash('该药品在指定仓库中没有库存，无法退货！', 'danger')
             return redirect(url_for('inventory.return_add'))
@@ -244,10 +413,7 @@ def return_add():
             return redirect(url_for('inventory.return_add'))
 
         # 业务校验：供应商采购记录与可退额度
-        purchased_qty = db.session.query(func.coalesce(func.sum(StockIn.quantity), 0)).\
-            filter_by(drug_id=drug_id, supplier_id=supplier_id).scalar()
-        returned_qty = db.session.query(func.coalesce(func.sum(ReturnStock.quantity), 0)).\
-            filter_by(drug_id=drug_id, supplier_id=supplier_id).scalar()
+        purchased_qty, returned_qty = supplier_totals(drug_id, supplier_id)
         if purchased_qty == 0:
             flash('该供应商没有该药品的采购记录，无法退货！', 'danger')
             return redirect(url_for('inventory.return_add'))
@@ -262,6 +428,7 @@ def return_add():
             quantity=quantity,
             reason=request.form.get('reason'),
             return_date=datetime.strptime(request.form['return_date'], '%Y-%m-%d').date(),
+            warehouse_id=warehouse_id,
             employee_id=request.form.get('employee_id', 1)
         )
         db.session.add(return_stock)
@@ -270,9 +437,11 @@ def return_add():
         inventory.quantity -= quantity
         
         db.session.commit()
+        invalidate(DASHBOARD_CACHE)
+        live_feed.notify()  # 推送仪表盘指标变化
         flash('退货处理成功！', 'success')
         return redirect(url_for('inventory.return_list'))
     
-    drugs = DrugInfo.query.all()
-    suppliers = SupplierInfo.query.all()
+    drugs = drug_options()
+    suppliers = supplier_options()
     return render_template('inventory/return_form.html', drugs=drugs, suppliers=suppliers)
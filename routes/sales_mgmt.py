@@ -2,34 +2,44 @@
 销售管理模块路由
 包括：销售登记、销售退货、财务统计
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from models import db, Sales, SalesReturn, FinanceStat, DrugInfo, CustomerInfo, EmployeeInfo, Inventory
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from models import db, Sales, SalesReturn, FinanceStat, DrugInfo, CustomerInfo, EmployeeInfo, Inventory, BackgroundJob, SalesCubeDaily, CustomerRfm, CustomerRfmRun
 from datetime import datetime, timedelta
 from sqlalchemy import func, extract
+from services.cache import REPORT_CACHE, DASHBOARD_CACHE, get_cache, invalidate
+from services.snapshots import drug_options, customer_options
+from services.jobs import enqueue, job_handler, job_to_dict
+from services import sales_cube
+from services import analytics_store
+from services import live_feed
+from services import pos_ingest
+from services import trend as trend_service
+from services import customer_rfm
+from services import read_models
+from services.admission import admission_class
+from services.cold_tier import source
+from services.http_cache import conditional
+from services.replica import replica_read
 
 sales_bp = Blueprint('sales', __name__, url_prefix='/sales')
 
 
 def _upsert_daily_finance(stat_date, employee_id=None):
-    """按日计算净销售/成本（销售-退货），写入finance_stat。"""
+    """按日计算净销售/成本（销售-退货），写入finance_stat。
+    金额取记录上的成交单价/成本单价，单表范围扫描即可由日期覆盖索引完成。"""
     from decimal import Decimal
-    sales_sum = db.session.query(func.sum(Sales.quantity * DrugInfo.sale_price)).\
-        join(DrugInfo, Sales.drug_id == DrugInfo.drug_id).\
-        filter(Sales.sales_date == stat_date).scalar() or 0
-    cost_sum = db.session.query(func.sum(Sales.quantity * DrugInfo.purchase_price)).\
-        join(DrugInfo, Sales.drug_id == DrugInfo.drug_id).\
-        filter(Sales.sales_date == stat_date).scalar() or 0
-    return_sales = db.session.query(func.sum(SalesReturn.quantity * DrugInfo.sale_price)).\
-        join(Sales, SalesReturn.sales_id == Sales.sales_id).\
-        join(DrugInfo, Sales.drug_id == DrugInfo.drug_id).\
-        filter(SalesReturn.return_date == stat_date).scalar() or 0
-    return_cost = db.session.query(func.sum(SalesReturn.quantity * DrugInfo.purchase_price)).\
-        join(Sales, SalesReturn.sales_id == Sales.sales_id).\
-        join(DrugInfo, Sales.drug_id == DrugInfo.drug_id).\
-        filter(SalesReturn.return_date == stat_date).scalar() or 0
+    sales, returns = source(Sales, stat_date), source(SalesReturn, stat_date)
+    sales_sum, cost_sum = db.session.query(
+        func.sum(sales.c.quantity * sales.c.unit_price),
+        func.sum(sales.c.quantity * sales.c.unit_cost)
+    ).filter(sales.c.sales_date == stat_date).one()
+    return_sales, return_cost = db.session.query(
+        func.sum(returns.c.quantity * returns.c.unit_price),
+        func.sum(returns.c.quantity * returns.c.unit_cost)
+    ).filter(returns.c.return_date == stat_date).one()
 
-    net_sales = Decimal(str(sales_sum)) - Decimal(str(return_sales))
-    net_cost = Decimal(str(cost_sum)) - Decimal(str(return_cost))
+    net_sales = Decimal(str(sales_sum or 0)) - Decimal(str(return_sales or 0))
+    net_cost = Decimal(str(cost_sum or 0)) - Decimal(str(return_cost or 0))
     net_profit = net_sales - net_cost
 
     stat = FinanceStat.query.filter_by(stat_type='日', stat_date=stat_date).first()
@@ -52,18 +62,58 @@ def _upsert_daily_finance(stat_date, employee_id=None):
     db.session.commit()
     return stat
 
+def _rollup_monthly_finance(stat_date, employee_id=None, progress=None):
+    """按月汇总：逐日刷新日报后聚合写入月报，progress(done, total) 汇报进度。"""
+    first_day = stat_date.replace(day=1)
+    next_month = (first_day + timedelta(days=32)).replace(day=1)
+    total_days = (next_month - first_day).days
+    current = first_day
+    while current < next_month:
+        _upsert_daily_finance(current, employee_id)
+        current += timedelta(days=1)
+        if progress:
+            progress((current - first_day).days, total_days)
+    agg = db.session.query(
+        func.sum(FinanceStat.total_sales),
+        func.sum(FinanceStat.total_cost),
+        func.sum(FinanceStat.total_profit)
+    ).filter_by(stat_type='日').\
+        filter(FinanceStat.stat_date >= first_day, FinanceStat.stat_date < next_month).first()
+    stat = FinanceStat.query.filter_by(stat_type='月', stat_date=first_day).first()
+    if stat:
+        stat.total_sales, stat.total_cost, stat.total_profit = agg
+        if employee_id:
+            stat.employee_id = employee_id
+    else:
+        stat = FinanceStat(
+            stat_type='月',
+            stat_date=first_day,
+            total_sales=agg[0] or 0,
+            total_cost=agg[1] or 0,
+            total_profit=agg[2] or 0,
+            employee_id=employee_id
+        )
+        db.session.add(stat)
+    db.session.commit()
+    return stat
+
+@job_handler('finance_month', invalidates=(REPORT_CACHE,))
+def _finance_month_job(params, progress):
+    """后台任务：生成月报"""
+    stat_date = datetime.strptime(params['stat_date'], '%Y-%m-%d').date()
+    stat = _rollup_monthly_finance(stat_date, params.get('employee_id'), progress)
+    return f'{stat.stat_date:%Y-%m} 月报已生成'
+
 # ==================== 销售登记 ====================
 @sales_bp.route('/sales')
+@admission_class('report')
+@replica_read
 def sales_list():
     """销售列表（READ）"""
-    sales_list = db.session.query(Sales, DrugInfo.name, CustomerInfo.name, EmployeeInfo.name).\
-        join(DrugInfo, Sales.drug_id == DrugInfo.drug_id).\
-        join(CustomerInfo, Sales.customer_id == CustomerInfo.customer_id).\
-        join(EmployeeInfo, Sales.employee_id == EmployeeInfo.employee_id).\
-        order_by(Sales.sales_date.desc()).all()
-    return render_template('sales/sales_list.html', sales_list=sales_list)
+    return render_template('sales/sales_list.html', sales_list=read_models.sales_rows())
 
 @sales_bp.route('/sales/add', methods=['GET', 'POST'])
+@admission_class('transaction')
 def sales_add():
     """添加销售（CREATE）"""
     if request.method == 'POST':
@@ -72,21 +122,21 @@ def sales_add():
         
         # 输入校验：药品、客户存在
         drug = DrugInfo.query.get(request.form['drug_id'])
-        if not drug:
+        if not drug or not drug.is_active:
             flash('指定的药品不存在！', 'danger')
             return redirect(url_for('sales.sales_add'))
         
         # 验证客户是否存在
         customer = CustomerInfo.query.get(request.form['customer_id'])
-        if not customer:
+        if not customer or not customer.is_active:
             flash('指定的客户不存在，请先添加客户信息！', 'danger')
             return redirect(url_for('sales.sales_add'))
         
-        # 业务校验：库存存在且数量足够
+        # 业务校验：库存存在且数量足够（锁定库存行，与调拨等并发扣减互斥）
         inventory = Inventory.query.filter_by(
             drug_id=request.form['drug_id'],
             warehouse_id=warehouse_id
-        ).first()
+        ).with_for_update().first()
         if not inventory:
             flash('该药品无库存，无法销售！', 'danger')
             return redirect(url_for('sales.sales_add'))
@@ -94,29 +144,61 @@ def sales_add():
             flash(f'库存不足！当前库存：{inventory.quantity}，销售数量：{quantity}', 'danger')
             return redirect(url_for('sales.sales_add'))
         
-        # 数据库执行：插入销售记录（价格取药品售价，表中不再存价格字段）
+        # 数据库执行：插入销售记录（记录成交时的售价与进价，之后调价不影响历史金额）
         sale = Sales(
             drug_id=request.form['drug_id'],
             customer_id=request.form['customer_id'],
+            customer_type=customer.type,
             quantity=quantity,
+            unit_price=drug.sale_price,
+            unit_cost=drug.purchase_price,
             sales_date=datetime.strptime(request.form['sales_date'], '%Y-%m-%d').date(),
+            warehouse_id=warehouse_id,
             employee_id=request.form.get('employee_id', 1)
         )
         db.session.add(sale)
+        sales_cube.record_sale(sale)
         
         # 数据库执行：扣减库存
         inventory.quantity -= quantity
         
         db.session.commit()
+        invalidate(REPORT_CACHE, DASHBOARD_CACHE)
+        live_feed.notify()  # 推送仪表盘指标变化
         flash('销售登记成功！', 'success')
         return redirect(url_for('sales.sales_list'))
     
-    drugs = DrugInfo.query.filter_by(status='在售').all()
-    customers = CustomerInfo.query.all()
+    drugs = drug_options(on_sale_only=True)
+    customers = customer_options()
     return render_template('sales/sales_form.html', drugs=drugs, customers=customers)
 
+@sales_bp.route('/pos/transactions', methods=['POST'])
+@admission_class('transaction')
+def pos_transactions():
+    """收银终端批量提交销售/退货（JSON，按幂等键去重，多个终端的提交合并为组事务）"""
+    try:
+        submission = pos_ingest.parse_submission(request.get_json(silent=True),
+                                                 current_app.config.get('POS_MAX_LINES', 5000))
+    except pos_ingest.PosError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        results = pos_ingest.ingest(submission)
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': f'入账失败：{e}'}), 500
+    accepted = [result for result in results if result['status'] == 'accepted']
+    return jsonify({
+        'accepted': len(accepted),
+        'duplicates': sum(1 for result in accepted if result['duplicate']),
+        'rejected': len(results) - len(accepted),
+        'results': results,
+    })
+
 # ==================== 销售退货 ====================
 @sales_bp.route('/return')
+@admission_class('report')
+@replica_read
 def return_list():
     """销售退货列表（READ）"""
     returns = db.session.query(SalesReturn, Sales, DrugInfo.name, EmployeeInfo.name).\
@@ -126,6 +208,7 @@ def return_list():
     return render_template('sales/return_list.html', returns=returns)
 
 @sales_bp.route('/return/add', methods=['GET', 'POST'])
+@admission_class('transaction')
 def return_add():
     """添加销售退货（CREATE）"""
     if request.method == 'POST':
@@ -135,7 +218,8 @@ def return_add():
         # 输入校验：销售记录存在
         sale = Sales.query.get(request.form['sales_id'])
         if not sale:
-            flash('指定的销售记录不存在！', 'danger')
+            # 已转入冷存储的历史销售单不再受理退货
+            flash('指定的销售记录不存在或已转入历史归档！', 'danger')
             return redirect(url_for('sales.return_add'))
         
         # 业务校验：退货数量不能超过销售数量
@@ -147,17 +231,21 @@ def return_add():
         sales_return = SalesReturn(
             sales_id=request.form['sales_id'],
             quantity=quantity,
+            unit_price=sale.unit_price,
+            unit_cost=sale.unit_cost,
             reason=request.form.get('reason'),
             return_date=datetime.strptime(request.form['return_date'], '%Y-%m-%d').date(),
+            warehouse_id=warehouse_id,
             employee_id=request.form.get('employee_id', 1)
         )
         db.session.add(sales_return)
+        sales_cube.record_return(sales_return, sale)
         
-        # 数据库执行：回补库存（存在则累加，不存在则创建）
+        # 数据库执行：回补库存（存在则累加，不存在则创建；锁定库存行，与调拨、收银等并发变动互斥）
         inventory = Inventory.query.filter_by(
             drug_id=sale.drug_id,
             warehouse_id=warehouse_id
-        ).first()
+        ).with_for_update().first()
         if inventory:
             inventory.quantity += quantity
         else:
@@ -170,6 +258,8 @@ def return_add():
             db.session.add(inventory)
         
         db.session.commit()
+        invalidate(REPORT_CACHE, DASHBOARD_CACHE)
+        live_feed.notify()  # 推送仪表盘指标变化
         flash('销售退货处理成功！', 'success')
         return redirect(url_for('sales.return_list'))
     
@@ -178,14 +268,19 @@ def return_add():
 
 # ==================== 财务统计 ====================
 @sales_bp.route('/finance')
+@admission_class('report')
+@replica_read
 def finance_list():
     """财务统计列表（READ）"""
     stats = db.session.query(FinanceStat, EmployeeInfo.name).\
         join(EmployeeInfo, FinanceStat.employee_id == EmployeeInfo.employee_id).\
         order_by(FinanceStat.stat_date.desc()).all()
-    return render_template('sales/finance_list.html', stats=stats)
+    jobs = BackgroundJob.query.filter_by(job_type='finance_month').\
+        order_by(BackgroundJob.job_id.desc()).limit(5).all()
+    return render_template('sales/finance_list.html', stats=stats, jobs=jobs)
 
 @sales_bp.route('/finance/generate', methods=['POST'])
+@admission_class('report')
 def finance_generate():
     """生成财务统计（CREATE/UPDATE）"""
     stat_type = request.form['stat_type']
@@ -195,57 +290,191 @@ def finance_generate():
 
     if stat_type == '日':
         _upsert_daily_finance(stat_date, employee_id)
-    else:  # 月：聚合当月所有日报
+        invalidate(REPORT_CACHE)
+        flash('财务统计生成成功！', 'success')
+    else:  # 月：提交后台任务，立即返回
         first_day = stat_date.replace(day=1)
-        next_month = (first_day + timedelta(days=32)).replace(day=1)
-        current = first_day
-        while current < next_month:
-            _upsert_daily_finance(current, employee_id)
-            current += timedelta(days=1)
-        agg = db.session.query(
-            func.sum(FinanceStat.total_sales),
-            func.sum(FinanceStat.total_cost),
-            func.sum(FinanceStat.total_profit)
-        ).filter_by(stat_type='日').\
-            filter(FinanceStat.stat_date >= first_day, FinanceStat.stat_date < next_month).first()
-        stat = FinanceStat.query.filter_by(stat_type='月', stat_date=first_day).first()
-        if stat:
-            stat.total_sales, stat.total_cost, stat.total_profit = agg
-            if employee_id:
-                stat.employee_id = employee_id
+        job, created = enqueue(
+            'finance_month',
+            f'finance:月:{first_day.isoformat()}',
+            params={'stat_date': first_day.isoformat(), 'employee_id': employee_id},
+            employee_id=employee_id
+        )
+        if created:
+            flash(f'{first_day:%Y-%m} 月报已提交后台生成（任务 #{job.job_id}）。', 'info')
         else:
-            stat = FinanceStat(
-                stat_type='月',
-                stat_date=first_day,
-                total_sales=agg[0] or 0,
-                total_cost=agg[1] or 0,
-                total_profit=agg[2] or 0,
-                employee_id=employee_id
-            )
-            db.session.add(stat)
-        db.session.commit()
-
-    flash('财务统计生成成功！', 'success')
+            flash(f'{first_day:%Y-%m} 月报正在生成中（任务 #{job.job_id}），已合并本次请求。', 'info')
     return redirect(url_for('sales.finance_list'))
 
+@sales_bp.route('/finance/jobs/<int:job_id>')
+def finance_job_status(job_id):
+    """财务统计后台任务状态（READ，JSON）"""
+    job = BackgroundJob.query.get_or_404(job_id)
+    return jsonify(job_to_dict(job))
+
 # ==================== 销售报表 ====================
+@sales_bp.route('/cube')
+@admission_class('report')
+@replica_read
+def cube_query():
+    """销售多维分析（READ，JSON）：?start=&end=&dims=category,customer_type&granularity=month&customer_type=批发"""
+    try:
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else datetime.now().date()
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else end_date - timedelta(days=29)
+    except ValueError as e:  # 日期格式错误
+        return jsonify({'error': str(e)}), 400
+    dims = [dim for dim in (request.args.get('dims') or '').split(',') if dim]
+    granularity = request.args.get('granularity') or None
+    unknown = [dim for dim in dims if dim not in sales_cube.DIMENSIONS]
+    if unknown or (granularity and granularity not in sales_cube.GRANULARITIES):
+        return jsonify({'error': f'不支持的维度或粒度：{unknown or granularity}'}), 400
+    filters = {}
+    for dim in sales_cube.DIMENSIONS:
+        values = request.args.getlist(dim)
+        if values:
+            filters[dim] = values if len(values) > 1 else values[0]
+    rows = sales_cube.query(start_date, end_date, dims=dims, granularity=granularity, filters=filters)
+    return jsonify({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'dims': dims,
+        'granularity': granularity,
+        'rows': rows
+    })
+
+@sales_bp.route('/analytics')
+def analytics_reports():
+    """列式分析快照的预置报表清单（READ，JSON）"""
+    return jsonify({name: desc for name, (desc, _) in analytics_store.REPORTS.items()})
+
+@sales_bp.route('/analytics/<report>')
+@admission_class('report')
+def analytics_report(report):
+    """在列式快照上执行预置报表（READ，JSON），不访问业务数据库"""
+    if report not in analytics_store.REPORTS:
+        return jsonify({'error': f'报表不存在：{report}'}), 404
+    try:
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else datetime.now().date()
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else end_date - timedelta(days=364)
+    except ValueError as e:  # 日期格式错误
+        return jsonify({'error': str(e)}), 400
+    try:
+        rows = analytics_store.run_report(current_app.config['ANALYTICS_DIR'], report, start_date, end_date,
+                                          current_app.config.get('ANALYTICS_THREADS'))
+    except analytics_store.AnalyticsUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'report': report, 'start': start_date.isoformat(), 'end': end_date.isoformat(), 'rows': rows})
+
+@sales_bp.route('/report/trend')
+@admission_class('report')
+@replica_read
+def report_trend():
+    """长周期趋势（READ，JSON）：服务端按 日/周/月 汇总并以 LTTB 降采样到 points 个点
+
+    参数：metric、granularity、start/end（YYYY-MM-DD，默认最近一年；range=all 时从最早数据开始）、points
+    """
+    metric = request.args.get('metric', 'net_sales')
+    granularity = request.args.get('granularity', 'day')
+    try:
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else datetime.now().date()
+        if request.args.get('start'):
+            start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+        elif request.args.get('range') == 'all' and metric in trend_service.METRICS:
+            start_date = trend_service.first_date(metric) or end_date
+        else:
+            start_date = end_date - timedelta(days=364)
+        max_points = int(request.args.get('points', 500))
+        return jsonify(trend_service.trend(metric, start_date, end_date, granularity, max_points))
+    except ValueError as e:  # 含 TrendError 与日期/整数格式错误
+        return jsonify({'error': str(e)}), 400
+
+@sales_bp.route('/analytics/rfm')
+@admission_class('report')
+@replica_read
+def rfm_summary():
+    """客户 RFM 分群概览（READ，JSON）；segment/customer_type 参数列出该分群消费额最高的客户"""
+    run = CustomerRfmRun.query.order_by(CustomerRfmRun.run_id.desc()).first()
+    data = {
+        'last_run': {'run_id': run.run_id, 'time': run.create_time.isoformat(sep=' ', timespec='seconds'),
+                     'customers': run.customers, 'changed': run.changed, 'seconds': run.seconds} if run else None,
+        'segments': [{'customer_type': customer_type, 'segment': segment, 'customers': count,
+                      'monetary': float(monetary or 0)}
+                     for customer_type, segment, count, monetary in customer_rfm.segment_summary()],
+    }
+    if request.args.get('segment'):
+        query = db.session.query(CustomerRfm, CustomerInfo.name).\
+            join(CustomerInfo, CustomerRfm.customer_id == CustomerInfo.customer_id).\
+            filter(CustomerRfm.segment == request.args['segment'])
+        if request.args.get('customer_type'):
+            query = query.filter(CustomerRfm.customer_type == request.args['customer_type'])
+        limit = min(request.args.get('limit', 50, type=int), 1000)
+        data['customers'] = [_rfm_to_dict(row, name)
+                             for row, name in query.order_by(CustomerRfm.monetary.desc()).limit(limit)]
+    return jsonify(data)
+
+@sales_bp.route('/analytics/rfm/<int:customer_id>')
+@replica_read
+def rfm_customer(customer_id):
+    """单个客户的 RFM 评分（READ，JSON）"""
+    row = CustomerRfm.query.get(customer_id)
+    if row is None:
+        return jsonify({'error': '该客户暂无购买记录或尚未运行客户分析'}), 404
+    return jsonify(_rfm_to_dict(row, CustomerInfo.query.get(customer_id).name))
+
+@sales_bp.route('/analytics/rfm/refresh', methods=['POST'])
+def rfm_refresh():
+    """提交客户 RFM 分析任务（增量；full=1 时全量重算），返回任务状态"""
+    full = request.values.get('full') in ('1', 'true')
+    job, created = enqueue('customer_rfm', 'customer_rfm', params={'full': full})
+    return jsonify(dict(job_to_dict(job), created=created)), 202
+
+def _rfm_to_dict(row, name):
+    return {
+        'customer_id': row.customer_id,
+        'name': name,
+        'customer_type': row.customer_type,
+        'recency_days': (datetime.now().date() - row.last_purchase).days,
+        'first_purchase': row.first_purchase.isoformat(),
+        'last_purchase': row.last_purchase.isoformat(),
+        'frequency': row.frequency,
+        'monetary': float(row.monetary),
+        'avg_interval_days': float(row.avg_interval_days) if row.avg_interval_days is not None else None,
+        'rfm': f'{row.r_score}{row.f_score}{row.m_score}',
+        'segment': row.segment,
+    }
+
+def _report_week_version():
+    """周报校验值：区间内汇总表的销售笔数、销售额与退货额"""
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=6)
+    totals = db.session.query(
+        func.sum(SalesCubeDaily.sales_count), func.sum(SalesCubeDaily.amount), func.sum(SalesCubeDaily.return_amount)
+    ).filter(SalesCubeDaily.stat_date.between(start_date, end_date)).one()
+    return (start_date, tuple(totals)), None
+
 @sales_bp.route('/report/week')
+@admission_class('report')
+@replica_read
+@conditional(_report_week_version)
 def report_week():
-    """最近一周销售情况（READ）"""
+    """最近一周销售情况（READ）
+
+    只读：每日净销售额（销售-退货）取自登记时增量维护的销售多维汇总表，可在只读副本上执行，
+    不再顺带写入 finance_stat（日报由夜间日结与财务统计任务在主库生成）。
+    """
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=6)
-    admin = EmployeeInfo.query.filter_by(account='admin').first()
-    employee_id = admin.employee_id if admin else None
 
-    current = start_date
-    while current <= end_date:
-        _upsert_daily_finance(current, employee_id)
-        current += timedelta(days=1)
+    def build_daily_sales():
+        net = dict(db.session.query(
+            SalesCubeDaily.stat_date, func.sum(SalesCubeDaily.amount - SalesCubeDaily.return_amount)
+        ).filter(SalesCubeDaily.stat_date.between(start_date, end_date)).
+            group_by(SalesCubeDaily.stat_date).all())
+        return [(start_date + timedelta(days=offset), net.get(start_date + timedelta(days=offset), 0))
+                for offset in range((end_date - start_date).days + 1)]
 
-    daily_stats = FinanceStat.query.filter_by(stat_type='日').\
-        filter(FinanceStat.stat_date.between(start_date, end_date)).\
-        order_by(FinanceStat.stat_date).all()
-    daily_sales = [(stat.stat_date, stat.total_sales) for stat in daily_stats]
+    # 结果按日期区间缓存，销售/退货/统计任务写入后失效
+    daily_sales = get_cache(REPORT_CACHE).get_or_set(('report_week', start_date, end_date), build_daily_sales)
 
     return render_template('sales/report_week.html',
                          daily_sales=daily_sales,
@@ -0,0 +1,4 @@
+"""
+业务服务包
+与具体路由无关的公共组件：进程内缓存、后台任务等
+"""
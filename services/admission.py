@@ -0,0 +1,205 @@
+"""
+请求准入控制
+高峰期打开月报、未分页的销售列表或导出时，慢查询可能占满 worker 线程，收银登记只能排在后面。
+视图用 @admission_class('transaction' / 'report' / None) 声明所属类别，未声明的视图属于 default 类；
+每个请求在 before_request 中按类别准入，teardown_request 中释放：
+
+- 每类可设并发上限（limit）、排队上限（queue）与最长排队秒数（timeout），排队已满或等待超时
+  直接返回 503 + Retry-After，不再占用线程
+- 进程容量 ADMISSION_CAPACITY（通常等于 worker 线程数，0 表示不限）由各类共享：
+  容量空出时按优先级（priority 越小越优先）放行，有更高优先级的请求在排队时低优先级的不会插队；
+  headroom 为该类不能占用的预留容量，报表类留出的线程只给收银等交易类使用
+- 指标：每类的执行中/排队数、排队峰值、累计放行/拒绝数与最近的排队等待时间分位数（/admission/metrics）
+
+计数在进程内：多 worker 部署时各 worker 独立限流，指标也按进程返回（附 pid）。
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from flask import current_app, g, jsonify, make_response, request
+
+DEFAULT_CLASS = 'default'
+EXEMPT = None  # admission_class(None)：不参与准入控制（长连接推送、指标本身）
+WAIT_SAMPLES = 1000  # 每类保留最近多少次等待时间用于计算分位数
+
+
+def admission_class(name):
+    """视图装饰器：声明视图所属的准入类别，None 表示不参与准入控制"""
+    def decorator(view):
+        view.admission_class = name
+        return view
+    return decorator
+
+
+class Shed(Exception):
+    """请求未被准入（reason 为 queue_full / timeout）"""
+
+    def __init__(self, name, reason):
+        super().__init__(f'{name}: {reason}')
+        self.name = name
+        self.reason = reason
+
+
+class _Class:
+    """一个准入类别的策略与计数（在 Controller 的锁内访问）"""
+
+    def __init__(self, name, priority=1, limit=None, queue=None, timeout=None, headroom=0):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.headroom = headroom
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = {'queue_full': 0, 'timeout': 0}
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Controller:
+    """进程内准入控制器"""
+
+    def __init__(self, capacity=0, classes=None):
+        self.capacity = capacity or 0
+        self.classes = {name: _Class(name, **policy) for name, policy in (classes or {}).items()}
+        self.classes.setdefault(DEFAULT_CLASS, _Class(DEFAULT_CLASS))
+        self.active = 0
+        self._cond = threading.Condition()
+
+    def _admissible(self, cls):
+        if cls.limit is not None and cls.active >= cls.limit:
+            return False
+        if not self.capacity:
+            return True
+        if self.active >= self.capacity - cls.headroom:
+            return False
+        # 更高优先级的请求在等容量（而不是等自身类别的并发上限）时先放行它们
+        return not any(
+            other.priority < cls.priority and other.waiting and (other.limit is None or other.active < other.limit)
+            for other in self.classes.values()
+        )
+
+    def enter(self, name):
+        """准入一个请求，返回排队秒数；未准入抛出 Shed"""
+        cls = self.classes.get(name) or self.classes[DEFAULT_CLASS]
+        started = time.monotonic()
+        with self._cond:
+            if not self._admissible(cls):
+                if cls.queue is not None and cls.waiting >= cls.queue:
+                    cls.shed['queue_full'] += 1
+                    raise Shed(cls.name, 'queue_full')
+                cls.waiting += 1
+                cls.queued += 1
+                cls.peak_waiting = max(cls.peak_waiting, cls.waiting)
+                deadline = None if cls.timeout is None else started + cls.timeout
+                try:
+                    while not self._admissible(cls):
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            cls.shed['timeout'] += 1
+                            raise Shed(cls.name, 'timeout')
+                        self._cond.wait(remaining)
+                finally:
+                    cls.waiting -= 1
+                    self._cond.notify_all()  # 排队者变化可能让低优先级的请求可以放行
+            cls.active += 1
+            self.active += 1
+            cls.admitted += 1
+            waited = time.monotonic() - started
+            cls.waits.append(waited)
+            return waited
+
+    def leave(self, name):
+        cls = self.classes.get(name) or self.classes[DEFAULT_CLASS]
+        with self._cond:
+            cls.active -= 1
+            self.active -= 1
+            self._cond.notify_all()
+
+    def metrics(self):
+        """各类别的当前状态与累计计数"""
+        with self._cond:
+            classes = {}
+            for cls in sorted(self.classes.values(), key=lambda c: c.priority):
+                waits = list(cls.waits)
+                classes[cls.name] = {
+                    'priority': cls.priority,
+                    'limit': cls.limit,
+                    'queue_limit': cls.queue,
+                    'active': cls.active,
+                    'waiting': cls.waiting,
+                    'peak_waiting': cls.peak_waiting,
+                    'admitted': cls.admitted,
+                    'queued': cls.queued,
+                    'shed': dict(cls.shed),
+                    'wait_ms': {
+                        'p50': round(_percentile(waits, 50) * 1000, 1),
+                        'p95': round(_percentile(waits, 95) * 1000, 1),
+                        'max': round(max(waits, default=0) * 1000, 1),
+                    },
+                }
+            return {'pid': os.getpid(), 'capacity': self.capacity, 'active': self.active, 'classes': classes}
+
+
+def get_controller(app=None):
+    return (app or current_app).extensions.get('admission')
+
+
+def _view_class():
+    view = current_app.view_functions.get(request.endpoint)
+    if view is None or request.endpoint == 'static':
+        return EXEMPT
+    return getattr(view, 'admission_class', DEFAULT_CLASS)
+
+
+def _shed_response(error):
+    retry_after = current_app.config.get('ADMISSION_RETRY_AFTER', 5)
+    message = '系统繁忙，请稍后重试'
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        response = jsonify(error=message, admission_class=error.name, reason=error.reason)
+        response.status_code = 503
+    else:
+        response = make_response(message, 503)
+        response.mimetype = 'text/plain'
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _before_request():
+    controller = get_controller()
+    name = _view_class()
+    if controller is None or name is EXEMPT:
+        return None
+    try:
+        controller.enter(name)
+    except Shed as e:
+        return _shed_response(e)
+    g.admission_class = name
+    return None
+
+
+def _teardown_request(exc):
+    name = g.pop('admission_class', None)
+    if name is not None:
+        get_controller().leave(name)
+
+
+def init_app(app):
+    if not app.config.get('ADMISSION_ENABLED', True):
+        return
+    app.extensions['admission'] = Controller(app.config.get('ADMISSION_CAPACITY', 0),
+                                             app.config.get('ADMISSION_CLASSES', {}))
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,258 @@
+"""
+列式分析快照
+事实表（sales / sales_return / stock_in / return_stock / inventory_check）按 create_time 增量导出为
+Parquet 分片，维度表整表覆盖导出；分析报表由进程内 DuckDB 直接读取 Parquet 执行，
+多核并行且不访问业务数据库，避免与收银事务争用 MySQL。
+
+可选依赖：pyarrow（导出）、duckdb（查询），未安装时仅分析功能不可用。
+
+目录结构（ANALYTICS_DIR）：
+    <表名>/part-<批次>-<序号>.parquet   事实表增量分片
+    <表名>/full.parquet                 维度表全量
+    _state.json                         各事实表已导出的 create_time 水位
+"""
+import glob
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from models import (
+    db,
+    Sales,
+    SalesReturn,
+    StockIn,
+    ReturnStock,
+    InventoryCheck,
+    DrugInfo,
+    CustomerInfo,
+    SupplierInfo,
+    Warehouse,
+    EmployeeInfo,
+)
+
+FACT_TABLES = {
+    'sales': Sales,
+    'sales_return': SalesReturn,
+    'stock_in': StockIn,
+    'return_stock': ReturnStock,
+    'inventory_check': InventoryCheck,
+}
+DIMENSION_TABLES = {
+    'drug_info': DrugInfo,
+    'customer_info': CustomerInfo,
+    'supplier_info': SupplierInfo,
+    'warehouse': Warehouse,
+    'employee_info': EmployeeInfo,
+}
+# 不导出的敏感列
+EXCLUDED_COLUMNS = {'password'}
+STATE_FILE = '_state.json'
+
+# 预置报表：名称 -> (说明, SQL)；SQL 中两个 ? 依次为开始、结束日期
+REPORTS = {
+    'monthly_sales_by_category': ('按月、药品分类统计净销售额', """
+        WITH s AS (
+            SELECT strftime(s.sales_date, '%Y-%m') AS period, coalesce(d.category, '未分类') AS category,
+                   s.quantity * s.unit_price AS amount, s.quantity * s.unit_cost AS cost
+            FROM sales s JOIN drug_info d USING (drug_id)
+            WHERE s.sales_date BETWEEN ? AND ?
+        )
+        SELECT period, category, count(*) AS sales_count, sum(amount) AS amount,
+               sum(amount) - sum(cost) AS profit
+        FROM s GROUP BY ALL ORDER BY period, category
+    """),
+    'top_drugs': ('区间内销售额前50的药品', """
+        SELECT d.drug_id, d.name, d.category, sum(s.quantity) AS quantity,
+               sum(s.quantity * s.unit_price) AS amount
+        FROM sales s JOIN drug_info d USING (drug_id)
+        WHERE s.sales_date BETWEEN ? AND ?
+        GROUP BY ALL ORDER BY amount DESC LIMIT 50
+    """),
+    'customer_type_trend': ('按周、客户类型统计销售与退货', """
+        WITH s AS (
+            SELECT date_trunc('week', s.sales_date) AS week, c.type AS customer_type,
+                   s.quantity * s.unit_price AS amount, 0 AS return_amount
+            FROM sales s JOIN customer_info c USING (customer_id)
+            WHERE s.sales_date BETWEEN ? AND ?
+            UNION ALL
+            SELECT date_trunc('week', r.return_date), c.type, 0, r.quantity * r.unit_price
+            FROM sales_return r JOIN sales s USING (sales_id) JOIN customer_info c USING (customer_id)
+            WHERE r.return_date BETWEEN ? AND ?
+        )
+        SELECT week, customer_type, sum(amount) AS amount, sum(return_amount) AS return_amount,
+               sum(amount) - sum(return_amount) AS net_amount
+        FROM s GROUP BY ALL ORDER BY week, customer_type
+    """),
+    'supplier_purchases': ('供应商采购与退货汇总', """
+        WITH p AS (
+            SELECT supplier_id, drug_id, quantity, 0 AS returned FROM stock_in
+            WHERE stock_in_date BETWEEN ? AND ?
+            UNION ALL
+            SELECT supplier_id, drug_id, 0, quantity FROM return_stock
+            WHERE return_date BETWEEN ? AND ?
+        )
+        SELECT sp.supplier_id, sp.name, sum(p.quantity) AS purchased, sum(p.returned) AS returned,
+               sum(p.quantity * d.purchase_price) AS purchase_amount
+        FROM p JOIN supplier_info sp USING (supplier_id) JOIN drug_info d USING (drug_id)
+        GROUP BY ALL ORDER BY purchase_amount DESC
+    """),
+    'inventory_check_diff': ('盘点差异汇总（盘盈/盘亏）', """
+        SELECT w.name AS warehouse, d.name AS drug, count(*) AS checks,
+               sum(c.actual_quantity - c.checked_quantity) AS diff
+        FROM inventory_check c JOIN drug_info d USING (drug_id) JOIN warehouse w USING (warehouse_id)
+        WHERE c.check_date BETWEEN ? AND ? AND c.actual_quantity <> c.checked_quantity
+        GROUP BY ALL ORDER BY abs(diff) DESC LIMIT 100
+    """),
+}
+
+
+class AnalyticsUnavailable(RuntimeError):
+    """缺少可选依赖或尚未导出快照"""
+
+
+def _require(module):
+    try:
+        return __import__(module)
+    except ImportError:
+        raise AnalyticsUnavailable(f'分析功能需要安装 {module}：pip install {module}')
+
+
+def _columns(model):
+    return [col for col in model.__table__.columns if col.name not in EXCLUDED_COLUMNS]
+
+
+def _arrow_schema(columns):
+    """由 SQLAlchemy 列类型推导固定的 Arrow schema，保证各批次分片类型一致"""
+    pa = _require('pyarrow')
+    fields = []
+    for col in columns:
+        type_name = col.type.__class__.__name__
+        if type_name == 'Integer':
+            arrow_type = pa.int64()
+        elif type_name == 'Numeric':
+            arrow_type = pa.decimal128(col.type.precision or 15, col.type.scale or 2)
+        elif type_name == 'Date':
+            arrow_type = pa.date32()
+        elif type_name == 'DateTime':
+            arrow_type = pa.timestamp('us')
+        elif type_name == 'Boolean':
+            arrow_type = pa.bool_()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(col.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _write_parquet(rows, columns, schema, path):
+    pa = _require('pyarrow')
+    import pyarrow.parquet as pq
+    data = {col.name: [row[i] for row in rows] for i, col in enumerate(columns)}
+    tmp_path = path + '.tmp'
+    pq.write_table(pa.Table.from_pydict(data, schema=schema), tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def _load_state(directory):
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_state(directory, state):
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def clear(directory):
+    """删除已导出的分片与水位文件；数据库被整体替换（如恢复快照）后须调用，下次导出从头全量导出"""
+    for name in (*FACT_TABLES, *DIMENSION_TABLES):
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    for path in (os.path.join(directory, STATE_FILE), os.path.join(directory, STATE_FILE + '.tmp')):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def export(directory, lag_seconds=60, batch_rows=100000):
+    """增量导出事实表、全量导出维度表，返回各表本次导出行数
+
+    只导出 create_time 早于 now - lag_seconds 的行，给尚未提交的事务留出时间，
+    下一次导出从上次水位继续。
+    """
+    os.makedirs(directory, exist_ok=True)
+    state = _load_state(directory)
+    upper = datetime.now() - timedelta(seconds=lag_seconds)
+    batch_id = datetime.now().strftime('%Y%m%d%H%M%S')
+    exported = {}
+
+    for name, model in FACT_TABLES.items():
+        columns = _columns(model)
+        schema = _arrow_schema(columns)
+        table_dir = os.path.join(directory, name)
+        os.makedirs(table_dir, exist_ok=True)
+        stmt = select(*columns).where(model.create_time <= upper)
+        if state.get(name):
+            stmt = stmt.where(model.create_time > datetime.fromisoformat(state[name]))
+        stmt = stmt.order_by(model.create_time)
+        result = db.session.execute(stmt.execution_options(yield_per=batch_rows))
+        create_index = [col.name for col in columns].index('create_time')
+        count = 0
+        for part, rows in enumerate(result.partitions(batch_rows)):
+            _write_parquet(rows, columns, schema, os.path.join(table_dir, f'part-{batch_id}-{part:04d}.parquet'))
+            state[name] = rows[-1][create_index].isoformat()
+            count += len(rows)
+        exported[name] = count
+
+    for name, model in DIMENSION_TABLES.items():
+        columns = _columns(model)
+        table_dir = os.path.join(directory, name)
+        os.makedirs(table_dir, exist_ok=True)
+        rows = db.session.execute(select(*columns)).all()
+        _write_parquet(rows, columns, _arrow_schema(columns), os.path.join(table_dir, 'full.parquet'))
+        exported[name] = len(rows)
+
+    state['exported_at'] = datetime.now().isoformat(timespec='seconds')
+    _save_state(directory, state)
+    return exported
+
+
+def connect(directory, threads=None):
+    """创建 DuckDB 连接，并为每个已导出的表注册同名视图"""
+    duckdb = _require('duckdb')
+    con = duckdb.connect()
+    if threads:
+        con.execute(f'SET threads = {int(threads)}')
+    registered = 0
+    for name in list(FACT_TABLES) + list(DIMENSION_TABLES):
+        pattern = os.path.join(directory, name, '*.parquet')
+        if glob.glob(pattern):
+            con.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{pattern}', union_by_name = true)")
+            registered += 1
+    if not registered:
+        con.close()
+        raise AnalyticsUnavailable('尚未导出分析快照，请先运行 python -m tools.analytics_export')
+    return con
+
+
+def run_query(directory, sql, params=None, threads=None):
+    """在快照上执行 SQL，返回字典列表"""
+    con = connect(directory, threads)
+    try:
+        cursor = con.execute(sql, params or [])
+        names = [desc[0] for desc in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+    finally:
+        con.close()
+
+
+def run_report(directory, report, start, end, threads=None):
+    """执行预置报表"""
+    sql = REPORTS[report][1]
+    params = [start, end] * sql.count('BETWEEN ? AND ?')
+    return run_query(directory, sql, params, threads)
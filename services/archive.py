@@ -0,0 +1,177 @@
+"""
+基础资料软删除与归档清理
+药品、客户、供应商、员工的“删除”只把 is_active 置为 False 并记录归档时间，
+历史销售、入库等业务记录保持完整；列表与下拉框只查询 is_active 为真的记录。
+
+物理清理（purge）是可选的后台任务：按外键元数据找出引用归档记录的子表，
+ondelete=CASCADE 的子表按主键分批删除（递归处理孙表），SET NULL 的分批置空，
+每批单独提交，避免一次性级联删除数百万行长时间锁表。
+仍被库存流水（入库、退货、销售、盘点、调拨，含冷存储归档表）级联引用或仍有库存的记录不清理：
+级联删除流水会破坏历史，且库存不随之调整，库存核对会出现大量差异；这类记录保持归档状态即可。
+销售多维汇总表（sales_cube_daily）不设外键，作为历史汇总保留。
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from models import (
+    db,
+    DrugInfo,
+    CustomerInfo,
+    SupplierInfo,
+    EmployeeInfo,
+    Inventory,
+    InventoryCheck,
+    StockIn,
+    ReturnStock,
+    Sales,
+    SalesReturn,
+    StockTransferItem,
+)
+from services.cache import REPORT_CACHE, REFERENCE_CACHE, DASHBOARD_CACHE
+from services.cold_tier import TIERS
+from services.jobs import job_handler
+
+# 实体名 -> 模型
+ARCHIVABLE = {
+    'drug': DrugInfo,
+    'customer': CustomerInfo,
+    'supplier': SupplierInfo,
+    'employee': EmployeeInfo,
+}
+PURGE_BATCH_SIZE = 5000
+# 库存流水：库存核对据此推算应有库存，不能随归档记录级联删除
+MOVEMENT_MODELS = (StockIn, ReturnStock, Sales, SalesReturn, InventoryCheck, StockTransferItem)
+
+
+def archive(obj):
+    """软删除：标记为已归档（调用方负责提交）"""
+    obj.is_active = False
+    obj.deleted_time = datetime.now()
+
+
+def restore(obj):
+    """恢复已归档的记录（调用方负责提交）"""
+    obj.is_active = True
+    obj.deleted_time = None
+
+
+def _referencing(table):
+    """引用 table 的外键：[(子表, 外键列, ondelete)]"""
+    return [
+        (child, fk.parent, (fk.ondelete or '').upper())
+        for child in db.metadata.sorted_tables
+        for fk in child.foreign_keys
+        if fk.column.table is table
+    ]
+
+
+def _single_pk(table):
+    columns = list(table.primary_key.columns)
+    return columns[0] if len(columns) == 1 else None
+
+
+def has_movements(table, pk_value):
+    """记录是否仍被库存流水级联引用（含冷存储归档表中的明细），或仍有非零库存"""
+    for model in MOVEMENT_MODELS:
+        live = model.__table__
+        tables = [live] + ([TIERS[live.name][1].__table__] if live.name in TIERS else [])
+        for fk in live.foreign_keys:
+            if fk.column.table is not table or (fk.ondelete or '').upper() != 'CASCADE':
+                continue
+            for source in tables:
+                column = source.c[fk.parent.name]
+                if db.session.scalar(select(select(column).where(column == pk_value).exists())):
+                    return True
+    stock = [fk.parent for fk in Inventory.__table__.foreign_keys if fk.column.table is table]
+    return any(
+        db.session.scalar(select(select(Inventory.inventory_id).where(column == pk_value, Inventory.quantity != 0).exists()))
+        for column in stock
+    )
+
+
+def _purge_ids(table, ids):
+    """删除 table 中主键属于 ids 的行，先递归处理引用它们的子表"""
+    for child, column, ondelete in _referencing(table):
+        if ondelete == 'CASCADE':
+            child_pk = _single_pk(child)
+            if child_pk is None:
+                db.session.execute(child.delete().where(column.in_(ids)))
+                continue
+            child_ids = list(db.session.scalars(select(child_pk).where(column.in_(ids))))
+            if child_ids:
+                _purge_ids(child, child_ids)
+        elif ondelete == 'SET NULL':
+            db.session.execute(child.update().where(column.in_(ids)).values({column.name: None}))
+    db.session.execute(table.delete().where(_single_pk(table).in_(ids)))
+
+
+def _purge_record(table, pk_value, batch_size, note=None):
+    """物理删除一条归档记录：直接子表按 batch_size 分批处理并提交，返回删除/置空的子表行数"""
+    affected = 0
+    for child, column, ondelete in _referencing(table):
+        if ondelete not in ('CASCADE', 'SET NULL'):
+            continue
+        child_pk = _single_pk(child)
+        if child_pk is None:
+            # 关联表（无单列主键）行数很少，一次处理
+            if ondelete == 'CASCADE':
+                db.session.execute(child.delete().where(column == pk_value))
+            else:
+                db.session.execute(child.update().where(column == pk_value).values({column.name: None}))
+            db.session.commit()
+            continue
+        while True:
+            ids = list(db.session.scalars(select(child_pk).where(column == pk_value).limit(batch_size)))
+            if not ids:
+                break
+            if ondelete == 'CASCADE':
+                _purge_ids(child, ids)
+            else:
+                db.session.execute(child.update().where(child_pk.in_(ids)).values({column.name: None}))
+            db.session.commit()
+            affected += len(ids)
+            if note:
+                note(f'{table.name}#{pk_value}：{child.name} 已处理 {affected} 行')
+    db.session.execute(table.delete().where(_single_pk(table) == pk_value))
+    db.session.commit()
+    return affected
+
+
+def purge_archived(retention_days=30, entities=None, batch_size=PURGE_BATCH_SIZE, progress=None):
+    """物理清理归档超过 retention_days 天的记录，返回 ({实体: 清理条数}, {实体: 因仍有流水而保留的条数})"""
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    targets = []
+    for entity in entities or ARCHIVABLE:
+        model = ARCHIVABLE[entity]
+        pk = _single_pk(model.__table__)
+        ids = list(db.session.scalars(
+            select(pk).where(model.is_active.is_(False), model.deleted_time <= cutoff).order_by(pk)
+        ))
+        targets += [(entity, model, pk_value) for pk_value in ids]
+
+    purged = dict.fromkeys(entities or ARCHIVABLE, 0)
+    kept = dict.fromkeys(entities or ARCHIVABLE, 0)
+    for done, (entity, model, pk_value) in enumerate(targets):
+        if has_movements(model.__table__, pk_value):
+            kept[entity] += 1
+            continue
+        if progress:
+            progress(done, len(targets), f'清理 {entity}#{pk_value}')
+        note = (lambda message, done=done: progress(done, len(targets), message)) if progress else None
+        _purge_record(model.__table__, pk_value, batch_size, note)
+        purged[entity] += 1
+    if progress:
+        progress(len(targets), len(targets))
+    db.session.rollback()  # 结束检查流水时开始的读事务
+    return purged, kept
+
+
+@job_handler('purge_archived', invalidates=(REPORT_CACHE, REFERENCE_CACHE, DASHBOARD_CACHE))
+def _purge_archived_job(params, progress):
+    purged, kept = purge_archived(params.get('retention_days', 30), params.get('entities'),
+                                  params.get('batch_size', PURGE_BATCH_SIZE), progress)
+    summary = '已清理：' + '，'.join(f'{entity} {count} 条' for entity, count in purged.items())
+    if any(kept.values()):
+        summary += '；仍有流水而保留：' + '，'.join(f'{entity} {count} 条' for entity, count in kept.items() if count)
+    return summary
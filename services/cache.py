@@ -0,0 +1,73 @@
+"""
+进程内缓存
+按名称分区的 TTL 缓存，供报表、参考数据等读多写少的查询使用。
+多 worker 部署时每个进程各自缓存，数据陈旧时间由 TTL 兜底。
+走只读副本的请求（见 services.replica）不填充缓存，避免把复制延迟中的旧数据提供给其他请求。
+"""
+import threading
+import time
+
+from services.replica import reading_replica
+
+# 缓存分区名称
+REPORT_CACHE = 'report'  # 报表结果
+REFERENCE_CACHE = 'reference'  # 表单下拉框等参考数据
+DASHBOARD_CACHE = 'dashboard'  # 仪表盘库存指标快照
+
+
+class TTLCache:
+    """线程安全的简单 TTL 缓存"""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+
+    def get_or_set(self, key, factory, ttl=None):
+        """命中则直接返回，否则调用 factory() 计算并写入缓存（副本读请求只计算不写入）"""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            if not reading_replica():
+                self.set(key, value, ttl)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, ttl=60):
+    """获取（不存在则创建）指定名称的缓存分区"""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = TTLCache(ttl)
+        return _caches[name]
+
+
+def invalidate(*names):
+    """清空指定名称的缓存分区"""
+    for name in names:
+        cache = _caches.get(name)
+        if cache is not None:
+            cache.clear()
@@ -0,0 +1,192 @@
+"""
+历史明细冷热分层
+sales / sales_return / stock_in / return_stock 只增不减，早于 COLD_TIER_AGE_DAYS 天的明细由后台任务
+按主键分批转入同结构的归档表（*_archive），每批 INSERT ... SELECT 与 DELETE 在同一事务内提交。
+
+- 汇总保留：销售与销售退货的日汇总即 sales_cube_daily（登记时增量维护，转移不影响）；
+  入库与供应商退货在转移的同一事务内按 日期 × 药品 × 供应商 累加到 stock_flow_daily
+- 透明查询：source(model, start) 在区间起点早于冷热分界（或不限起点）时返回
+  在线表 UNION ALL 归档表 的子查询，否则直接返回在线表，近期区间的查询不会触及归档表
+- 分界 data_tier.cold_before 在转移开始前推进，转移过程中的查询不会漏掉已转出的行；
+  各进程把分界缓存在 REFERENCE_CACHE 中（最长 TIER_BOUNDARY_TTL 秒），source() 不必每次查询 data_tier，
+  因此分界推进后先等待一个缓存周期，其他进程缓存的旧分界都过期后才开始转移
+
+销售单连同其全部退货一起转移；仍有退货晚于分界的销售单留在在线表，保证在线退货总能关联到原销售单。
+"""
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, union_all
+
+from models import (
+    db,
+    Sales,
+    SalesReturn,
+    StockIn,
+    ReturnStock,
+    SalesArchive,
+    SalesReturnArchive,
+    StockInArchive,
+    ReturnStockArchive,
+    StockFlowDaily,
+    DataTier,
+)
+from services.cache import REPORT_CACHE, REFERENCE_CACHE, get_cache, invalidate
+from services.dbutil import upsert_increment
+from services.jobs import job_handler
+
+# 在线表名 -> (在线模型, 归档模型, 日期列)
+TIERS = {
+    'sales': (Sales, SalesArchive, Sales.sales_date),
+    'sales_return': (SalesReturn, SalesReturnArchive, SalesReturn.return_date),
+    'stock_in': (StockIn, StockInArchive, StockIn.stock_in_date),
+    'return_stock': (ReturnStock, ReturnStockArchive, ReturnStock.return_date),
+}
+TIER_AGE_DAYS = 365
+TIER_BATCH_SIZE = 5000
+TIER_BOUNDARY_TTL = 30  # 各进程缓存冷热分界的秒数，也是分界推进后开始转移前的等待时间
+
+
+def cold_before(table_name):
+    """冷热分界日期：早于该日期的明细可能在归档表中；从未转移过时为 None（进程内缓存）"""
+    def load():
+        return db.session.query(DataTier.cold_before).filter_by(table_name=table_name).scalar()
+    return get_cache(REFERENCE_CACHE).get_or_set(('cold_before', table_name), load, ttl=TIER_BOUNDARY_TTL)
+
+
+def source(model, start=None):
+    """查询用的明细来源：区间起点早于冷热分界（start 为 None 表示不限起点）时为在线表与归档表的并集
+
+    返回 Table 或子查询，列名与在线表相同，调用方通过 .c 访问列。
+    """
+    live = model.__table__
+    boundary = cold_before(live.name)
+    if boundary is None or (start is not None and start >= boundary):
+        return live
+    cold = TIERS[live.name][1].__table__
+    return union_all(
+        select(*live.c),
+        select(*[cold.c[column.name] for column in live.c]),
+    ).subquery(live.name)
+
+
+def supplier_totals(drug_id, supplier_id):
+    """某药品对某供应商的累计 (入库数量, 退货数量)：在线明细 + 已转冷部分的日汇总，不扫描归档明细"""
+    stock_in, returned = (
+        db.session.query(func.coalesce(func.sum(model.quantity), 0)).
+        filter_by(drug_id=drug_id, supplier_id=supplier_id).scalar()
+        for model in (StockIn, ReturnStock)
+    )
+    cold_in, cold_returned = db.session.query(
+        func.coalesce(func.sum(StockFlowDaily.stock_in_quantity), 0),
+        func.coalesce(func.sum(StockFlowDaily.return_quantity), 0),
+    ).filter_by(drug_id=drug_id, supplier_id=supplier_id).one()
+    return int(stock_in) + int(cold_in), int(returned) + int(cold_returned)
+
+
+def _advance(table_name, cutoff):
+    """在转移前推进冷热分界（只前进不后退），返回分界是否变化"""
+    tier = db.session.get(DataTier, table_name)
+    advanced = tier is None or cutoff > tier.cold_before
+    if tier is None:
+        db.session.add(DataTier(table_name=table_name, cold_before=cutoff))
+    elif advanced:
+        tier.cold_before = cutoff
+    db.session.commit()
+    return advanced
+
+
+def _move(model, ids):
+    """把主键属于 ids 的在线行复制到归档表并删除（调用方负责提交）"""
+    live = model.__table__
+    cold = TIERS[live.name][1].__table__
+    pk = live.primary_key.columns.values()[0]
+    db.session.execute(insert(cold).from_select([column.name for column in live.c], select(*live.c).where(pk.in_(ids))))
+    db.session.execute(live.delete().where(pk.in_(ids)))
+    db.session.execute(
+        DataTier.__table__.update().where(DataTier.table_name == live.name).
+        values(archived_rows=DataTier.archived_rows + len(ids), update_time=datetime.now())
+    )
+
+
+def _tier_sales(cutoff, batch_size, note):
+    """转移销售单及其退货；返回 (销售行数, 退货行数)"""
+    later_return = select(SalesReturn.sales_return_id).\
+        where(SalesReturn.sales_id == Sales.sales_id, SalesReturn.return_date >= cutoff).exists()
+    moved_sales = moved_returns = 0
+    while True:
+        ids = list(db.session.scalars(
+            select(Sales.sales_id).where(Sales.sales_date < cutoff, ~later_return).
+            order_by(Sales.sales_id).limit(batch_size)
+        ))
+        if not ids:
+            break
+        return_ids = list(db.session.scalars(select(SalesReturn.sales_return_id).where(SalesReturn.sales_id.in_(ids))))
+        if return_ids:
+            _move(SalesReturn, return_ids)
+        _move(Sales, ids)
+        db.session.commit()
+        moved_sales += len(ids)
+        moved_returns += len(return_ids)
+        note(f'sales 已转移 {moved_sales} 行，sales_return {moved_returns} 行')
+    return moved_sales, moved_returns
+
+
+def _tier_stock(model, cutoff, batch_size, note):
+    """转移入库或供应商退货明细，同一事务内累加进退货日汇总；返回转移行数"""
+    _, _, date_column = TIERS[model.__tablename__]
+    pk = model.__table__.primary_key.columns.values()[0]
+    count_name, quantity_name = (('stock_in_count', 'stock_in_quantity') if model is StockIn
+                                 else ('return_count', 'return_quantity'))
+    moved = 0
+    while True:
+        ids = list(db.session.scalars(select(pk).where(date_column < cutoff).order_by(pk).limit(batch_size)))
+        if not ids:
+            break
+        grouped = db.session.execute(
+            select(date_column, model.drug_id, model.supplier_id, func.count(), func.sum(model.quantity)).
+            where(pk.in_(ids)).group_by(date_column, model.drug_id, model.supplier_id)
+        ).all()
+        for stat_date, drug_id, supplier_id, count, quantity in grouped:
+            upsert_increment(StockFlowDaily.__table__,
+                             {'stat_date': stat_date, 'drug_id': drug_id, 'supplier_id': supplier_id},
+                             {count_name: count, quantity_name: int(quantity or 0)})
+        _move(model, ids)
+        db.session.commit()
+        moved += len(ids)
+        note(f'{model.__tablename__} 已转移 {moved} 行')
+    return moved
+
+
+def tier_cold_data(age_days=TIER_AGE_DAYS, batch_size=TIER_BATCH_SIZE, progress=None,
+                   settle_seconds=TIER_BOUNDARY_TTL):
+    """把早于 age_days 天的明细转入归档表，返回 {表名: 转移行数}
+
+    分界推进后等待 settle_seconds 秒，让其他进程缓存的旧分界过期（单进程测试可传 0）。
+    """
+    cutoff = datetime.now().date() - timedelta(days=age_days)
+    advanced = [_advance(table_name, cutoff) for table_name in TIERS]
+    invalidate(REFERENCE_CACHE)
+    if any(advanced) and settle_seconds:
+        if progress:
+            progress(0, None, f'冷热分界已推进到 {cutoff}，等待 {settle_seconds}s 让各进程刷新分界缓存')
+        time.sleep(settle_seconds)
+
+    steps = ('sales', 'stock_in', 'return_stock')
+    moved = {}
+
+    def note_for(step):
+        return lambda message: progress(step, len(steps), message) if progress else None
+
+    moved['sales'], moved['sales_return'] = _tier_sales(cutoff, batch_size, note_for(0))
+    moved['stock_in'] = _tier_stock(StockIn, cutoff, batch_size, note_for(1))
+    moved['return_stock'] = _tier_stock(ReturnStock, cutoff, batch_size, note_for(2))
+    if progress:
+        progress(len(steps), len(steps))
+    return moved
+
+
+@job_handler('tier_cold_data', invalidates=(REPORT_CACHE, REFERENCE_CACHE))
+def _tier_cold_data_job(params, progress):
+    moved = tier_cold_data(params.get('age_days', TIER_AGE_DAYS), params.get('batch_size', TIER_BATCH_SIZE), progress)
+    return '已转入冷存储：' + '，'.join(f'{table} {count} 行' for table, count in moved.items())
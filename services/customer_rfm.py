@@ -0,0 +1,227 @@
+"""
+客户 RFM 分析
+按客户统计最近购买（Recency）、购买笔数（Frequency）、净消费额（Monetary）与平均购买间隔，
+在零售/批发客户各自范围内按百分位打 1~5 分并划分客户分群，结果写入 customer_rfm 供按分群/评分查询。
+
+- 增量：customer_rfm_run 记录每次运行处理到的 sales_id / sales_return_id 水位，
+  下次运行只以一次分组查询汇总水位之后的新销售与退货，与已有累计值合并（含冷存储归档表中的明细）；
+  水位只推进到 COMMIT_LAG_SECONDS 之前创建的记录，晚提交的小主键不会被跳过
+- 向量化：合并、打分、分群全部以 pandas/NumPy 列运算完成，百万客户无需逐行 Python 循环
+- 写回：只写入新增或变化的行（评分随同类客户的分布整体变化，未变化的行不更新），
+  累计值、评分与水位在同一事务内提交，中途失败不会重复累计
+
+可选依赖：numpy、pandas，未安装时分析任务报错提示安装，其余功能不受影响。
+"""
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, select, update
+
+from models import db, Sales, SalesReturn, CustomerInfo, CustomerRfm, CustomerRfmRun
+from services.analytics_store import AnalyticsUnavailable
+from services.cache import REPORT_CACHE
+from services.cold_tier import TIERS, source
+from services.jobs import job_handler
+from services.sqlite_profile import transaction_intent
+
+SCORE_BINS = 5
+WRITE_CHUNK = 10000
+COMMIT_LAG_SECONDS = 60  # 水位只推进到这么多秒之前创建的记录，给尚未提交的事务留出时间
+AGGREGATE_COLUMNS = ['first_purchase', 'last_purchase', 'frequency', 'monetary']
+RESULT_COLUMNS = ['customer_type', 'first_purchase', 'last_purchase', 'frequency', 'monetary',
+                  'avg_interval_days', 'r_score', 'f_score', 'm_score', 'segment']
+
+# 客户分群（按顺序匹配第一个满足的条件）
+SEGMENTS = [
+    ('重要价值客户', lambda r, f, m: (r >= 4) & (f >= 4) & (m >= 4)),
+    ('忠诚客户', lambda r, f, m: (r >= 3) & (f >= 4)),
+    ('新客户', lambda r, f, m: (r >= 4) & (f <= 1)),
+    ('潜力客户', lambda r, f, m: (r >= 3) & (m >= 3)),
+    ('重要挽留客户', lambda r, f, m: (r <= 2) & ((f >= 4) | (m >= 4))),
+    ('流失客户', lambda r, f, m: (r <= 1)),
+    ('沉睡客户', lambda r, f, m: (r <= 2)),
+]
+DEFAULT_SEGMENT = '一般客户'
+
+
+def _require():
+    try:
+        import numpy
+        import pandas
+    except ImportError:
+        raise AnalyticsUnavailable('客户分析需要安装 numpy 和 pandas：pip install numpy pandas')
+    return numpy, pandas
+
+
+def _watermark(full):
+    """上次运行处理到的 (sales_id, sales_return_id)；全量或首次运行为 (0, 0)"""
+    last = None if full else CustomerRfmRun.query.order_by(CustomerRfmRun.run_id.desc()).first()
+    return (last.last_sales_id, last.last_return_id) if last else (0, 0)
+
+
+def _upper_bound(model, pk, lag_seconds):
+    """create_time 早于 now - lag_seconds 的最大主键（从在线表最新一端倒序查找，只扫描最近的记录）"""
+    cutoff = datetime.now() - timedelta(seconds=lag_seconds)
+    bound = db.session.query(pk).filter(model.create_time <= cutoff).order_by(pk.desc()).limit(1).scalar()
+    if bound is None:  # 在线表没有足够早的记录：归档表中的明细都早于冷热分界
+        cold = TIERS[model.__tablename__][1]
+        bound = db.session.query(func.max(getattr(cold, pk.key))).scalar()
+    return bound or 0
+
+
+def _upper_bounds(lag_seconds=COMMIT_LAG_SECONDS):
+    """本次处理的上界：只取 create_time 早于 now - lag_seconds 的主键
+
+    MySQL 自增主键在插入时分配、提交时才可见，较小主键的事务可能晚于较大主键提交；
+    直接取 MAX 会让水位越过尚未提交的记录、之后永远漏算，留出提交延迟后这些记录下次运行再处理
+    （同 analytics_store.export）。
+    """
+    return (_upper_bound(Sales, Sales.sales_id, lag_seconds),
+            _upper_bound(SalesReturn, SalesReturn.sales_return_id, lag_seconds))
+
+
+def _new_aggregates(pd, sales_range, returns_range):
+    """水位之后的新销售按客户汇总（一次分组查询），并扣减新退货金额"""
+    sales, returns = source(Sales), source(SalesReturn)
+    rows = db.session.execute(
+        select(sales.c.customer_id, func.min(sales.c.sales_date), func.max(sales.c.sales_date),
+               func.count(), func.sum(sales.c.quantity * sales.c.unit_price)).
+        where(sales.c.sales_id > sales_range[0], sales.c.sales_id <= sales_range[1]).
+        group_by(sales.c.customer_id)
+    ).all()
+    new = pd.DataFrame.from_records(rows, columns=['customer_id'] + AGGREGATE_COLUMNS)
+    refunds = db.session.execute(
+        select(sales.c.customer_id, func.sum(returns.c.quantity * returns.c.unit_price)).
+        select_from(returns.join(sales, returns.c.sales_id == sales.c.sales_id)).
+        where(returns.c.sales_return_id > returns_range[0], returns.c.sales_return_id <= returns_range[1]).
+        group_by(sales.c.customer_id)
+    ).all()
+    refunds = pd.DataFrame.from_records(refunds, columns=['customer_id', 'refund'])
+    return new, refunds
+
+
+def _existing(pd):
+    rows = db.session.execute(select(CustomerRfm.customer_id, *(CustomerRfm.__table__.c[name]
+                                                                for name in RESULT_COLUMNS))).all()
+    return pd.DataFrame.from_records(rows, columns=['customer_id'] + RESULT_COLUMNS).set_index('customer_id')
+
+
+def _score(np, pd, frame, column, ascending=True):
+    """同类客户内按百分位打 1~5 分"""
+    pct = frame.groupby('customer_type')[column].rank(pct=True, method='average', ascending=ascending)
+    return np.clip(np.ceil(pct * SCORE_BINS), 1, SCORE_BINS).astype('int64')
+
+
+def compute(np, pd, existing, new, refunds, types):
+    """合并累计值并重新打分（纯 DataFrame 运算），返回以 customer_id 为索引的结果"""
+    merged = pd.concat([existing[AGGREGATE_COLUMNS].reset_index(), new], ignore_index=True)
+    # 日期转为 datetime64、金额转为 float64，避免 object 列在分组时逐行比较
+    merged = merged.astype({'first_purchase': 'datetime64[ns]', 'last_purchase': 'datetime64[ns]',
+                            'frequency': 'int64', 'monetary': 'float64'})
+    frame = merged.groupby('customer_id').agg(first_purchase=('first_purchase', 'min'),
+                                              last_purchase=('last_purchase', 'max'),
+                                              frequency=('frequency', 'sum'),
+                                              monetary=('monetary', 'sum'))
+    if len(refunds):
+        frame['monetary'] -= refunds.set_index('customer_id')['refund'].astype('float64').\
+            reindex(frame.index, fill_value=0)
+    frame['monetary'] = frame['monetary'].round(2)
+    frame['customer_type'] = types.reindex(frame.index).fillna(existing['customer_type'].reindex(frame.index))
+    frame = frame[frame['customer_type'].notna()]
+
+    last = frame['last_purchase']
+    span = (last - frame['first_purchase']).dt.days.astype('float64')
+    intervals = (frame['frequency'] - 1).where(frame['frequency'] > 1)
+    frame['avg_interval_days'] = (span / intervals).round(2)
+    frame['r_score'] = _score(np, pd, frame, 'last_purchase')
+    frame['f_score'] = _score(np, pd, frame, 'frequency')
+    frame['m_score'] = _score(np, pd, frame, 'monetary')
+    r, f, m = frame['r_score'], frame['f_score'], frame['m_score']
+    frame['segment'] = np.select([rule(r, f, m) for _, rule in SEGMENTS], [name for name, _ in SEGMENTS],
+                                 default=DEFAULT_SEGMENT)
+    frame['first_purchase'] = frame['first_purchase'].dt.date
+    frame['last_purchase'] = last.dt.date
+    return frame[RESULT_COLUMNS]
+
+
+def _changed_rows(pd, result, existing):
+    """(新增行, 变化行)：与已有结果逐列比较（空值视为相等）"""
+    is_new = ~result.index.isin(existing.index)
+    old = existing.reindex(result.index[~is_new])
+    current = result[~is_new]
+    differs = pd.Series(False, index=current.index)
+    for column in RESULT_COLUMNS:
+        a, b = current[column], old[column]
+        if column in ('monetary', 'avg_interval_days'):
+            a, b = a.astype('float64'), b.astype('float64')
+        differs |= ~((a == b) | (a.isna() & b.isna()))
+    return result[is_new], current[differs]
+
+
+def _records(frame):
+    records = frame.reset_index().to_dict('records')
+    for record in records:
+        if record['avg_interval_days'] != record['avg_interval_days']:  # NaN -> NULL
+            record['avg_interval_days'] = None
+    return records
+
+
+def _write(inserted, updated):
+    table = CustomerRfm.__table__
+    for start in range(0, len(inserted), WRITE_CHUNK):
+        db.session.execute(table.insert(), _records(inserted.iloc[start:start + WRITE_CHUNK]))
+    stmt = update(table).where(table.c.customer_id == bindparam('b_customer_id')).\
+        values({name: bindparam(name) for name in RESULT_COLUMNS + ['update_time']})
+    for start in range(0, len(updated), WRITE_CHUNK):
+        records = _records(updated.iloc[start:start + WRITE_CHUNK])
+        now = datetime.now()
+        for record in records:
+            record['b_customer_id'] = record.pop('customer_id')
+            record['update_time'] = now
+        db.session.execute(stmt, records)
+
+
+@transaction_intent(True)  # 先读后写的单个事务（命令行调用时同样按写事务开始）
+def refresh(full=False, progress=None):
+    """增量（或全量）更新客户 RFM 分析，返回本次运行记录"""
+    np, pd = _require()
+    started = time.perf_counter()
+    note = progress or (lambda done, total=None, message=None: None)
+
+    note(0, 4, '汇总新增销售与退货')
+    if full:
+        db.session.execute(CustomerRfm.__table__.delete())
+    low_sales, low_returns = _watermark(full)
+    high_sales, high_returns = _upper_bounds()
+    new, refunds = _new_aggregates(pd, (low_sales, high_sales), (low_returns, high_returns))
+
+    note(1, 4, f'合并 {len(new)} 位客户的新增购买并重新评分')
+    existing = _existing(pd)
+    types = pd.Series(dict(db.session.execute(select(CustomerInfo.customer_id, CustomerInfo.type)).all()),
+                      dtype='object')
+    result = compute(np, pd, existing, new, refunds, types)
+
+    note(2, 4, '写入分析结果')
+    inserted, updated = _changed_rows(pd, result, existing)
+    _write(inserted, updated)
+    run = CustomerRfmRun(last_sales_id=max(low_sales, high_sales), last_return_id=max(low_returns, high_returns),
+                         full=full, customers=len(result), changed=len(inserted) + len(updated),
+                         seconds=round(time.perf_counter() - started, 2))
+    db.session.add(run)
+    db.session.commit()
+    note(4, 4)
+    return run
+
+
+def segment_summary():
+    """各类客户的分群人数与消费额：[(customer_type, segment, 人数, 净消费额)]"""
+    return db.session.query(CustomerRfm.customer_type, CustomerRfm.segment, func.count(),
+                            func.sum(CustomerRfm.monetary)).\
+        group_by(CustomerRfm.customer_type, CustomerRfm.segment).\
+        order_by(CustomerRfm.customer_type, CustomerRfm.segment).all()
+
+
+@job_handler('customer_rfm', invalidates=(REPORT_CACHE,))
+def _customer_rfm_job(params, progress):
+    run = refresh(bool(params.get('full')), progress)
+    return f'客户分析完成：{run.customers} 位客户，更新 {run.changed} 行，用时 {run.seconds}s'
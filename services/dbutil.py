@@ -0,0 +1,48 @@
+"""
+数据库辅助函数
+封装不同数据库方言之间有差异的写法（累加式 upsert、日期分组表达式等）。
+"""
+from sqlalchemy import and_, func
+
+from models import db
+
+
+def upsert_increment(table, key, deltas):
+    """按唯一键累加数值列：不存在则插入，存在则 col = col + delta（单条语句，并发安全）"""
+    dialect = db.engine.dialect.name
+    values = dict(key, **deltas)
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in deltas})
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={name: table.c[name] + stmt.excluded[name] for name in deltas}
+        )
+    else:
+        condition = and_(*(table.c[name] == value for name, value in key.items()))
+        result = db.session.execute(
+            table.update().where(condition).values({name: table.c[name] + delta for name, delta in deltas.items()})
+        )
+        if result.rowcount:
+            return
+        stmt = table.insert().values(**values)
+    db.session.execute(stmt)
+
+
+def period_expr(column, granularity):
+    """日期列按 day/month/year 取周期标签（YYYY-MM-DD / YYYY-MM / YYYY）"""
+    formats = {'day': ('%Y-%m-%d', 10), 'month': ('%Y-%m', 7), 'year': ('%Y', 4)}
+    fmt, length = formats[granularity]
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return func.strftime(fmt, column)
+    if dialect == 'mysql':
+        return func.date_format(column, fmt)
+    return func.substr(func.cast(column, db.String), 1, length)
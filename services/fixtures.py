@@ -0,0 +1,172 @@
+"""
+数据库快照（测试夹具 / 演示重置）
+重建数据库（drop_all + create_all + 初始化基础数据）需要逐表建表、建索引再写入种子数据，
+测试准备与“重置数据库”都反复付出这笔开销。这里把初始化好的数据库保存为快照，之后直接恢复：
+
+- 快照统一为一个 SQLite 文件，保存在 FIXTURE_SNAPSHOT_DIR，文件名带表结构指纹（{name}-{指纹}.db），
+  模型变化后指纹不同，旧快照自然失效，不会把旧结构的数据恢复到新表中
+- SQLite：保存与恢复都用在线备份接口整库复制（WAL 下也能得到一致的副本），
+  恢复时直接写入当前连接的数据库文件，其他连接无需重建
+- MySQL：关闭外键检查后 TRUNCATE 各表（同时重置自增值），再从快照文件分批批量插入；
+  其他数据库按依赖逆序 DELETE 后批量插入
+- 快照先写入临时文件再改名，多个 worker 同时保存或读取时不会读到写了一半的文件
+
+reset(name) 是重置数据库的入口：快照存在时恢复，否则重建、初始化并保存快照供下次使用。
+恢复与重建都会清除由旧数据派生的状态：Parquet 分析快照及其导出水位、本进程的搜索索引
+（其他 worker 的索引通过 update_time 水位回退或记录数变化发现并整体重载）。
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+
+from flask import current_app
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from models import db, init_basic_tables
+from services import analytics_store, search_index
+
+DEFAULT_NAME = 'seed'
+LOAD_CHUNK = 5000
+
+
+class SnapshotMissing(Exception):
+    """指定名称的快照不存在（或表结构已变化）"""
+
+
+def schema_fingerprint():
+    """模型表结构的指纹：各表建表与建索引语句的摘要"""
+    dialect = sqlite.dialect()
+    digest = hashlib.sha1()
+    for table in db.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ''):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return digest.hexdigest()[:12]
+
+
+def snapshot_path(name=DEFAULT_NAME):
+    directory = current_app.config['FIXTURE_SNAPSHOT_DIR']
+    return os.path.join(directory, f'{name}-{schema_fingerprint()}.db')
+
+
+def _capture_rows(path):
+    """非 SQLite 数据库：按模型建表后逐表复制全部行到快照文件"""
+    target = create_engine('sqlite:///' + path)
+    try:
+        db.metadata.create_all(target)
+        with target.begin() as out:
+            for table in db.metadata.sorted_tables:
+                result = db.session.execute(select(table)).mappings()
+                while rows := result.fetchmany(LOAD_CHUNK):
+                    out.execute(insert(table), [dict(row) for row in rows])
+    finally:
+        target.dispose()
+        db.session.rollback()
+
+
+def capture(name=DEFAULT_NAME):
+    """把当前数据库保存为快照，返回 (快照路径, 耗时秒数)"""
+    started = time.perf_counter()
+    path = snapshot_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        if db.engine.dialect.name == 'sqlite':
+            db.session.commit()  # 备份需要源连接上没有未结束的写事务
+            source = db.engine.raw_connection()
+            out = sqlite3.connect(tmp)
+            try:
+                source.driver_connection.backup(out)
+            finally:
+                out.close()
+                source.close()
+        else:
+            _capture_rows(tmp)
+        os.chmod(tmp, 0o644)  # mkstemp 创建的文件仅属主可读，其他用户运行的 worker 也需要读取快照
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path, time.perf_counter() - started
+
+
+def _load_rows(conn, path):
+    """从快照文件分批插入各表（目标表已清空）"""
+    source = create_engine('sqlite:///' + path)
+    try:
+        with source.connect() as snapshot:
+            for table in db.metadata.sorted_tables:
+                result = snapshot.execute(select(table)).mappings()
+                while rows := result.fetchmany(LOAD_CHUNK):
+                    conn.execute(insert(table), [dict(row) for row in rows])
+    finally:
+        source.dispose()
+
+
+def _clear_derived():
+    """数据库被整体替换后，清除由旧数据派生、不会随数据库恢复的状态"""
+    analytics_store.clear(current_app.config['ANALYTICS_DIR'])
+    search_index.get_index().invalidate()
+
+
+def restore(name=DEFAULT_NAME):
+    """用快照替换当前数据库的全部数据，返回耗时秒数；快照不存在时抛出 SnapshotMissing"""
+    path = snapshot_path(name)
+    if not os.path.exists(path):
+        raise SnapshotMissing(path)
+    started = time.perf_counter()
+    db.session.remove()
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        source = sqlite3.connect(path)
+        target = db.engine.raw_connection()
+        try:
+            source.backup(target.driver_connection)
+        finally:
+            target.close()
+            source.close()
+    elif dialect == 'mysql':
+        # 外键检查是连接级设置：清空、装载与恢复设置都在同一个连接上执行
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('SET FOREIGN_KEY_CHECKS = 0')
+            try:
+                for table in db.metadata.sorted_tables:
+                    conn.exec_driver_sql(f'TRUNCATE TABLE `{table.name}`')
+                _load_rows(conn, path)
+                conn.commit()
+            finally:
+                conn.exec_driver_sql('SET FOREIGN_KEY_CHECKS = 1')
+    else:
+        with db.engine.begin() as conn:
+            for table in reversed(db.metadata.sorted_tables):
+                conn.execute(delete(table))
+            _load_rows(conn, path)
+    _clear_derived()
+    return time.perf_counter() - started
+
+
+def rebuild():
+    """删除并重建全部表，写入基础数据"""
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    init_basic_tables()
+    _clear_derived()
+
+
+def reset(name=DEFAULT_NAME):
+    """重置数据库：有快照时恢复快照，否则重建并保存快照；返回 (是否使用了快照, 耗时秒数)"""
+    started = time.perf_counter()
+    try:
+        restore(name)
+        return True, time.perf_counter() - started
+    except SnapshotMissing:
+        pass
+    rebuild()
+    capture(name)
+    return False, time.perf_counter() - started
@@ -0,0 +1,92 @@
+"""
+模板缓存
+- 字节码缓存：模板编译结果持久化到 JINJA_BYTECODE_CACHE_DIR（默认 instance/jinja_cache），
+  gunicorn 新启动的 worker 直接加载字节码，不再逐个重新编译 templates/ 下的模板；
+  模板文件修改后按源码校验值自动失效
+- 片段缓存：模板中以 {% cache name, version[, ttl] %}...{% endcache %} 包住很少变化的页面片段，
+  命中时直接输出缓存的 HTML，不再执行片段内的查询与渲染。
+  version 为片段所依赖数据的版本（如 rbac_version()）；每个 (模板, name) 只保存最新版本的一份 HTML，
+  版本不同即重新渲染并替换，旧版本不会在缓存中累积；
+  ttl 省略时使用 FRAGMENT_CACHE_TTL，兜底不带修改时间列的数据（如角色名称）被修改的情况
+
+片段内的数据通过可调用对象传入模板（如 rbac_overview），只在未命中缓存时才执行查询。
+多 worker 部署时每个进程各自缓存片段，与 services.cache 的其他分区一致。
+"""
+import os
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import func
+
+from models import db, Permission, Role, RolePermission, UserRole, SystemLog, EmployeeInfo
+from services.cache import get_cache
+from services.http_cache import table_version
+
+FRAGMENT_CACHE = 'fragment'  # 模板片段
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache name, version[, ttl] %}...{% endcache %}：按 (模板名, name) 缓存最新版本的片段渲染结果"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [nodes.Const(parser.name), parser.parse_expression()]
+        parser.stream.expect('comma')
+        args.append(parser.parse_expression())
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, template_name, name, version, ttl, caller):
+        config = current_app.config
+        if not config.get('FRAGMENT_CACHE_ENABLED', True):
+            return caller()
+        cache = get_cache(FRAGMENT_CACHE, config.get('FRAGMENT_CACHE_TTL', 300))
+        cached = cache.get((template_name, name))
+        if cached is not None and cached[0] == version:
+            return Markup(cached[1])
+        # 版本与内容取自同一数据源（副本读请求也一致），可以直接写入
+        html = str(caller())
+        cache.set((template_name, name), (version, html), ttl)
+        return Markup(html)
+
+
+def _id_version(model):
+    """无 update_time 列的表：(行数, 最大主键)，新增与删除都会改变"""
+    pk = model.__mapper__.primary_key[0]
+    return tuple(db.session.query(func.count(), func.max(pk)).select_from(model).one())
+
+
+def rbac_version():
+    """仪表盘权限/角色概览片段的数据版本（员工姓名随 employee_info 修改时间变化）"""
+    return (tuple(_id_version(model) for model in (Permission, Role, RolePermission, UserRole))
+            + (table_version(EmployeeInfo),))
+
+
+def log_version():
+    """系统日志片段的数据版本（日志只追加，按行数与最大 log_id 判断）"""
+    return _id_version(SystemLog)
+
+
+def init_app(app):
+    """注册片段缓存标签，并在配置了目录时启用字节码缓存"""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    directory = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def precompile(app):
+    """编译全部模板写入字节码缓存（部署后预热，返回模板数量）"""
+    names = app.jinja_env.list_templates(extensions=('html',))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
@@ -0,0 +1,97 @@
+"""
+HTTP 缓存
+- 条件请求：列表/报表页按 (行数, MAX(update_time)) 等廉价校验值生成 ETag / Last-Modified，
+  浏览器携带 If-None-Match / If-Modified-Since 且数据未变时，在执行主查询与模板渲染前直接返回 304
+- 响应压缩：HTML/JSON 等文本响应按 Accept-Encoding 进行 gzip 压缩
+
+页面头部显示当前登录员工、并可能带有一次性 flash 消息，因此 ETag 包含登录员工，
+存在待显示的 flash 消息时不做条件响应。
+"""
+import gzip
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, request, session, make_response
+from sqlalchemy import func
+
+from models import db
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript')
+
+
+def table_version(model):
+    """单表校验值：(行数, 最近修改时间)，要求模型带有 update_time 列"""
+    return tuple(db.session.query(func.count(), func.max(model.update_time)).select_from(model).one())
+
+
+def tables_version(*models):
+    """多表校验值，返回 (各表校验值, 其中最近的修改时间)"""
+    versions = [table_version(model) for model in models]
+    times = [updated for _, updated in versions if updated]
+    return versions, max(times) if times else None
+
+
+def _etag_for(validator_value):
+    raw = repr((request.full_path, session.get('employee_id'), validator_value))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def conditional(validator):
+    """视图装饰器：validator() 返回 (校验值, 最近修改时间或 None)
+
+    校验值未变时返回 304，不执行视图；否则执行视图并附上 ETag / Last-Modified。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            value, last_modified = validator()
+            etag = _etag_for(value)
+            if last_modified is not None:
+                # update_time 为本地时间，转换为 UTC 用于 HTTP 日期
+                last_modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since and last_modified is not None:
+                not_modified = last_modified <= request.if_modified_since
+
+            response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag, weak=True)
+                if last_modified is not None:
+                    response.last_modified = last_modified
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+                response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+
+def compress_response(response):
+    """after_request：对足够大的文本响应做 gzip 压缩"""
+    config = current_app.config
+    if (not config.get('GZIP_ENABLED', True)
+            or response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE_TYPES)):
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+    data = response.get_data()
+    if len(data) < config.get('GZIP_MIN_SIZE', 1024):
+        return response
+    response.set_data(gzip.compress(data, compresslevel=config.get('GZIP_LEVEL', 6)))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,193 @@
+"""
+库存核对
+库存表的数量由入库、销售、退货、调拨、盘点各处直接累加或改写，流水与库存不一致时没有任何提示。
+这里从流水重新推算每个 (药品, 仓库) 的应有数量并与库存表比较：
+
+    应有 = 入库 - 供应商退货 - 销售 + 销售退货 + 调入 - 调出 + Σ(盘点实际 - 盘点账面)
+
+- 集合运算：每类流水一条按药品分组的汇总查询（含冷存储归档表中的明细），不逐行读取明细
+- 分区：按仓库划分、互不依赖，可由多个进程并行核对（见 tools.inventory_audit）；
+  同一仓库的全部查询在一个读事务内完成，流水与库存取自同一时刻（SQLite 下显式 BEGIN）。
+  不同分区在不同时刻读取，核对期间有变动时按药品汇总比较的行可能出现暂时差异，重新核对即可确认
+- 盘点：盘点记录的 账面数量 为登记时锁定的系统库存，实际-账面 即盘点对库存的调整量；
+  此前手工录入账面数量的历史盘点若与当时库存不符，会表现为差异
+- 未记录仓库的历史流水（仓库字段为空）无法归属到仓库，涉及的药品改为汇总全部仓库后按药品比较
+- 修正（可选）：在一个事务内把库存改为应有数量，仅当库存仍等于核对时读到的数量才更新，
+  核对之后又有变动的行跳过；每条修正写入系统日志
+"""
+import json
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, update
+
+from models import (
+    db,
+    Inventory,
+    InventoryCheck,
+    StockIn,
+    ReturnStock,
+    Sales,
+    SalesReturn,
+    StockTransfer,
+    StockTransferItem,
+    SystemLog,
+    Warehouse,
+)
+from services.cold_tier import source
+from services.sqlite_profile import transaction_intent
+
+# 流水分量（按公式顺序），报告中逐项列出便于定位差异来源
+COMPONENTS = ('stock_in', 'supplier_return', 'sales', 'sales_return', 'transfer_in', 'transfer_out', 'check')
+SIGNS = {'stock_in': 1, 'supplier_return': -1, 'sales': -1, 'sales_return': 1,
+         'transfer_in': 1, 'transfer_out': -1, 'check': 1}
+FIX_REASON = '库存核对修正'
+
+# warehouse_id 为空表示按药品汇总比较（该药品有未记录仓库的流水）；book 为空表示没有库存记录
+Discrepancy = namedtuple('Discrepancy', 'drug_id warehouse_id book expected components')
+
+
+def partitions():
+    """核对分区：全部仓库 + None（未记录仓库的流水）"""
+    warehouse_ids = set(db.session.scalars(select(Warehouse.warehouse_id)))
+    warehouse_ids |= set(db.session.scalars(select(Inventory.warehouse_id).distinct()))
+    return sorted(warehouse_ids) + [None]
+
+
+def _movement_queries(warehouse_id):
+    """{分量: 按药品分组的 (drug_id, 数量) 查询}；warehouse_id 为 None 时只含可能缺少仓库的流水"""
+    stock_in, supplier_return = source(StockIn), source(ReturnStock)
+    sales, sales_return = source(Sales), source(SalesReturn)
+
+    def at(column):
+        return column.is_(None) if warehouse_id is None else column == warehouse_id
+
+    queries = {
+        'stock_in': select(stock_in.c.drug_id, func.sum(stock_in.c.quantity)).
+            where(at(stock_in.c.warehouse_id)).group_by(stock_in.c.drug_id),
+        'supplier_return': select(supplier_return.c.drug_id, func.sum(supplier_return.c.quantity)).
+            where(at(supplier_return.c.warehouse_id)).group_by(supplier_return.c.drug_id),
+        'sales': select(sales.c.drug_id, func.sum(sales.c.quantity)).
+            where(at(sales.c.warehouse_id)).group_by(sales.c.drug_id),
+        'sales_return': select(sales.c.drug_id, func.sum(sales_return.c.quantity)).
+            select_from(sales_return.join(sales, sales_return.c.sales_id == sales.c.sales_id)).
+            where(at(sales_return.c.warehouse_id)).group_by(sales.c.drug_id),
+    }
+    if warehouse_id is not None:
+        transfer_lines = select(StockTransferItem.drug_id, func.sum(StockTransferItem.quantity)).\
+            join(StockTransfer, StockTransferItem.transfer_id == StockTransfer.transfer_id).\
+            group_by(StockTransferItem.drug_id)
+        queries['transfer_in'] = transfer_lines.where(StockTransfer.to_warehouse_id == warehouse_id)
+        queries['transfer_out'] = transfer_lines.where(StockTransfer.from_warehouse_id == warehouse_id)
+        queries['check'] = select(InventoryCheck.drug_id,
+                                  func.sum(InventoryCheck.actual_quantity - InventoryCheck.checked_quantity)).\
+            where(InventoryCheck.warehouse_id == warehouse_id).group_by(InventoryCheck.drug_id)
+    return queries
+
+
+def _begin_read():
+    """开始读事务：pysqlite 在 SELECT 前不发出 BEGIN，每条查询各自读取最新数据，这里显式开始"""
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+
+
+def audit_partition(warehouse_id):
+    """汇总一个分区的流水与库存（只读，一个事务内完成）
+
+    返回 {'warehouse_id', 'seconds', 'drugs': {drug_id: {'book': 库存数量或 None, 分量: 数量, ...}}}，
+    只含可序列化的基本类型，便于在进程间传递。
+    """
+    started = time.perf_counter()
+    drugs = {}
+    try:
+        _begin_read()
+        for name, query in _movement_queries(warehouse_id).items():
+            for drug_id, quantity in db.session.execute(query):
+                drugs.setdefault(drug_id, {'book': None})[name] = int(quantity or 0)
+        if warehouse_id is not None:
+            for drug_id, quantity in db.session.execute(
+                    select(Inventory.drug_id, Inventory.quantity).where(Inventory.warehouse_id == warehouse_id)):
+                drugs.setdefault(drug_id, {'book': None})['book'] = quantity
+    finally:
+        db.session.rollback()  # 结束读事务
+    return {'warehouse_id': warehouse_id, 'seconds': round(time.perf_counter() - started, 2), 'drugs': drugs}
+
+
+def _expected(components):
+    return sum(SIGNS[name] * components.get(name, 0) for name in COMPONENTS)
+
+
+def reconcile(results):
+    """合并各分区结果，返回 (核对的行数, [Discrepancy])，按差异绝对值从大到小排序"""
+    by_warehouse = [result for result in results if result['warehouse_id'] is not None]
+    unattributed = next((result['drugs'] for result in results if result['warehouse_id'] is None), {})
+
+    audited, discrepancies = 0, []
+    drug_level = {drug_id: {'book': 0, **{name: 0 for name in COMPONENTS}} for drug_id in unattributed}
+    for result in by_warehouse:
+        for drug_id, row in result['drugs'].items():
+            if drug_id in drug_level:
+                total = drug_level[drug_id]
+                total['book'] += row['book'] or 0
+                for name in COMPONENTS:
+                    total[name] += row.get(name, 0)
+                continue
+            audited += 1
+            components = {name: row.get(name, 0) for name in COMPONENTS}
+            expected = _expected(components)
+            if (row['book'] or 0) != expected:
+                discrepancies.append(Discrepancy(drug_id, result['warehouse_id'], row['book'], expected, components))
+    for drug_id, total in drug_level.items():
+        for name in COMPONENTS:
+            total[name] += unattributed[drug_id].get(name, 0)
+        audited += 1
+        components = {name: total[name] for name in COMPONENTS}
+        expected = _expected(components)
+        if total['book'] != expected:
+            discrepancies.append(Discrepancy(drug_id, None, total['book'], expected, components))
+    discrepancies.sort(key=lambda d: (-abs(d.expected - (d.book or 0)), d.drug_id, d.warehouse_id or 0))
+    return audited, discrepancies
+
+
+@transaction_intent(True)
+def apply_fixes(discrepancies, employee_id=None):
+    """在一个事务内把库存改为应有数量，返回 (修正行数, [跳过的 (Discrepancy, 原因)])
+
+    按药品汇总的差异无法确定应修正哪个仓库、应有数量为负说明流水本身有误，这两类只报告不修正。
+    """
+    fixed, skipped, logs = 0, [], []
+    now = datetime.now()
+    for item in discrepancies:
+        if item.warehouse_id is None:
+            skipped.append((item, '流水缺少仓库，无法确定修正哪个仓库'))
+            continue
+        if item.expected < 0:
+            skipped.append((item, '应有数量为负，需先核查流水'))
+            continue
+        if item.book is None:
+            db.session.execute(insert(Inventory).values(drug_id=item.drug_id, warehouse_id=item.warehouse_id,
+                                                        quantity=item.expected, create_time=now, update_time=now))
+        else:
+            changed = db.session.execute(
+                update(Inventory).
+                where(Inventory.drug_id == item.drug_id, Inventory.warehouse_id == item.warehouse_id,
+                      Inventory.quantity == item.book).
+                values(quantity=item.expected).
+                execution_options(synchronize_session=False)
+            ).rowcount
+            if not changed:
+                skipped.append((item, '核对后库存已变动'))
+                continue
+        fixed += 1
+        logs.append({
+            'employee_id': employee_id, 'action_type': 'update', 'table_name': 'inventory', 'action_time': now,
+            'action_content': json.dumps({'drug_id': item.drug_id, 'warehouse_id': item.warehouse_id,
+                                          'before': item.book, 'after': item.expected, 'reason': FIX_REASON},
+                                         ensure_ascii=False),
+        })
+    if logs:
+        db.session.execute(insert(SystemLog), logs)
+    db.session.commit()
+    return fixed, skipped
@@ -0,0 +1,154 @@
+"""
+后台任务
+基于 background_job 表 + 进程内线程池的本地任务队列，无需外部消息中间件。
+- enqueue() 写入任务记录后立即返回，由线程池在应用上下文中执行
+- 相同 job_key 的任务在排队/运行期间合并为一条（dedupe_key 唯一约束，跨 worker 生效）
+- 任务函数通过 progress(done, total, message) 汇报进度，结束后清理指定的缓存分区
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db, BackgroundJob
+from services.cache import invalidate
+from services.sqlite_profile import transaction_intent
+
+JOB_QUEUED = '排队中'
+JOB_RUNNING = '运行中'
+JOB_DONE = '已完成'
+JOB_FAILED = '失败'
+
+# job_type -> (处理函数, 结束后需清空的缓存分区)
+_handlers = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def job_handler(job_type, invalidates=()):
+    """注册任务处理函数：handler(params, progress) -> 结果说明"""
+    def decorator(fn):
+        _handlers[job_type] = (fn, tuple(invalidates))
+        return fn
+    return decorator
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('JOB_WORKERS', 2),
+                                           thread_name_prefix='job')
+        return _executor
+
+
+def _release_stale(job_key, app):
+    """排队/运行超时的任务（如所在进程已退出）标记失败，释放合并键"""
+    stale_before = datetime.now() - timedelta(seconds=app.config.get('JOB_STALE_SECONDS', 3600))
+    job = BackgroundJob.query.filter_by(dedupe_key=job_key).first()
+    if job and (job.start_time or job.create_time) < stale_before:
+        job.status = JOB_FAILED
+        job.message = '任务超时未完成，已被新任务取代'
+        job.dedupe_key = None
+        job.finish_time = datetime.now()
+        db.session.commit()
+        return None
+    return job
+
+
+def enqueue(job_type, job_key, params=None, employee_id=None):
+    """提交任务，返回 (任务, 是否新建)；同 job_key 的任务未结束时直接返回已有任务"""
+    app = current_app._get_current_object()
+    existing = _release_stale(job_key, app)
+    if existing:
+        return existing, False
+    job = BackgroundJob(
+        job_type=job_type,
+        job_key=job_key,
+        dedupe_key=job_key,
+        params=json.dumps(params or {}, ensure_ascii=False),
+        status=JOB_QUEUED,
+        employee_id=employee_id
+    )
+    db.session.add(job)
+    try:
+        db.session.flush()
+        # 提交前取出主键：提交后访问属性会在当前会话开启新事务（SQLite 单写者配置下会占住写锁）
+        job_id = job.job_id
+        db.session.commit()
+    except IntegrityError:
+        # 其他 worker 刚好提交了同一任务
+        db.session.rollback()
+        return BackgroundJob.query.filter_by(dedupe_key=job_key).first(), False
+
+    if app.config.get('JOB_RUN_INLINE'):
+        _run(app, job_id)
+        db.session.refresh(job)
+    else:
+        _get_executor(app).submit(_run, app, job_id)
+    return job, True
+
+
+def _run(app, job_id):
+    """在独立的应用上下文中执行任务并记录状态（任务会写入结果，SQLite 下事务按写事务开始）"""
+    with app.app_context(), transaction_intent(True):
+        try:
+            job = BackgroundJob.query.get(job_id)
+            if job is None or job.status != JOB_QUEUED:
+                return
+            handler, invalidates = _handlers[job.job_type]
+            job.status = JOB_RUNNING
+            job.start_time = datetime.now()
+            db.session.commit()
+
+            last_commit = [time.monotonic()]
+
+            def progress(done, total=None, message=None):
+                job.progress = done
+                if total is not None:
+                    job.total = total
+                if message:
+                    job.message = message
+                # 进度最多每秒单独提交一次，其余随处理函数自身的提交一并写入
+                if time.monotonic() - last_commit[0] >= 1:
+                    db.session.commit()
+                    last_commit[0] = time.monotonic()
+
+            try:
+                result = handler(json.loads(job.params or '{}'), progress)
+                job.status = JOB_DONE
+                job.message = result or '完成'
+            except Exception as e:
+                db.session.rollback()
+                app.logger.exception('后台任务 %s 执行失败', job_id)
+                job = BackgroundJob.query.get(job_id)
+                job.status = JOB_FAILED
+                job.message = str(e)[:500]
+            job.dedupe_key = None
+            job.finish_time = datetime.now()
+            db.session.commit()
+            if job.status == JOB_DONE:
+                invalidate(*invalidates)
+        finally:
+            db.session.remove()
+
+
+def job_to_dict(job):
+    """任务状态的 JSON 表示"""
+    return {
+        'job_id': job.job_id,
+        'job_type': job.job_type,
+        'job_key': job.job_key,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': round(job.progress * 100 / job.total, 1) if job.total else (100.0 if job.status == JOB_DONE else 0.0),
+        'message': job.message,
+        'create_time': job.create_time.strftime('%Y-%m-%d %H:%M:%S') if job.create_time else None,
+        'start_time': job.start_time.strftime('%Y-%m-%d %H:%M:%S') if job.start_time else None,
+        'finish_time': job.finish_time.strftime('%Y-%m-%d %H:%M:%S') if job.finish_time else None,
+    }
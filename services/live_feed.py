@@ -0,0 +1,157 @@
+"""
+仪表盘实时推送（Server-Sent Events）
+销售登记、销售退货、入库、供应商退货、库存盘点等写操作提交后调用 notify()，
+打开仪表盘的浏览器通过 /dashboard/stream 接收变化的指标（今日/本月销售额、库存总数、低库存预警）。
+
+- 进程内发布/订阅：每个进程一个 LiveFeed，后台线程在收到变更通知后计算一次指标，
+  所有打开的连接共享同一份结果，各自只推送与上次发送相比变化的字段；
+  数百个仪表盘连接对应每次变更一次计算，而不是每次刷新一次完整查询
+- 跨进程：notify() 同时更新 LIVE_FEED_SIGNAL_FILE 的修改时间，其他 gunicorn worker 的后台线程
+  每 LIVE_FEED_POLL_SECONDS 秒检查一次该文件（一次 stat），发现变化后各自重新计算一次
+- 连续多次提交在同一轮检查内合并为一次计算；没有连接时不计算，下次有连接订阅时再算
+
+每个 SSE 连接会长期占用一个 worker 线程，部署时应使用多线程或协程 worker
+（如 gunicorn -k gthread --threads 50，或 -k gevent）。
+"""
+import json
+import os
+import threading
+
+from flask import current_app
+
+from models import db
+from services.snapshots import refresh_inventory_snapshot, sales_totals
+from services.sqlite_profile import transaction_intent
+
+
+def compute_kpis():
+    """计算推送给仪表盘的指标（绕过快照缓存，并顺带刷新本进程的库存快照）"""
+    snapshot = refresh_inventory_snapshot()
+    today_sales, month_sales = sales_totals()
+    return {
+        'today_sales': float(today_sales),
+        'month_sales': float(month_sales),
+        'total_inventory': int(snapshot['total_inventory']),
+        'low_stock_count': snapshot['low_stock_count'],
+        'total_drugs': snapshot['total_drugs'],
+        'low_stock_items': [[quantity, name, unit] for quantity, name, unit in snapshot['low_stock_items']],
+    }
+
+
+class LiveFeed:
+    """单进程的指标发布者：后台线程计算，订阅连接等待版本号变化"""
+
+    def __init__(self, app):
+        self.app = app
+        self.signal_file = app.config['LIVE_FEED_SIGNAL_FILE']
+        self.poll_seconds = app.config.get('LIVE_FEED_POLL_SECONDS', 1)
+        self.version = 0
+        self.state = None
+        self.subscribers = 0
+        self._dirty = True  # 上次计算后是否有未处理的变更
+        self._changed = threading.Event()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._signal_mtime = self._read_signal()
+
+    def _read_signal(self):
+        try:
+            return os.stat(self.signal_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _touch_signal(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.signal_file)), exist_ok=True)
+        with open(self.signal_file, 'a'):
+            os.utime(self.signal_file, None)
+
+    def notify(self):
+        """本进程提交了相关修改：唤醒本进程计算，并通知其他进程"""
+        try:
+            self._touch_signal()
+        except OSError:
+            current_app.logger.warning('无法更新实时推送信号文件 %s', self.signal_file)
+        self._changed.set()
+
+    def subscribe(self):
+        with self._condition:
+            self.subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+                self._thread.start()
+        if self._dirty or self.state is None:
+            self._changed.set()
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+    def wait(self, seen_version, timeout):
+        """等待版本号超过 seen_version，返回 (版本号, 指标)；超时返回原版本号"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version > seen_version, timeout)
+            return self.version, self.state
+
+    def _run(self):
+        while True:
+            changed = self._changed.wait(self.poll_seconds)
+            self._changed.clear()
+            mtime = self._read_signal()
+            if mtime != self._signal_mtime:
+                self._signal_mtime = mtime
+                changed = True
+            self._dirty = self._dirty or changed
+            if not self._dirty or not self.subscribers:
+                continue
+            self._dirty = False
+            try:
+                # 只读：不占用 SQLite 单写者锁，不阻塞收银等写请求
+                with self.app.app_context(), transaction_intent(False):
+                    try:
+                        state = compute_kpis()
+                    finally:
+                        db.session.remove()
+            except Exception:
+                self._dirty = True
+                self.app.logger.exception('实时推送指标计算失败')
+                continue
+            with self._condition:
+                if state != self.state:
+                    self.state = state
+                    self.version += 1
+                    self._condition.notify_all()
+
+
+def stream(feed, keepalive_seconds):
+    """SSE 事件流生成器：首条消息为完整指标，之后只推送变化的字段"""
+    feed.subscribe()
+    try:
+        yield 'retry: 3000\n\n'
+        seen, sent = 0, {}
+        while True:
+            version, state = feed.wait(seen, keepalive_seconds)
+            if version == seen or state is None:
+                yield ': keepalive\n\n'  # 注释行，防止代理因空闲关闭连接
+                continue
+            delta = {key: value for key, value in state.items() if sent.get(key) != value}
+            seen, sent = version, state
+            if delta:
+                yield f'event: kpi\ndata: {json.dumps(delta, ensure_ascii=False)}\n\n'
+    finally:
+        feed.unsubscribe()
+
+
+def get_feed():
+    return current_app.extensions['live_feed']
+
+
+def notify():
+    """写操作提交后调用；未启用实时推送时忽略"""
+    feed = current_app.extensions.get('live_feed')
+    if feed is not None:
+        feed.notify()
+
+
+def init_app(app):
+    if app.config.get('LIVE_FEED_ENABLED', True):
+        app.extensions['live_feed'] = LiveFeed(app)
@@ -0,0 +1,368 @@
+"""
+收银终端交易接入
+收银终端以 JSON 批量提交销售与销售退货（含离线期间积压的交易），每行带终端生成的幂等键：
+
+- 去重：已入账的行记录在 pos_transaction，唯一约束 (terminal_id, idempotency_key)；
+  重发同一键直接返回首次入账的记录号（duplicate=true），同一批内重复的键只入账一次
+- 组提交：各请求线程把解析后的提交放入本进程队列，由一个提交线程把排队中的多个终端的提交
+  合并到同一个事务：批量查询药品/客户/原销售单，按 (仓库, 药品) 顺序一次锁定相关库存行，
+  在内存中逐行校验并扣减，然后批量插入、以 CASE 表达式一次更新库存、按日桶合并累加销售汇总，
+  最后只提交一次；提交线程处理当前组时到达的请求自然组成下一组
+- 校验规则与表单登记一致：药品、客户存在且未归档，库存存在且数量足够；
+  退货对应的销售单须在在线表中（已转入冷存储的不受理），退货数量不超过销售数量。
+  不通过的行返回 rejected 与原因，不影响同组的其他行，也不记录幂等键（补货后可用同一键重发）
+
+组事务失败（如另一进程同时入账了同一幂等键）时回滚，并把组内各提交拆开逐个重试。
+POS_GROUP_COMMIT=False 时在请求线程内直接处理（每个请求一个事务）。
+"""
+import queue
+import threading
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import case, select, update
+
+from models import db, Sales, SalesReturn, Inventory, DrugInfo, CustomerInfo, PosTransaction
+from services import live_feed, sales_cube
+from services.cache import REPORT_CACHE, DASHBOARD_CACHE, invalidate
+from services.dbutil import upsert_increment
+from services.sqlite_profile import transaction_intent
+
+DEFAULT_WAREHOUSE_ID = 1  # 与表单登记一致：未指定仓库时为 1 号仓库
+IN_CHUNK = 500  # IN 列表分批大小
+
+
+class PosError(ValueError):
+    """提交格式不合法（整个请求被拒绝）"""
+
+
+class Submission:
+    """一个请求中的全部交易行；lines 为解析后的字典，kind 为 sale / return"""
+    __slots__ = ('terminal_id', 'lines', 'results', 'error', 'done')
+
+    def __init__(self, terminal_id, lines):
+        self.terminal_id = terminal_id
+        self.lines = lines
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+def _int(line, name, default=None):
+    value = line.get(name, default)
+    if value is None:
+        raise PosError(f'缺少字段 {name}')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise PosError(f'字段 {name} 必须是整数：{value!r}')
+
+
+def _date(line, name):
+    value = line.get(name)
+    if not value:
+        return date.today()
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise PosError(f'字段 {name} 必须是 YYYY-MM-DD 日期：{value!r}')
+
+
+def _key(line):
+    key = line.get('key')
+    if not isinstance(key, str) or not key or len(key) > 100:
+        raise PosError('每行须有 1~100 个字符的幂等键 key')
+    return key
+
+
+def parse_submission(data, max_lines):
+    """校验请求 JSON 并返回 Submission；格式错误抛出 PosError"""
+    if not isinstance(data, dict):
+        raise PosError('请求体须为 JSON 对象')
+    terminal_id = data.get('terminal_id')
+    if not isinstance(terminal_id, str) or not terminal_id or len(terminal_id) > 50:
+        raise PosError('须提供 1~50 个字符的 terminal_id')
+    sales, returns = data.get('sales') or [], data.get('returns') or []
+    if not isinstance(sales, list) or not isinstance(returns, list):
+        raise PosError('sales 和 returns 须为数组')
+    if not sales and not returns:
+        raise PosError('至少需要一行销售或退货')
+    if len(sales) + len(returns) > max_lines:
+        raise PosError(f'单次最多提交 {max_lines} 行')
+    employee_id = data.get('employee_id')
+
+    lines = []
+    for line in sales:
+        if not isinstance(line, dict):
+            raise PosError('sales 的每一行须为 JSON 对象')
+        lines.append({
+            'kind': 'sale',
+            'key': _key(line),
+            'drug_id': _int(line, 'drug_id'),
+            'customer_id': _int(line, 'customer_id'),
+            'quantity': _int(line, 'quantity'),
+            'warehouse_id': _int(line, 'warehouse_id', DEFAULT_WAREHOUSE_ID),
+            'sales_date': _date(line, 'sales_date'),
+            'employee_id': _int(line, 'employee_id', employee_id or 1),
+        })
+    for line in returns:
+        if not isinstance(line, dict):
+            raise PosError('returns 的每一行须为 JSON 对象')
+        lines.append({
+            'kind': 'return',
+            'key': _key(line),
+            'sales_id': _int(line, 'sales_id'),
+            'quantity': _int(line, 'quantity'),
+            'warehouse_id': _int(line, 'warehouse_id', DEFAULT_WAREHOUSE_ID),
+            'return_date': _date(line, 'return_date'),
+            'reason': line.get('reason'),
+            'employee_id': _int(line, 'employee_id', employee_id or 1),
+        })
+    return Submission(terminal_id, lines)
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), IN_CHUNK):
+        yield values[start:start + IN_CHUNK]
+
+
+def _existing_keys(submissions):
+    """已入账的幂等键 {(terminal_id, key): (kind, record_id)}"""
+    wanted = {(sub.terminal_id, line['key']) for sub in submissions for line in sub.lines}
+    found = {}
+    for terminal_id in {terminal for terminal, _ in wanted}:
+        keys = [key for terminal, key in wanted if terminal == terminal_id]
+        for chunk in _chunks(keys):
+            rows = db.session.execute(
+                select(PosTransaction.idempotency_key, PosTransaction.kind, PosTransaction.record_id).
+                where(PosTransaction.terminal_id == terminal_id, PosTransaction.idempotency_key.in_(chunk))
+            )
+            found.update({(terminal_id, key): (kind, record_id) for key, kind, record_id in rows})
+    return found
+
+
+def _load(columns, key_column, ids):
+    """按主键批量读取 {id: row}"""
+    rows = {}
+    for chunk in _chunks(sorted(ids)):
+        rows.update({row[0]: row for row in db.session.execute(select(key_column, *columns).
+                                                               where(key_column.in_(chunk)))})
+    return rows
+
+
+def _lock_inventory(pairs):
+    """按 (仓库, 药品) 顺序锁定相关库存行，返回 {(warehouse_id, drug_id): [inventory_id, 当前数量, 本组变动]}"""
+    stock = {}
+    warehouse_ids = sorted({warehouse_id for warehouse_id, _ in pairs})
+    for chunk in _chunks(sorted({drug_id for _, drug_id in pairs})):
+        rows = db.session.execute(
+            select(Inventory.inventory_id, Inventory.warehouse_id, Inventory.drug_id, Inventory.quantity).
+            where(Inventory.warehouse_id.in_(warehouse_ids), Inventory.drug_id.in_(chunk)).
+            order_by(Inventory.warehouse_id, Inventory.drug_id).
+            with_for_update()
+        )
+        stock.update({(row.warehouse_id, row.drug_id): [row.inventory_id, row.quantity, 0] for row in rows})
+    return stock
+
+
+def apply_submissions(submissions):
+    """在一个事务内入账多个提交，为每个 Submission 设置 results；失败时回滚并抛出异常"""
+    existing = _existing_keys(submissions)
+    sale_lines = [line for sub in submissions for line in sub.lines if line['kind'] == 'sale']
+    return_lines = [line for sub in submissions for line in sub.lines if line['kind'] == 'return']
+
+    originals = _load((Sales.drug_id, Sales.customer_id, Sales.customer_type, Sales.quantity, Sales.unit_price,
+                       Sales.unit_cost, Sales.employee_id, Sales.warehouse_id),
+                      Sales.sales_id, {line['sales_id'] for line in return_lines})
+    drugs = _load((DrugInfo.is_active, DrugInfo.sale_price, DrugInfo.purchase_price), DrugInfo.drug_id,
+                  {line['drug_id'] for line in sale_lines})
+    customers = _load((CustomerInfo.is_active, CustomerInfo.type), CustomerInfo.customer_id,
+                      {line['customer_id'] for line in sale_lines})
+    pairs = {(line['warehouse_id'], line['drug_id']) for line in sale_lines}
+    pairs |= {(line['warehouse_id'], originals[line['sales_id']].drug_id)
+              for line in return_lines if line['sales_id'] in originals}
+    stock = _lock_inventory(pairs) if pairs else {}
+
+    pending = {}  # 本组内首次出现的幂等键 -> 入账对象
+    new_stock = {}  # 退货回补到尚无库存记录的 (仓库, 药品)
+    sales, returns = [], []
+    for sub in submissions:
+        sub.results = []
+        for line in sub.lines:
+            ident = (sub.terminal_id, line['key'])
+            result = {'key': line['key'], 'kind': line['kind']}
+            sub.results.append(result)
+            if ident in existing:
+                kind, record_id = existing[ident]
+                result.update(status='accepted', duplicate=True, kind=kind, record_id=record_id)
+                continue
+            if ident in pending:
+                result.update(status='accepted', duplicate=True, kind=pending[ident][0])
+                result['_record'] = pending[ident][1]
+                continue
+            if line['quantity'] <= 0:
+                result.update(status='rejected', error='数量必须大于0')
+                continue
+
+            if line['kind'] == 'sale':
+                drug = drugs.get(line['drug_id'])
+                customer = customers.get(line['customer_id'])
+                inventory = stock.get((line['warehouse_id'], line['drug_id']))
+                if not drug or not drug.is_active:
+                    error = '指定的药品不存在！'
+                elif not customer or not customer.is_active:
+                    error = '指定的客户不存在，请先添加客户信息！'
+                elif not inventory:
+                    error = '该药品无库存，无法销售！'
+                elif inventory[1] < line['quantity']:
+                    error = f'库存不足！当前库存：{inventory[1]}，销售数量：{line["quantity"]}'
+                else:
+                    error = None
+                if error:
+                    result.update(status='rejected', error=error)
+                    continue
+                inventory[1] -= line['quantity']
+                inventory[2] -= line['quantity']
+                record = Sales(drug_id=line['drug_id'], customer_id=line['customer_id'],
+                               customer_type=customer.type, quantity=line['quantity'], unit_price=drug.sale_price,
+                               unit_cost=drug.purchase_price, sales_date=line['sales_date'],
+                               warehouse_id=line['warehouse_id'], employee_id=line['employee_id'])
+                sales.append(record)
+            else:
+                sale = originals.get(line['sales_id'])
+                if not sale:
+                    result.update(status='rejected', error='指定的销售记录不存在或已转入历史归档！')
+                    continue
+                if line['quantity'] > sale.quantity:
+                    result.update(status='rejected', error=f'退货数量不能超过销售数量！销售数量：{sale.quantity}')
+                    continue
+                pair = (line['warehouse_id'], sale.drug_id)
+                if pair in stock:
+                    stock[pair][1] += line['quantity']
+                    stock[pair][2] += line['quantity']
+                else:
+                    new_stock[pair] = new_stock.get(pair, 0) + line['quantity']
+                record = SalesReturn(sales_id=line['sales_id'], quantity=line['quantity'],
+                                     unit_price=sale.unit_price, unit_cost=sale.unit_cost,
+                                     reason=line['reason'], return_date=line['return_date'],
+                                     warehouse_id=line['warehouse_id'], employee_id=line['employee_id'])
+                returns.append((record, sale))
+            result.update(status='accepted', duplicate=False)
+            result['_record'] = record
+            pending[ident] = (line['kind'], record)
+
+    if not pending:
+        db.session.rollback()
+        return
+
+    db.session.add_all(sales + [record for record, _ in returns])
+    db.session.flush()
+
+    # 库存：已有记录以 CASE 表达式一次累加本组变动，退货回补到新 (仓库, 药品) 时 upsert 新建
+    deltas = {inventory_id: delta for inventory_id, _, delta in stock.values() if delta}
+    if deltas:
+        db.session.execute(
+            update(Inventory).
+            where(Inventory.inventory_id.in_(list(deltas))).
+            values(quantity=Inventory.quantity + case(deltas, value=Inventory.inventory_id, else_=0)).
+            execution_options(synchronize_session=False)
+        )
+    for (warehouse_id, drug_id), quantity in new_stock.items():
+        upsert_increment(Inventory.__table__, {'drug_id': drug_id, 'warehouse_id': warehouse_id},
+                         {'quantity': quantity})
+    sales_cube.record_many(sales, returns)
+
+    ledger = []
+    for sub in submissions:
+        for result in sub.results:
+            record = result.pop('_record', None)
+            if record is None:
+                continue
+            result['record_id'] = record.sales_id if result['kind'] == 'sale' else record.sales_return_id
+            if not result['duplicate']:
+                ledger.append({'terminal_id': sub.terminal_id, 'idempotency_key': result['key'],
+                               'kind': result['kind'], 'record_id': result['record_id']})
+    db.session.execute(PosTransaction.__table__.insert(), ledger)
+    db.session.commit()
+    invalidate(REPORT_CACHE, DASHBOARD_CACHE)
+    live_feed.notify()
+
+
+def _apply(submissions):
+    """入账一组提交；组事务失败时拆开逐个重试，仍失败的提交记录异常"""
+    try:
+        apply_submissions(submissions)
+    except Exception as e:
+        db.session.rollback()
+        if len(submissions) == 1:
+            submissions[0].error = e
+            current_app.logger.exception('收银终端提交入账失败')
+        else:
+            for sub in submissions:
+                _apply([sub])
+
+
+class GroupCommitter:
+    """进程内组提交：请求线程排队等待，提交线程把排队中的提交合并为一个事务"""
+
+    def __init__(self, app):
+        self.app = app
+        self.max_lines = app.config.get('POS_GROUP_MAX_LINES', 5000)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, submission, timeout):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pos-group-commit', daemon=True)
+                self._thread.start()
+        self._queue.put(submission)
+        if not submission.done.wait(timeout):
+            raise TimeoutError('入账等待超时')
+
+    def _next_group(self):
+        group = [self._queue.get()]
+        lines = len(group[0].lines)
+        while lines < self.max_lines:
+            try:
+                submission = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            group.append(submission)
+            lines += len(submission.lines)
+        return group
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            try:
+                with self.app.app_context(), transaction_intent(True):
+                    try:
+                        _apply(group)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                for submission in group:
+                    submission.error = submission.error or e
+            finally:
+                for submission in group:
+                    submission.done.set()
+
+
+def ingest(submission):
+    """入账一个提交并返回逐行结果；入账失败抛出异常"""
+    committer = current_app.extensions.get('pos_group_commit')
+    if committer is None:
+        _apply([submission])
+    else:
+        committer.submit(submission, current_app.config.get('POS_SUBMIT_TIMEOUT', 30))
+    if submission.error:
+        raise submission.error
+    return submission.results
+
+
+def init_app(app):
+    if app.config.get('POS_GROUP_COMMIT', True):
+        app.extensions['pos_group_commit'] = GroupCommitter(app)
@@ -0,0 +1,55 @@
+"""
+列表页读模型
+库存、销售、入库列表只显示少数几列，不需要完整的 ORM 实体：
+以只含所需列的 select() 投影查询，结果直接构造成 namedtuple（__slots__ 为空的元组子类），
+不进入会话的 identity map、没有变更跟踪与属性插装，每行只占一个元组的内存。
+
+模板按属性名访问（row.drug_name、row.quantity），与原先 ORM 实体的写法一致。
+"""
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from models import db, Inventory, Sales, StockIn, DrugInfo, CustomerInfo, SupplierInfo, EmployeeInfo, Warehouse
+
+StockRow = namedtuple('StockRow', 'drug_name warehouse_name quantity unit location last_check_date')
+SalesRow = namedtuple('SalesRow', 'sales_id drug_name customer_name quantity unit_price sales_date employee_name')
+StockInRow = namedtuple('StockInRow', 'stock_in_id drug_name supplier_name quantity stock_in_date employee_name remark')
+
+
+def _fetch(row_type, stmt):
+    """执行列投影查询并构造成 row_type 列表"""
+    return list(map(row_type._make, db.session.execute(stmt).tuples()))
+
+
+def stock_rows(below=None):
+    """库存列表（不含已归档的药品）；below 不为空时只返回库存低于该值的行"""
+    stmt = select(DrugInfo.name, Warehouse.name, Inventory.quantity, DrugInfo.unit,
+                  Inventory.location, Inventory.last_check_date).\
+        join_from(Inventory, DrugInfo, Inventory.drug_id == DrugInfo.drug_id).\
+        join(Warehouse, Inventory.warehouse_id == Warehouse.warehouse_id).\
+        where(DrugInfo.is_active.is_(True))
+    if below is not None:
+        stmt = stmt.where(Inventory.quantity < below)
+    return _fetch(StockRow, stmt)
+
+
+def sales_rows():
+    """销售列表，按销售日期倒序"""
+    stmt = select(Sales.sales_id, DrugInfo.name, CustomerInfo.name, Sales.quantity, Sales.unit_price,
+                  Sales.sales_date, EmployeeInfo.name).\
+        join_from(Sales, DrugInfo, Sales.drug_id == DrugInfo.drug_id).\
+        join(CustomerInfo, Sales.customer_id == CustomerInfo.customer_id).\
+        join(EmployeeInfo, Sales.employee_id == EmployeeInfo.employee_id).\
+        order_by(Sales.sales_date.desc())
+    return _fetch(SalesRow, stmt)
+
+
+def stock_in_rows():
+    """入库列表"""
+    stmt = select(StockIn.stock_in_id, DrugInfo.name, SupplierInfo.name, StockIn.quantity, StockIn.stock_in_date,
+                  EmployeeInfo.name, StockIn.remark).\
+        join_from(StockIn, DrugInfo, StockIn.drug_id == DrugInfo.drug_id).\
+        join(SupplierInfo, StockIn.supplier_id == SupplierInfo.supplier_id).\
+        join(EmployeeInfo, StockIn.employee_id == EmployeeInfo.employee_id)
+    return _fetch(StockInRow, stmt)
@@ -0,0 +1,81 @@
+"""
+读写分离
+READ_REPLICA_URIS 配置只读副本后，以 @replica_read 标记的列表/报表视图在副本上查询，其余全部走主库：
+
+- 副本注册为 SQLALCHEMY_BINDS 中的 replica_0、replica_1 ...（模型不绑定这些键，create_all 不会在副本建表）
+- RoutingSession.get_bind：当前请求标记为副本读且语句是普通 SELECT 时返回本请求选定的副本引擎；
+  flush、INSERT/UPDATE/DELETE 与 SELECT ... FOR UPDATE 始终走主库
+- 写后读一致：非 GET 请求成功后在会话 cookie 中记录 READ_YOUR_WRITES_SECONDS 秒的主库窗口，
+  窗口内该用户的副本读视图仍走主库，能立即看到自己刚提交的修改
+
+同一请求只选用一个副本，避免同一页面的多次查询落在复制进度不同的副本上。
+进程内缓存（services.cache）由各请求共享：副本读请求可以读取缓存，但未命中时算出的结果不写入缓存，
+缓存只由主库查询填充，写后读窗口内的用户不会经由缓存读到其他用户从副本取得的旧数据。
+本地测试可用另一个 SQLite 文件充当副本，由 python -m tools.replica_sync 从主库复制。
+"""
+import random
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REPLICA_PREFIX = 'replica_'
+PRIMARY_UNTIL = '_primary_until'  # 会话 cookie 中主库窗口的截止时间戳
+
+
+def _replica_keys(engines):
+    return [key for key in engines if key and key.startswith(REPLICA_PREFIX)]
+
+
+class RoutingSession(Session):
+    """按请求标记把只读查询路由到副本的会话"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and has_request_context() and g.get('replica_bind')
+                and not self._flushing
+                and not isinstance(clause, UpdateBase)
+                and getattr(clause, '_for_update_arg', None) is None):
+            engine = self._db.engines.get(g.replica_bind)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def reading_replica():
+    """当前请求的只读查询是否走副本"""
+    return has_request_context() and bool(g.get('replica_bind'))
+
+
+def replica_read(view):
+    """视图装饰器：本请求的只读查询走副本（未配置副本或处于写后读窗口时走主库）"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in READ_METHODS and session.get(PRIMARY_UNTIL, 0) <= time.time():
+            keys = _replica_keys(current_app.extensions['sqlalchemy'].engines)
+            if keys:
+                g.replica_bind = random.choice(keys)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _open_primary_window(response):
+    """after_request：写请求成功后开启写后读窗口"""
+    if request.method not in READ_METHODS and response.status_code < 400:
+        seconds = current_app.config.get('READ_YOUR_WRITES_SECONDS', 5)
+        if seconds:
+            session[PRIMARY_UNTIL] = time.time() + seconds
+    return response
+
+
+def init_app(app):
+    """把 READ_REPLICA_URIS 注册为副本绑定（需在 db.init_app 之前调用）"""
+    uris = app.config.get('READ_REPLICA_URIS') or []
+    if not uris:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds.update({f'{REPLICA_PREFIX}{index}': uri for index, uri in enumerate(uris)})
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.after_request(_open_primary_window)
@@ -0,0 +1,220 @@
+"""
+销售多维分析（sales cube）
+按 日期 × 药品 × 客户类型 × 经办人 × 仓库 预聚合销售与退货，
+任意切片/切块/下钻查询只读取汇总表，区间查询由数据库合并日桶完成。
+药品分类不存入日桶，查询时按药品当前分类归并：修改药品分类后，该药品全部历史销售与退货一同归入新分类，
+销售与其退货不会因分类变动落入不同分类。
+客户类型取销售单上记录的销售时类型（sales.customer_type），退货沿用原销售单的类型，
+客户之后改类型既不拆分一笔销售与其退货，也不会在重建时把历史移入新类型。
+
+维护方式：
+- 增量：sales_add / return_add 在同一事务中调用 record_sale / record_return 累加对应日桶
+- 重建：rebuild(start, end) 以分组查询从明细重算区间内的日桶（历史初始化、夜间日结校正）
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, select
+
+from models import db, Sales, SalesReturn, DrugInfo, EmployeeInfo, Warehouse, SalesCubeDaily
+from services.dbutil import upsert_increment, period_expr
+from services.cold_tier import source
+
+UNCATEGORIZED = '未分类'
+
+# 维度名称 -> 汇总表列
+DIMENSIONS = {
+    'drug': SalesCubeDaily.drug_id,
+    'category': func.coalesce(func.nullif(DrugInfo.category, ''), UNCATEGORIZED),  # 查询时关联药品当前分类
+    'customer_type': SalesCubeDaily.customer_type,
+    'employee': SalesCubeDaily.employee_id,
+    'warehouse': SalesCubeDaily.warehouse_id,
+}
+GRANULARITIES = ('day', 'month', 'year')
+MEASURES = ('sales_count', 'quantity', 'amount', 'cost', 'return_quantity', 'return_amount', 'return_cost')
+
+
+def _bucket_key(stat_date, drug_id, customer_type, employee_id, warehouse_id):
+    return {
+        'stat_date': stat_date,
+        'drug_id': int(drug_id),
+        'customer_type': customer_type,
+        'employee_id': int(employee_id or 0),
+        'warehouse_id': int(warehouse_id or 0),
+    }
+
+
+def record_sale(sale):
+    """销售登记后累加日桶（调用方负责提交事务）"""
+    key = _bucket_key(sale.sales_date, sale.drug_id, sale.customer_type,
+                      sale.employee_id, sale.warehouse_id)
+    upsert_increment(SalesCubeDaily.__table__, key, {
+        'sales_count': 1,
+        'quantity': sale.quantity,
+        'amount': Decimal(sale.quantity) * Decimal(str(sale.unit_price)),
+        'cost': Decimal(sale.quantity) * Decimal(str(sale.unit_cost)),
+    })
+
+
+def record_return(sales_return, sale):
+    """销售退货后按原销售单的维度累加退货日桶（调用方负责提交事务）"""
+    key = _bucket_key(sales_return.return_date, sale.drug_id, sale.customer_type,
+                      sale.employee_id, sale.warehouse_id)
+    upsert_increment(SalesCubeDaily.__table__, key, {
+        'return_quantity': sales_return.quantity,
+        'return_amount': Decimal(sales_return.quantity) * Decimal(str(sales_return.unit_price)),
+        'return_cost': Decimal(sales_return.quantity) * Decimal(str(sales_return.unit_cost)),
+    })
+
+
+def record_many(sale_rows, return_rows):
+    """批量登记后累加日桶：先在内存中按日桶合并，每个日桶一条 upsert（调用方负责提交事务）
+
+    sale_rows 为 [sale]，return_rows 为 [(sales_return, 原销售单)]
+    """
+    buckets = defaultdict(lambda: defaultdict(int))
+    for sale in sale_rows:
+        key = _bucket_key(sale.sales_date, sale.drug_id, sale.customer_type,
+                          sale.employee_id, sale.warehouse_id)
+        deltas = buckets[tuple(key.items())]
+        deltas['sales_count'] += 1
+        deltas['quantity'] += sale.quantity
+        deltas['amount'] += Decimal(sale.quantity) * Decimal(str(sale.unit_price))
+        deltas['cost'] += Decimal(sale.quantity) * Decimal(str(sale.unit_cost))
+    for sales_return, sale in return_rows:
+        key = _bucket_key(sales_return.return_date, sale.drug_id, sale.customer_type,
+                          sale.employee_id, sale.warehouse_id)
+        deltas = buckets[tuple(key.items())]
+        deltas['return_quantity'] += sales_return.quantity
+        deltas['return_amount'] += Decimal(sales_return.quantity) * Decimal(str(sales_return.unit_price))
+        deltas['return_cost'] += Decimal(sales_return.quantity) * Decimal(str(sales_return.unit_cost))
+    for key, deltas in buckets.items():
+        upsert_increment(SalesCubeDaily.__table__, dict(key), dict(deltas))
+
+
+def _grouped_sales(start, end):
+    """区间内销售明细按维度分组（区间早于冷热分界时合并归档明细）"""
+    sales = source(Sales, start).c
+    return db.session.execute(
+        select(
+            sales.sales_date, sales.drug_id, sales.customer_type,
+            sales.employee_id, sales.warehouse_id,
+            func.count(sales.sales_id), func.sum(sales.quantity),
+            func.sum(sales.quantity * sales.unit_price), func.sum(sales.quantity * sales.unit_cost)
+        ).where(sales.sales_date >= start, sales.sales_date <= end).
+        group_by(sales.sales_date, sales.drug_id, sales.customer_type,
+                 sales.employee_id, sales.warehouse_id)
+    )
+
+
+def _grouped_returns(start, end):
+    """区间内销售退货按原销售单维度分组（销售单与其退货一同转冷，两侧按同一区间起点取来源）"""
+    sales_source, returns_source = source(Sales, start), source(SalesReturn, start)
+    sales, returns = sales_source.c, returns_source.c
+    return db.session.execute(
+        select(
+            returns.return_date, sales.drug_id, sales.customer_type,
+            sales.employee_id, sales.warehouse_id,
+            func.sum(returns.quantity),
+            func.sum(returns.quantity * returns.unit_price),
+            func.sum(returns.quantity * returns.unit_cost)
+        ).select_from(returns_source).
+        join(sales_source, returns.sales_id == sales.sales_id).
+        where(returns.return_date >= start, returns.return_date <= end).
+        group_by(returns.return_date, sales.drug_id, sales.customer_type,
+                 sales.employee_id, sales.warehouse_id)
+    )
+
+
+def rebuild(start, end, chunk_days=31):
+    """从明细重算 [start, end] 内的日桶，按 chunk_days 分段提交，返回写入桶数"""
+    written = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+        buckets = defaultdict(lambda: dict.fromkeys(MEASURES, 0))
+        for row in _grouped_sales(chunk_start, chunk_end):
+            key = _bucket_key(*row[:5])
+            bucket = buckets[tuple(key.values())]
+            bucket.update(sales_count=row[5], quantity=row[6] or 0, amount=row[7] or 0, cost=row[8] or 0)
+        for row in _grouped_returns(chunk_start, chunk_end):
+            key = _bucket_key(*row[:5])
+            bucket = buckets[tuple(key.values())]
+            bucket.update(return_quantity=row[5] or 0, return_amount=row[6] or 0, return_cost=row[7] or 0)
+
+        SalesCubeDaily.query.filter(SalesCubeDaily.stat_date >= chunk_start,
+                                    SalesCubeDaily.stat_date <= chunk_end).delete(synchronize_session=False)
+        key_names = ('stat_date', 'drug_id', 'customer_type', 'employee_id', 'warehouse_id')
+        rows = [dict(zip(key_names, key), **measures) for key, measures in buckets.items()]
+        if rows:
+            db.session.execute(SalesCubeDaily.__table__.insert(), rows)
+        db.session.commit()
+        written += len(rows)
+        chunk_start = chunk_end + timedelta(days=1)
+    return written
+
+
+def rebuild_all(chunk_days=31):
+    """按明细的完整日期范围重建汇总表"""
+    sales, returns = source(Sales).c, source(SalesReturn).c
+    first = db.session.query(func.min(sales.sales_date)).scalar()
+    last = max(filter(None, [
+        db.session.query(func.max(sales.sales_date)).scalar(),
+        db.session.query(func.max(returns.return_date)).scalar(),
+    ]), default=None)
+    if first is None or last is None:
+        return 0
+    return rebuild(first, last, chunk_days)
+
+
+def _attach_names(rows, dims):
+    """为 drug / employee / warehouse 维度补充名称（每个维度一次 IN 查询）"""
+    lookups = {
+        'drug': (DrugInfo.drug_id, DrugInfo.name),
+        'employee': (EmployeeInfo.employee_id, EmployeeInfo.name),
+        'warehouse': (Warehouse.warehouse_id, Warehouse.name),
+    }
+    for dim in dims:
+        if dim not in lookups:
+            continue
+        id_col, name_col = lookups[dim]
+        ids = {row[dim] for row in rows if row[dim]}
+        names = dict(db.session.query(id_col, name_col).filter(id_col.in_(ids)).all()) if ids else {}
+        for row in rows:
+            row[f'{dim}_name'] = names.get(row[dim], '未知')
+
+
+def query(start, end, dims=(), granularity=None, filters=None):
+    """切片/切块/下钻查询
+
+    dims：分组维度（DIMENSIONS 的键），granularity：day/month/year 或 None（整个区间汇总），
+    filters：{维度: 值或值列表}。返回按分组排序的字典列表，含净销售额与毛利。
+    """
+    group_cols = []
+    if granularity:
+        group_cols.append(period_expr(SalesCubeDaily.stat_date, granularity).label('period'))
+    group_cols += [DIMENSIONS[dim].label(dim) for dim in dims]
+    stmt = select(*group_cols, *[func.sum(getattr(SalesCubeDaily, m)).label(m) for m in MEASURES]).\
+        where(SalesCubeDaily.stat_date >= start, SalesCubeDaily.stat_date <= end)
+    if 'category' in dims or 'category' in (filters or {}):
+        # 已删除的药品没有分类，归入未分类
+        stmt = stmt.select_from(SalesCubeDaily).outerjoin(DrugInfo, SalesCubeDaily.drug_id == DrugInfo.drug_id)
+    for dim, value in (filters or {}).items():
+        column = DIMENSIONS[dim]
+        stmt = stmt.where(column.in_(value) if isinstance(value, (list, tuple, set)) else column == value)
+    if group_cols:
+        stmt = stmt.group_by(*group_cols).order_by(*group_cols)
+
+    rows = []
+    for row in db.session.execute(stmt).mappings():
+        item = dict(row)
+        for measure in ('amount', 'cost', 'return_amount', 'return_cost'):
+            item[measure] = float(item[measure] or 0)
+        for measure in ('sales_count', 'quantity', 'return_quantity'):
+            item[measure] = int(item[measure] or 0)
+        item['net_amount'] = round(item['amount'] - item['return_amount'], 2)
+        item['net_profit'] = round(item['net_amount'] - (item['cost'] - item['return_cost']), 2)
+        rows.append(item)
+    _attach_names(rows, dims)
+    return rows
@@ -0,0 +1,105 @@
+"""
+定时任务：夜间日结
+每天零点后结算前一天：生成当日财务日报、滚动汇总当月月报、从明细校正当日销售多维汇总、
+刷新仪表盘库存快照、预热参考数据缓存，
+使第二天早上的首批用户直接命中预计算结果。
+配置 COLD_TIER_NIGHTLY=True 时，日结完成后另行提交历史明细冷存储转移任务；
+配置 CUSTOMER_RFM_NIGHTLY=True 时另行提交增量客户 RFM 分析任务。
+
+两种运行方式：
+- 进程内调度：配置 SCHEDULER_ENABLED=True，应用启动后由守护线程在 NIGHTLY_CLOSE_TIME 触发
+- cron：python -m tools.nightly_close（见该模块说明）
+
+日结以后台任务（job_key = nightly_close:日期）执行，多个 worker 同时触发时只会执行一次，
+同一天已完成的日结不会重复执行。
+"""
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, BackgroundJob, EmployeeInfo
+from services.cache import REPORT_CACHE, DASHBOARD_CACHE, invalidate
+from services import sales_cube
+from services.jobs import JOB_DONE, enqueue, job_handler
+from services.snapshots import inventory_snapshot, warm_reference_cache
+from services.sqlite_profile import transaction_intent
+
+
+@job_handler('nightly_close', invalidates=(REPORT_CACHE,))
+def _nightly_close_job(params, progress):
+    """后台任务：结算指定日期"""
+    from routes.sales_mgmt import _upsert_daily_finance, _rollup_monthly_finance
+
+    close_date = datetime.strptime(params['close_date'], '%Y-%m-%d').date()
+    employee_id = params.get('employee_id')
+    progress(0, 5, '生成日报')
+    _upsert_daily_finance(close_date, employee_id)
+    progress(1, 5, '汇总月报')
+    _rollup_monthly_finance(close_date, employee_id)
+    progress(2, 5, '校正销售多维汇总')
+    sales_cube.rebuild(close_date, close_date)
+    progress(3, 5, '刷新库存快照')
+    invalidate(DASHBOARD_CACHE)
+    inventory_snapshot()
+    progress(4, 5, '预热参考数据')
+    warm_reference_cache()
+    if current_app.config.get('ANALYTICS_EXPORT_NIGHTLY'):
+        progress(5, 6, '导出分析快照')
+        from services.analytics_store import export
+        export(current_app.config['ANALYTICS_DIR'], current_app.config.get('ANALYTICS_EXPORT_LAG', 60))
+        progress(6, 6)
+    else:
+        progress(5, 5)
+    if current_app.config.get('COLD_TIER_NIGHTLY'):
+        # 转移耗时较长，作为独立任务执行，不阻塞日结完成
+        enqueue('tier_cold_data', 'tier_cold_data',
+                params={'age_days': current_app.config.get('COLD_TIER_AGE_DAYS', 365),
+                        'batch_size': current_app.config.get('COLD_TIER_BATCH_SIZE', 5000)},
+                employee_id=employee_id)
+    if current_app.config.get('CUSTOMER_RFM_NIGHTLY'):
+        enqueue('customer_rfm', 'customer_rfm', params={'full': False}, employee_id=employee_id)
+    return f'{close_date} 日结完成'
+
+
+def run_nightly_close(close_date=None):
+    """提交日结任务（默认结算昨天），返回 (任务, 是否新建)；当天已完成则返回 (已完成任务, False)"""
+    close_date = close_date or (datetime.now().date() - timedelta(days=1))
+    job_key = f'nightly_close:{close_date.isoformat()}'
+    done = BackgroundJob.query.filter_by(job_key=job_key, status=JOB_DONE).first()
+    if done:
+        return done, False
+    admin = EmployeeInfo.query.filter_by(account='admin').first()
+    employee_id = admin.employee_id if admin else None
+    return enqueue('nightly_close', job_key,
+                   params={'close_date': close_date.isoformat(), 'employee_id': employee_id},
+                   employee_id=employee_id)
+
+
+def _next_run(now, run_at):
+    """计算下一次触发时间（run_at 形如 '00:10'）"""
+    hour, minute = (int(part) for part in run_at.split(':'))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return target if target > now else target + timedelta(days=1)
+
+
+def start_scheduler(app):
+    """启动进程内调度守护线程"""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            now = datetime.now()
+            if stop.wait((_next_run(now, app.config.get('NIGHTLY_CLOSE_TIME', '00:10')) - now).total_seconds()):
+                break
+            with app.app_context(), transaction_intent(True):
+                try:
+                    run_nightly_close()
+                except Exception:
+                    app.logger.exception('夜间日结提交失败')
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=loop, name='nightly-close', daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,327 @@
+"""
+基础信息全文检索
+进程内倒排索引，覆盖药品（名称、生产厂家、批准文号）、客户、供应商：
+- 文本按字符切分为单字 + 二元组（n-gram），中文无需分词即可做任意子串匹配
+- 名称额外索引拼音首字母（如 阿莫西林 -> amxl），需安装可选依赖 pypinyin
+
+查询切分方式与建索引一致，对各 token 的倒排表取交集得到候选，再按命中字段与位置打分排序。
+除 n-gram 外还索引 名称全文、名称 n-gram、各字段（及拼音）开头一两个字，候选按可能得分分层：
+名称完全匹配 → 某字段以查询开头 → 名称包含 → 其余字段包含；前面各层已凑满 limit 条不低于后一层
+最高分的结果时不再为后面的层打分，命中很多的层只打分到凑满所需条数为止（同分时不再按名称长短排序）。
+锁内只对倒排表做集合运算得到各层候选的副本，打分在锁外进行，不阻塞增量更新与其他查询。
+basic_bp 的增删改在提交后调用 index_* / remove 增量更新；多 worker 部署时其他进程的修改
+由 refresh_if_stale 按 update_time 水位定期补齐。
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+
+from models import db, DrugInfo, CustomerInfo, SupplierInfo
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 未安装时仅不支持拼音首字母检索
+    lazy_pinyin = None
+
+# 实体 -> (模型, 主键列, 参与索引的字段及权重, 副标题字段)
+ENTITIES = {
+    'drug': (DrugInfo, 'drug_id', {'name': 10, 'approval_number': 6, 'manufacturer': 3}, 'manufacturer'),
+    'customer': (CustomerInfo, 'customer_id', {'name': 10, 'phone': 6, 'contact': 4, 'address': 2}, 'type'),
+    'supplier': (SupplierInfo, 'supplier_id', {'name': 10, 'qualification_no': 6, 'contact': 4, 'phone': 6,
+                                               'address': 2}, 'contact'),
+}
+PINYIN_PREFIX = '\x01'  # 拼音 token 前缀，与文本 token 区分
+NAME_PREFIX = '\x02'  # 名称 n-gram
+START_PREFIX = '\x03'  # 字段（或拼音）开头的一两个字
+EXACT_PREFIX = '\x04'  # 完整名称
+FULL_RANK_LIMIT = 1000  # 一层候选不超过此数量时全部打分，否则打分到凑满所需条数为止
+REFRESH_SECONDS = 30
+
+
+def normalize(text):
+    """全角转半角、转小写、去空白"""
+    return ''.join(unicodedata.normalize('NFKC', text or '').lower().split())
+
+
+def ngrams(text):
+    """单字 + 二元组"""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def query_tokens(text):
+    """查询只用二元组（单字查询用单字），交集更小"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+@lru_cache(maxsize=None)
+def _char_initial(char):
+    letters = lazy_pinyin(char, style=Style.FIRST_LETTER, errors='ignore')
+    return letters[0][:1].lower() if letters else ''
+
+
+def pinyin_initials(text):
+    """汉字的拼音首字母（按单字缓存，多音字取常用读音）"""
+    if lazy_pinyin is None or not text:
+        return ''
+    return ''.join(_char_initial(char) for char in text if '\u4e00' <= char <= '\u9fff')
+
+
+class SearchIndex:
+    """线程安全的倒排索引：token -> {文档号}；文档号为内部整数，交集运算比元组键快得多"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._docs = {}  # 文档号 -> {'key': (实体, 主键), 'fields': [(权重, 归一化文本)], 'pinyin', 'name', 'subtitle'}
+        self._docnos = {}  # (实体, 主键) -> 文档号
+        self._next_docno = 0
+        self._counts = dict.fromkeys(ENTITIES, 0)  # 各实体已索引的记录数
+        self._watermarks = {}  # 实体 -> (行数, 最新 update_time)
+        self._checked_at = 0.0
+        self.loaded = False
+
+    def _tokens(self, doc):
+        tokens = set()
+        for _, value in doc['fields']:
+            tokens |= ngrams(value)
+            tokens |= {START_PREFIX + value[:1], START_PREFIX + value[:2]} if value else set()
+        name = doc['fields'][0][1]
+        tokens |= {NAME_PREFIX + token for token in ngrams(name)}
+        tokens.add(EXACT_PREFIX + name)
+        pinyin = doc['pinyin']
+        if pinyin:
+            tokens |= {PINYIN_PREFIX + token for token in ngrams(pinyin)}
+            tokens |= {START_PREFIX + PINYIN_PREFIX + pinyin[:1], START_PREFIX + PINYIN_PREFIX + pinyin[:2]}
+        return tokens
+
+    def add(self, entity, obj):
+        """新增或更新一条记录"""
+        _, pk, fields, subtitle = ENTITIES[entity]
+        key = (entity, getattr(obj, pk))
+        if not obj.is_active:
+            self.remove(entity, key[1])
+            return
+        doc = {
+            'key': key,
+            'fields': [(weight, normalize(getattr(obj, field))) for field, weight in fields.items()],
+            'pinyin': pinyin_initials(obj.name),
+            'name': obj.name,
+            'subtitle': getattr(obj, subtitle) or '',
+        }
+        with self._lock:
+            self._remove_key(key)
+            docno = self._next_docno
+            self._next_docno += 1
+            self._docs[docno] = doc
+            self._docnos[key] = docno
+            self._counts[entity] += 1
+            for token in self._tokens(doc):
+                self._postings.setdefault(token, set()).add(docno)
+
+    def _remove_key(self, key):
+        docno = self._docnos.pop(key, None)
+        if docno is None:
+            return
+        doc = self._docs.pop(docno)
+        self._counts[key[0]] -= 1
+        for token in self._tokens(doc):
+            docnos = self._postings.get(token)
+            if docnos is not None:
+                docnos.discard(docno)
+                if not docnos:
+                    del self._postings[token]
+
+    def remove(self, entity, pk):
+        with self._lock:
+            self._remove_key((entity, pk))
+
+    def _load_entity(self, entity, since=None):
+        """从数据库载入实体（since 不为空时只载入之后修改的记录），返回载入行数"""
+        model, _, _, _ = ENTITIES[entity]
+        query = model.query
+        if since is not None:
+            # 含已归档的记录，add 时会将其移出索引
+            query = query.filter(model.update_time >= since)
+        else:
+            query = query.filter(model.is_active.is_(True))
+        count = 0
+        for obj in query.yield_per(5000):
+            self.add(entity, obj)
+            count += 1
+        return count
+
+    def _version(self, entity):
+        """(有效记录数, 最新 update_time)；归档会更新 update_time，因此能被增量补齐发现"""
+        model = ENTITIES[entity][0]
+        return tuple(db.session.query(
+            db.func.count(db.case((model.is_active.is_(True), 1))), db.func.max(model.update_time)
+        ).select_from(model).one())
+
+    def rebuild(self):
+        """全量重建"""
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+            self._docnos.clear()
+            self._counts = dict.fromkeys(ENTITIES, 0)
+            for entity in ENTITIES:
+                self._watermarks[entity] = self._version(entity)
+                self._load_entity(entity)
+            self._checked_at = time.monotonic()
+            self.loaded = True
+
+    def invalidate(self):
+        """丢弃索引，下次查询时全量重建（数据库被整体替换后调用）"""
+        with self._lock:
+            self.loaded = False
+            self._watermarks.clear()
+
+    def refresh_if_stale(self, interval=REFRESH_SECONDS):
+        """按 update_time 水位补齐其他进程的修改；记录数对不上（其他进程删除过）时该实体整体重载"""
+        if not self.loaded:
+            self.rebuild()
+            return
+        if time.monotonic() - self._checked_at < interval:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            for entity in ENTITIES:
+                old_count, old_updated = self._watermarks.get(entity, (None, None))
+                count, updated = self._version(entity)
+                if (count, updated) == (old_count, old_updated):
+                    continue
+                # 最新 update_time 回退说明数据库被整体替换过（如其他进程恢复了快照），增量补齐会漏掉被还原的记录
+                rewound = old_updated is not None and (updated is None or updated < old_updated)
+                if old_updated is None or rewound or self._counts[entity] != count:
+                    for key in [key for key in self._docnos if key[0] == entity]:
+                        self._remove_key(key)
+                    self._load_entity(entity)
+                else:
+                    self._load_entity(entity, since=old_updated)
+                self._watermarks[entity] = (count, updated)
+
+    def search(self, text, entities=None, limit=20):
+        """返回按得分降序的 [(得分, 实体, 主键, 名称, 副标题)]"""
+        q = normalize(text)
+        if not q:
+            return []
+        entities = set(entities or ENTITIES)
+        docs = self._docs  # 文档一经写入不再修改，锁外按文档号读取；期间被删除的跳过
+        hits, seen = [], set()
+        for tier, bound in self._tiers(q):
+            # 已有 limit 条不低于本层最高分的结果时，本层及之后各层都不会进入前 limit 名
+            need = limit - sum(1 for hit in hits if hit[0] >= bound)
+            if need <= 0:
+                break
+            with self._lock:
+                docnos = tier()
+            hits += self._take(docs, docnos, q, entities, seen, need, bound)
+        return heapq.nsmallest(limit, hits, key=lambda item: (-item[0], len(item[3]), item[2]))
+
+    def _take(self, docs, docnos, q, entities, seen, need, bound):
+        """为一层候选打分，返回命中的 (得分, 实体, 主键, 名称, 副标题)
+
+        候选不超过 FULL_RANK_LIMIT 个时全部打分；否则打分到有 need 条达到本层最高分 bound，
+        或已为 FULL_RANK_LIMIT 个候选打分为止。
+        """
+        hits, scored, full = [], 0, len(docnos) <= FULL_RANK_LIMIT
+        for docno in docnos:
+            doc = docs.get(docno)
+            if doc is None or doc['key'][0] not in entities or doc['key'] in seen:
+                continue
+            seen.add(doc['key'])
+            score = self._score(q, doc)
+            scored += 1
+            if score:
+                hits.append((score, doc['key'][0], doc['key'][1], doc['name'], doc['subtitle']))
+                if score >= bound:
+                    need -= 1
+            if not full and (need <= 0 or scored >= FULL_RANK_LIMIT):
+                break
+        return hits
+
+    def _tiers(self, q):
+        """按可能得分从高到低的候选层 [(计算函数, 该层最高分)]，各层互不重叠
+
+        计算函数需在持有锁时调用，返回新建的文档号集合，释放锁后可继续使用；只在需要该层时才计算。
+        各层得分上限见 _score：名称完全匹配 30，某字段或拼音以查询开头（含其他字段完全匹配）20，
+        名称包含 10，其余字段或拼音包含 6。
+        """
+        tokens = query_tokens(q)
+        groups, starts = [tokens], [START_PREFIX + q[:2]]
+        if q.isascii() and q.isalpha():
+            groups.append({PINYIN_PREFIX + token for token in tokens})
+            starts.append(START_PREFIX + PINYIN_PREFIX + q[:2])
+        found = set()
+
+        def tier(compute):
+            def run():
+                docnos = compute() - found
+                found.update(docnos)
+                return docnos
+            return run
+
+        return [
+            (tier(lambda: self._match(tokens | {EXACT_PREFIX + q})), 30),
+            (tier(lambda: set().union(*(self._match(group | {start}) for group in groups for start in starts))), 20),
+            (tier(lambda: self._match({NAME_PREFIX + token for token in tokens})), 10),
+            (tier(lambda: set().union(*(self._match(group) for group in groups))), 6),
+        ]
+
+    def _match(self, tokens):
+        """各 token 倒排表的交集（新建的集合）；需在持有锁时调用"""
+        postings = [self._postings.get(token) for token in tokens]
+        if not postings or any(p is None for p in postings):
+            return set()
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    @staticmethod
+    def _score(q, doc):
+        """二元组交集可能是假阳性（如 ab、bc 不连续），这里按真实子串命中计分"""
+        score = 0
+        for weight, value in doc['fields']:
+            position = value.find(q)
+            if position < 0:
+                continue
+            if value == q:
+                weight *= 3
+            elif position == 0:
+                weight *= 2
+            if weight > score:
+                score = weight
+        pinyin = doc['pinyin']
+        if pinyin:
+            name_weight = doc['fields'][0][0]
+            if pinyin.startswith(q):
+                score = max(score, name_weight * 2 if pinyin == q else name_weight)
+            elif q in pinyin:
+                score = max(score, name_weight // 2)
+        return score
+
+
+_index = SearchIndex()
+
+
+def get_index():
+    return _index
+
+
+def index_record(entity, obj):
+    """basic_bp 写入提交后调用：索引已加载时增量更新，未加载则等首次查询时全量构建"""
+    if _index.loaded:
+        _index.add(entity, obj)
+
+
+def remove_record(entity, pk):
+    if _index.loaded:
+        _index.remove(entity, pk)
+
+
+def search(text, entities=None, limit=20, refresh_seconds=REFRESH_SECONDS):
+    _index.refresh_if_stale(refresh_seconds)
+    return _index.search(text, entities, limit)
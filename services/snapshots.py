@@ -0,0 +1,100 @@
+"""
+参考数据与仪表盘快照
+表单下拉框所需的药品/客户/供应商/仓库列表和仪表盘库存指标变化不频繁，
+这里以只含所需列的查询结果缓存，写操作后由对应路由失效，夜间日结时统一预热。
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import func
+
+from models import db, DrugInfo, CustomerInfo, SupplierInfo, Warehouse, Inventory, Sales
+from services.cache import REFERENCE_CACHE, DASHBOARD_CACHE, get_cache
+from services.cold_tier import source
+
+REFERENCE_TTL = 300
+DASHBOARD_TTL = 60
+LOW_STOCK_THRESHOLD = 100
+
+
+def drug_options(on_sale_only=False):
+    """药品下拉框数据（drug_id, name, spec）"""
+    def load():
+        query = db.session.query(DrugInfo.drug_id, DrugInfo.name, DrugInfo.spec).filter(DrugInfo.is_active.is_(True))
+        if on_sale_only:
+            query = query.filter(DrugInfo.status == '在售')
+        return query.order_by(DrugInfo.drug_id).all()
+    return get_cache(REFERENCE_CACHE, REFERENCE_TTL).get_or_set(('drugs', on_sale_only), load)
+
+
+def customer_options():
+    """客户下拉框数据（customer_id, name, type）"""
+    def load():
+        return db.session.query(CustomerInfo.customer_id, CustomerInfo.name, CustomerInfo.type).\
+            filter(CustomerInfo.is_active.is_(True)).order_by(CustomerInfo.customer_id).all()
+    return get_cache(REFERENCE_CACHE, REFERENCE_TTL).get_or_set('customers', load)
+
+
+def supplier_options():
+    """供应商下拉框数据（supplier_id, name）"""
+    def load():
+        return db.session.query(SupplierInfo.supplier_id, SupplierInfo.name).\
+            filter(SupplierInfo.is_active.is_(True)).order_by(SupplierInfo.supplier_id).all()
+    return get_cache(REFERENCE_CACHE, REFERENCE_TTL).get_or_set('suppliers', load)
+
+
+def warehouse_options():
+    """仓库下拉框数据（warehouse_id, name）"""
+    def load():
+        return db.session.query(Warehouse.warehouse_id, Warehouse.name).\
+            order_by(Warehouse.warehouse_id).all()
+    return get_cache(REFERENCE_CACHE, REFERENCE_TTL).get_or_set('warehouses', load)
+
+
+def warm_reference_cache():
+    """预热全部参考数据"""
+    drug_options()
+    drug_options(on_sale_only=True)
+    customer_options()
+    supplier_options()
+    warehouse_options()
+
+
+def _inventory_metrics():
+    return {
+        'total_inventory': db.session.query(func.sum(Inventory.quantity)).scalar() or 0,
+        'low_stock_count': db.session.query(func.count(Inventory.inventory_id)).
+            join(DrugInfo, Inventory.drug_id == DrugInfo.drug_id).
+            filter(Inventory.quantity < LOW_STOCK_THRESHOLD, DrugInfo.is_active.is_(True)).scalar() or 0,
+        'total_drugs': db.session.query(func.count(DrugInfo.drug_id)).
+            filter(DrugInfo.is_active.is_(True)).scalar() or 0,
+        'low_stock_items': db.session.query(Inventory.quantity, DrugInfo.name, DrugInfo.unit).
+            join(DrugInfo, Inventory.drug_id == DrugInfo.drug_id).
+            filter(Inventory.quantity < LOW_STOCK_THRESHOLD, DrugInfo.is_active.is_(True)).
+            order_by(Inventory.quantity).limit(10).all(),
+    }
+
+
+def inventory_snapshot():
+    """仪表盘库存指标：库存总数、低库存数量、药品总数、低库存预警前10条（后三项不含已归档的药品）"""
+    return get_cache(DASHBOARD_CACHE, DASHBOARD_TTL).get_or_set('inventory', _inventory_metrics)
+
+
+def refresh_inventory_snapshot():
+    """重新计算库存指标并写入本进程缓存（其他进程提交的修改不会失效本进程的快照）"""
+    value = _inventory_metrics()
+    get_cache(DASHBOARD_CACHE, DASHBOARD_TTL).set('inventory', value)
+    return value
+
+
+def sales_totals(today=None):
+    """(今日销售额, 本月销售额)，本月早于冷热分界时才合并归档表"""
+    today = today or date.today()
+    first_day = today.replace(day=1)
+    next_month = (first_day + timedelta(days=32)).replace(day=1)
+    sales = source(Sales, first_day)
+    amount = func.sum(sales.c.quantity * sales.c.unit_price)
+    today_sales = db.session.query(amount).filter(sales.c.sales_date == today).scalar() or 0
+    # 日期区间条件可走 sales_date 覆盖索引
+    month_sales = db.session.query(amount).\
+        filter(sales.c.sales_date >= first_day, sales.c.sales_date < next_month).scalar() or 0
+    return today_sales, month_sales
@@ -0,0 +1,142 @@
+"""
+SQLite 部署配置（单店安装）
+配置 SQLITE_PROFILE=True 且数据库为 SQLite 时生效（见 config.SQLiteConfig）：
+
+- 每个连接建立时设置 PRAGMA：journal_mode=WAL（读写互不阻塞）、busy_timeout、synchronous=NORMAL、
+  mmap_size、cache_size，以及与 MySQL(InnoDB) 行为一致的 foreign_keys=ON
+- 单写者：SQLite 同一时刻只允许一个写事务。写请求（非 GET/HEAD/OPTIONS）与声明为写的后台工作
+  （transaction_intent(True)：后台任务、日结调度、收银组提交）的事务以 BEGIN IMMEDIATE 开始，
+  先在进程内排队获取写锁，再由 busy_timeout 在多个 gunicorn 进程之间排队；
+  读请求及其他请求外的事务（实时推送指标计算、命令行工具等）以普通 BEGIN 开始，WAL 下不受写事务影响，
+  首次执行写语句时才排队获取写锁
+- MySQL 差异：SQLite 忽略 SELECT ... FOR UPDATE，销售登记、调拨等原本依赖行锁的写路径
+  由 BEGIN IMMEDIATE 串行化，效果等同于表级写锁
+
+BEGIN IMMEDIATE 在事务开始时即取得写锁，避免“先读后写”的事务在升级写锁时直接报
+database is locked（此时 busy_timeout 不会生效）。
+"""
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from models import db
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # 负数单位为 KiB，即 64MB
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+_HOLDS_LOCK = 'sqlite_write_lock'
+# 请求外的工作声明的事务意图：True 写（BEGIN IMMEDIATE），False 只读，None 按请求方法 / 默认只读
+_intent = contextvars.ContextVar('sqlite_transaction_intent', default=None)
+
+
+class WriterLock:
+    """进程内单写者：写事务排队获取同一把锁，等待超过 timeout 秒时与 SQLite 一样报 database is locked"""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+
+    def acquire(self, connection_info):
+        if connection_info.get(_HOLDS_LOCK):
+            return
+        if not self._lock.acquire(timeout=self.timeout):
+            raise OperationalError('BEGIN IMMEDIATE', {}, Exception('database is locked (writer queue timeout)'))
+        connection_info[_HOLDS_LOCK] = True
+
+    def release(self, connection_info):
+        if connection_info.pop(_HOLDS_LOCK, False):
+            self._lock.release()
+
+
+@contextmanager
+def transaction_intent(write):
+    """声明其中开始的事务是写（True）还是只读（False），可用作 with 语句或装饰器
+
+    后台线程没有请求方法可供判断，先读后写的后台工作应声明为写，避免升级写锁时报 database is locked。
+    """
+    token = _intent.set(write)
+    try:
+        yield
+    finally:
+        _intent.reset(token)
+
+
+def _is_write_context():
+    """优先使用声明的意图；请求内按 HTTP 方法判断；其余请求外的事务按只读开始，写语句时再排队获取写锁"""
+    intent = _intent.get()
+    if intent is not None:
+        return intent
+    return has_request_context() and request.method not in READ_METHODS
+
+
+def configure_engine(engine, pragmas, busy_timeout_ms):
+    """为 SQLite 引擎注册连接 PRAGMA、显式 BEGIN 与进程内写锁"""
+    writer = WriterLock(busy_timeout_ms / 1000)
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        # 关闭 pysqlite 自带的隐式 BEGIN，改由 _on_begin 发出
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def _on_begin(conn):
+        if _is_write_context():
+            writer.acquire(conn.info)
+            try:
+                conn.exec_driver_sql('BEGIN IMMEDIATE')
+            except Exception:
+                writer.release(conn.info)
+                raise
+        else:
+            conn.exec_driver_sql('BEGIN')
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        # 读事务中途写入（如 GET 路由记录日志）：排队获取进程内写锁
+        if not conn.info.get(_HOLDS_LOCK) and statement.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            writer.acquire(conn.info)
+
+    @event.listens_for(engine, 'commit')
+    def _on_commit(conn):
+        writer.release(conn.info)
+
+    @event.listens_for(engine, 'rollback')
+    def _on_rollback(conn):
+        writer.release(conn.info)
+
+    @event.listens_for(engine, 'reset')
+    def _on_reset(dbapi_connection, connection_record, reset_state):
+        # 连接未经提交/回滚直接归还连接池时兜底释放
+        writer.release(connection_record.info)
+
+    return writer
+
+
+def init_app(app):
+    """SQLITE_PROFILE 开启且数据库为 SQLite 时配置引擎"""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if not app.config.get('SQLITE_PROFILE') or not uri.startswith('sqlite'):
+        return
+    path = uri.split(':///', 1)[-1]
+    if path and path != ':memory:' and not path.startswith('file:'):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    pragmas = dict(DEFAULT_PRAGMAS, **app.config.get('SQLITE_PRAGMAS', {}))
+    with app.app_context():
+        configure_engine(db.engine, pragmas, app.config.get('SQLITE_BUSY_TIMEOUT', 10000))
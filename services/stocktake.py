@@ -0,0 +1,168 @@
+"""
+批量盘点（整仓盘点）
+1. 开单：一条 INSERT ... SELECT 冻结整个仓库的账面数量
+2. 录入：实盘数量按批提交（表单、CSV 上传或 JSON），以 executemany 批量更新明细
+3. 完成：在一个事务内用集合操作写入全部 InventoryCheck 记录并调整 Inventory
+
+库存调整按 (实盘 - 冻结账面) 的差额累加，开单后发生的入库/销售不会被覆盖。
+"""
+import csv
+import io
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, func, insert, literal, select, update
+
+from models import db, Inventory, InventoryCheck, StocktakeSession, StocktakeItem
+
+OPEN = '进行中'
+FINISHED = '已完成'
+CANCELLED = '已取消'
+
+
+class StocktakeError(ValueError):
+    """盘点单状态或录入数据不合法"""
+
+
+def open_session(warehouse_id, check_date, employee_id=None):
+    """为仓库开盘点单并冻结当前账面数量，返回盘点单"""
+    stocktake = StocktakeSession(warehouse_id=warehouse_id, check_date=check_date, employee_id=employee_id)
+    db.session.add(stocktake)
+    db.session.flush()
+    result = db.session.execute(
+        insert(StocktakeItem).from_select(
+            ['session_id', 'drug_id', 'expected_quantity'],
+            select(literal(stocktake.session_id), Inventory.drug_id, Inventory.quantity).
+            where(Inventory.warehouse_id == warehouse_id)
+        )
+    )
+    stocktake.item_count = result.rowcount
+    db.session.commit()
+    return stocktake
+
+
+def parse_counts_csv(stream):
+    """解析实盘 CSV：drug_id,counted_quantity[,diff_reason]，首行为表头时自动跳过"""
+    text = stream.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8-sig')
+    counts = []
+    for line_no, row in enumerate(csv.reader(io.StringIO(text)), 1):
+        if not row or not row[0].strip():
+            continue
+        if line_no == 1 and not row[0].strip().isdigit():
+            continue
+        try:
+            counts.append({
+                'drug_id': int(row[0]),
+                'counted_quantity': int(row[1]),
+                'diff_reason': row[2].strip() if len(row) > 2 and row[2].strip() else None,
+            })
+        except (IndexError, ValueError):
+            raise StocktakeError(f'第 {line_no} 行格式错误：{",".join(row)}')
+    return counts
+
+
+def _require_open(stocktake):
+    if stocktake.status != OPEN:
+        raise StocktakeError(f'盘点单{stocktake.status}，不能修改')
+
+
+def record_counts(stocktake, counts):
+    """批量录入实盘数量，counts 为 [{drug_id, counted_quantity, diff_reason}]
+
+    返回 (更新行数, 盘点单中不存在的药品ID列表)；不存在的药品不会写入。
+    """
+    _require_open(stocktake)
+    rows = []
+    for item in counts:
+        quantity = int(item['counted_quantity'])
+        if quantity < 0:
+            raise StocktakeError(f'药品 {item["drug_id"]} 的实盘数量不能为负数')
+        rows.append({
+            'sid': stocktake.session_id,
+            'did': int(item['drug_id']),
+            'qty': quantity,
+            'reason': item.get('diff_reason') or None,
+        })
+    if not rows:
+        return 0, []
+
+    known = set(db.session.scalars(
+        select(StocktakeItem.drug_id).where(StocktakeItem.session_id == stocktake.session_id)
+    ))
+    unknown = sorted({row['did'] for row in rows} - known)
+    rows = [row for row in rows if row['did'] in known]
+    if rows:
+        table = StocktakeItem.__table__
+        db.session.execute(
+            table.update().
+            where(table.c.session_id == bindparam('sid'), table.c.drug_id == bindparam('did')).
+            values(counted_quantity=bindparam('qty'), diff_reason=bindparam('reason')),
+            rows
+        )
+    db.session.commit()
+    return len(rows), unknown
+
+
+def session_summary(stocktake):
+    """盘点单进度：(已录入行数, 差异行数, 差异数量合计)"""
+    counted, diffs, diff_total = db.session.query(
+        func.count(StocktakeItem.counted_quantity),
+        func.sum(case((StocktakeItem.counted_quantity != StocktakeItem.expected_quantity, 1), else_=0)),
+        func.sum(StocktakeItem.counted_quantity - StocktakeItem.expected_quantity),
+    ).filter(StocktakeItem.session_id == stocktake.session_id).one()
+    return counted, int(diffs or 0), int(diff_total or 0)
+
+
+def finish_session(stocktake, employee_id=None):
+    """完成盘点：单个事务内写入盘点记录并按差额调整库存，返回 (盘点行数, 差异行数)"""
+    # 以条件更新抢占状态，避免重复提交导致库存被调整两次
+    claimed = db.session.execute(
+        update(StocktakeSession).
+        where(StocktakeSession.session_id == stocktake.session_id, StocktakeSession.status == OPEN).
+        values(status=FINISHED, finish_time=datetime.now())
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        raise StocktakeError('盘点单已完成或已取消')
+
+    session_id = stocktake.session_id
+    counted = StocktakeItem.counted_quantity.isnot(None)
+    operator = employee_id or stocktake.employee_id
+    db.session.execute(
+        insert(InventoryCheck).from_select(
+            ['drug_id', 'warehouse_id', 'checked_quantity', 'actual_quantity', 'diff_reason',
+             'check_date', 'employee_id', 'create_time'],
+            select(StocktakeItem.drug_id, literal(stocktake.warehouse_id), StocktakeItem.expected_quantity,
+                   StocktakeItem.counted_quantity, StocktakeItem.diff_reason, literal(stocktake.check_date),
+                   literal(operator), literal(datetime.now())).
+            where(StocktakeItem.session_id == session_id, counted)
+        )
+    )
+
+    delta = select(StocktakeItem.counted_quantity - StocktakeItem.expected_quantity).\
+        where(StocktakeItem.session_id == session_id, StocktakeItem.drug_id == Inventory.drug_id).\
+        scalar_subquery()
+    counted_drugs = select(StocktakeItem.drug_id).where(StocktakeItem.session_id == session_id, counted)
+    db.session.execute(
+        update(Inventory).
+        where(Inventory.warehouse_id == stocktake.warehouse_id, Inventory.drug_id.in_(counted_drugs)).
+        values(quantity=Inventory.quantity + delta, last_check_date=stocktake.check_date).
+        execution_options(synchronize_session=False)
+    )
+
+    counted_count, diff_count, _ = session_summary(stocktake)
+    db.session.execute(
+        update(StocktakeSession).where(StocktakeSession.session_id == session_id).
+        values(counted_count=counted_count, diff_count=diff_count)
+    )
+    db.session.commit()
+    return counted_count, diff_count
+
+
+def cancel_session(stocktake):
+    """取消进行中的盘点单（不影响库存）"""
+    _require_open(stocktake)
+    stocktake.status = CANCELLED
+    stocktake.finish_time = datetime.now()
+    db.session.commit()
@@ -0,0 +1,120 @@
+"""
+仓库间调拨
+一张调拨单可包含多种药品，在一个事务内完成：
+1. 按 (warehouse_id, drug_id) 顺序一次锁定调出、调入两侧的库存行（顺序固定，避免死锁）
+2. 校验调出仓库存
+3. 以 CASE 表达式批量扣减调出仓、批量累加调入仓；调入仓无库存记录的药品以 upsert 新建
+"""
+from collections import OrderedDict
+
+from sqlalchemy import case, select, update
+
+from models import db, Inventory, Warehouse, DrugInfo, StockTransfer, StockTransferItem
+from services.dbutil import upsert_increment
+
+
+class TransferError(ValueError):
+    """调拨单数据不合法或库存不足"""
+
+
+def merge_lines(lines):
+    """合并同一药品的多行，lines 为 [(drug_id, quantity)]，返回 {drug_id: quantity}（保持录入顺序）"""
+    merged = OrderedDict()
+    for drug_id, quantity in lines:
+        drug_id, quantity = int(drug_id), int(quantity)
+        if quantity <= 0:
+            raise TransferError('调拨数量必须大于0')
+        merged[drug_id] = merged.get(drug_id, 0) + quantity
+    if not merged:
+        raise TransferError('调拨单至少需要一种药品')
+    return merged
+
+
+def _lock_inventory(warehouse_ids, drug_ids):
+    """按固定顺序锁定相关库存行，返回 {(warehouse_id, drug_id): quantity}"""
+    rows = db.session.execute(
+        select(Inventory.warehouse_id, Inventory.drug_id, Inventory.quantity).
+        where(Inventory.warehouse_id.in_(warehouse_ids), Inventory.drug_id.in_(drug_ids)).
+        order_by(Inventory.warehouse_id, Inventory.drug_id).
+        with_for_update()
+    )
+    return {(row.warehouse_id, row.drug_id): row.quantity for row in rows}
+
+
+def create_transfer(from_warehouse_id, to_warehouse_id, lines, transfer_date, employee_id=None, remark=None):
+    """创建调拨单并移动库存（单个事务），返回调拨单；校验失败抛出 TransferError 且不做任何修改"""
+    from_warehouse_id, to_warehouse_id = int(from_warehouse_id), int(to_warehouse_id)
+    if from_warehouse_id == to_warehouse_id:
+        raise TransferError('调出仓库与调入仓库不能相同')
+    quantities = merge_lines(lines)
+    drug_ids = sorted(quantities)
+
+    found = db.session.query(Warehouse.warehouse_id).\
+        filter(Warehouse.warehouse_id.in_([from_warehouse_id, to_warehouse_id])).count()
+    if found != 2:
+        raise TransferError('调出或调入仓库不存在')
+    known = {row[0] for row in db.session.query(DrugInfo.drug_id).\
+             filter(DrugInfo.drug_id.in_(drug_ids), DrugInfo.is_active.is_(True))}
+    missing = [drug_id for drug_id in drug_ids if drug_id not in known]
+    if missing:
+        raise TransferError(f'药品不存在：{", ".join(map(str, missing))}')
+
+    try:
+        stock = _lock_inventory(sorted([from_warehouse_id, to_warehouse_id]), drug_ids)
+        shortages = [
+            f'{drug_id}（库存 {stock.get((from_warehouse_id, drug_id), 0)}，调拨 {quantity}）'
+            for drug_id, quantity in quantities.items()
+            if stock.get((from_warehouse_id, drug_id), 0) < quantity
+        ]
+        if shortages:
+            raise TransferError('调出仓库存不足：' + '；'.join(shortages))
+
+        db.session.execute(
+            update(Inventory).
+            where(Inventory.warehouse_id == from_warehouse_id, Inventory.drug_id.in_(drug_ids)).
+            values(quantity=Inventory.quantity - case(quantities, value=Inventory.drug_id, else_=0)).
+            execution_options(synchronize_session=False)
+        )
+        existing = [drug_id for drug_id in drug_ids if (to_warehouse_id, drug_id) in stock]
+        if existing:
+            db.session.execute(
+                update(Inventory).
+                where(Inventory.warehouse_id == to_warehouse_id, Inventory.drug_id.in_(existing)).
+                values(quantity=Inventory.quantity + case(quantities, value=Inventory.drug_id, else_=0)).
+                execution_options(synchronize_session=False)
+            )
+        for drug_id in drug_ids:
+            if (to_warehouse_id, drug_id) not in stock:
+                # 调入仓尚无该药品：upsert 兼容并发入库同时新建同一库存行
+                upsert_increment(Inventory.__table__, {'drug_id': drug_id, 'warehouse_id': to_warehouse_id},
+                                 {'quantity': quantities[drug_id]})
+
+        transfer = StockTransfer(
+            from_warehouse_id=from_warehouse_id,
+            to_warehouse_id=to_warehouse_id,
+            transfer_date=transfer_date,
+            line_count=len(quantities),
+            total_quantity=sum(quantities.values()),
+            remark=remark,
+            employee_id=employee_id,
+        )
+        db.session.add(transfer)
+        db.session.flush()
+        db.session.execute(StockTransferItem.__table__.insert(), [
+            {'transfer_id': transfer.transfer_id, 'drug_id': drug_id, 'quantity': quantity}
+            for drug_id, quantity in quantities.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return transfer
+
+
+def parse_form_lines(form):
+    """从表单的 drug_id / quantity 多值字段读取调拨行，忽略空行"""
+    return [
+        (drug_id, quantity)
+        for drug_id, quantity in zip(form.getlist('drug_id'), form.getlist('quantity'))
+        if drug_id and quantity
+    ]
@@ -0,0 +1,142 @@
+"""
+长周期趋势数据
+按日读取预聚合数据（销售多维汇总表的日桶、或财务统计的日报），在服务端按 日/周/月 合并周期、
+补齐无数据的周期，再用 LTTB（Largest-Triangle-Three-Buckets）降采样到点数上限：
+多年的日趋势也只返回几百个点，保留峰谷形状，图表加载与周报一样快。
+
+数据库每次只做一次按日分组的汇总查询（多年数据也只有几千行），结果按
+(指标, 区间, 粒度, 点数) 缓存在报表缓存分区，销售/退货/统计写入后随报表缓存失效。
+"""
+from datetime import timedelta
+
+from sqlalchemy import func
+
+from models import db, FinanceStat, SalesCubeDaily
+from services.cache import REPORT_CACHE, get_cache
+
+GRANULARITIES = ('day', 'week', 'month')
+MAX_POINTS = 5000
+
+_cube = SalesCubeDaily
+# 指标名称 -> (说明, 数据来源, 日汇总表达式)
+METRICS = {
+    'net_sales': ('净销售额（销售-退货）', 'cube', func.sum(_cube.amount - _cube.return_amount)),
+    'sales': ('销售额', 'cube', func.sum(_cube.amount)),
+    'returns': ('退货额', 'cube', func.sum(_cube.return_amount)),
+    'profit': ('毛利（扣除退货）', 'cube',
+               func.sum(_cube.amount - _cube.cost - _cube.return_amount + _cube.return_cost)),
+    'quantity': ('销售数量', 'cube', func.sum(_cube.quantity)),
+    'finance_sales': ('日报净销售额', 'finance', FinanceStat.total_sales),
+    'finance_profit': ('日报利润', 'finance', FinanceStat.total_profit),
+}
+
+
+class TrendError(ValueError):
+    """指标、粒度或区间参数不合法"""
+
+
+def period_start(day, granularity):
+    """日期所在周期的第一天（周以周一开始）"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return (day + timedelta(days=32)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _daily_values(metric, start, end):
+    """[(日期, 数值)]：一次按日分组查询"""
+    _, source, expr = METRICS[metric]
+    if source == 'cube':
+        query = db.session.query(_cube.stat_date, expr).\
+            filter(_cube.stat_date.between(start, end)).group_by(_cube.stat_date)
+    else:
+        query = db.session.query(FinanceStat.stat_date, expr).\
+            filter(FinanceStat.stat_type == '日', FinanceStat.stat_date.between(start, end))
+    return query.all()
+
+
+def aggregate(rows, start, end, granularity):
+    """按周期合并日数据并补齐空周期，返回按时间排序的 [(周期起始日, float)]"""
+    totals = {}
+    for day, value in rows:
+        key = period_start(day, granularity)
+        totals[key] = totals.get(key, 0.0) + float(value or 0)
+    series = []
+    current = period_start(start, granularity)
+    while current <= end:
+        series.append((current, totals.get(current, 0.0)))
+        current = _next_period(current, granularity)
+    return series
+
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets 降采样，points 为 [(x, y)]，保留首尾点
+
+    x 使用点的序号（周期等距），每个桶选出与前一选中点、下一桶均值点构成最大三角形的点。
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = 0
+    for i in range(threshold - 2):
+        bucket_start = int(i * bucket_size) + 1
+        bucket_end = int((i + 1) * bucket_size) + 1
+        next_start, next_end = bucket_end, min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= n - 1:
+            next_start, next_end = n - 1, n
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(points[j][1] for j in range(next_start, next_end)) / (next_end - next_start)
+
+        ax, ay = selected, points[selected][1]
+        best, best_area = bucket_start, -1.0
+        for j in range(bucket_start, bucket_end):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - j) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        selected = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def first_date(metric):
+    """指标最早有数据的日期（range=all 时作为起点）"""
+    if METRICS[metric][1] == 'cube':
+        return db.session.query(func.min(_cube.stat_date)).scalar()
+    return db.session.query(func.min(FinanceStat.stat_date)).filter(FinanceStat.stat_type == '日').scalar()
+
+
+def trend(metric, start, end, granularity='day', max_points=500):
+    """趋势数据：{'points': [[日期, 数值]], 'periods': 降采样前的周期数, ...}"""
+    if metric not in METRICS:
+        raise TrendError(f'不支持的指标：{metric}（可选 {", ".join(METRICS)}）')
+    if granularity not in GRANULARITIES:
+        raise TrendError(f'不支持的粒度：{granularity}（可选 {", ".join(GRANULARITIES)}）')
+    if start > end:
+        raise TrendError('开始日期不能晚于结束日期')
+    if not 3 <= max_points <= MAX_POINTS:
+        raise TrendError(f'点数上限须在 3~{MAX_POINTS} 之间')
+
+    def build():
+        series = aggregate(_daily_values(metric, start, end), start, end, granularity)
+        return {
+            'metric': metric,
+            'label': METRICS[metric][0],
+            'granularity': granularity,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'periods': len(series),
+            'points': [[day.isoformat(), round(value, 2)] for day, value in lttb(series, max_points)],
+        }
+    return get_cache(REPORT_CACHE).get_or_set(('trend', metric, start, end, granularity, max_points), build)
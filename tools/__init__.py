@@ -0,0 +1,4 @@
+"""
+命令行工具包
+包括：合成数据生成、压力测试等（使用 python -m tools.<模块名> 运行）
+"""
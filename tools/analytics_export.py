@@ -0,0 +1,51 @@
+"""
+列式分析快照导出（cron 入口）
+按 create_time 增量导出事实表、全量导出维度表到 ANALYTICS_DIR，可配合 --report 直接在快照上查询。
+
+用法：
+    python -m tools.analytics_export
+    python -m tools.analytics_export --report monthly_sales_by_category --start 2025-01-01 --end 2025-12-31
+cron 示例（每 15 分钟）：
+    */15 * * * * cd /path/to/medicine_sql && python -m tools.analytics_export
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+
+def main(argv=None):
+    from services.analytics_store import REPORTS
+
+    parser = argparse.ArgumentParser(description='导出列式分析快照并可执行预置报表')
+    parser.add_argument('--database-uri', help='源数据库（默认使用 config.Config / DATABASE_URL）')
+    parser.add_argument('--directory', help='快照目录（默认 config.ANALYTICS_DIR）')
+    parser.add_argument('--skip-export', action='store_true', help='不导出，只查询现有快照')
+    parser.add_argument('--report', choices=sorted(REPORTS), help='导出后执行的报表')
+    parser.add_argument('--start', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date())
+    parser.add_argument('--end', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date())
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from services.analytics_store import export, run_report
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else {}
+    app = create_app(Config, **overrides)
+    directory = args.directory or app.config['ANALYTICS_DIR']
+    if not args.skip_export:
+        with app.app_context():
+            started = time.perf_counter()
+            exported = export(directory, app.config.get('ANALYTICS_EXPORT_LAG', 60))
+            print(f'导出完成（{time.perf_counter() - started:.1f}s）：{exported}')
+    if args.report:
+        end = args.end or datetime.now().date()
+        start = args.start or end - timedelta(days=364)
+        started = time.perf_counter()
+        rows = run_report(directory, args.report, start, end, app.config.get('ANALYTICS_THREADS'))
+        for row in rows[:50]:
+            print(row)
+        print(f'{len(rows)} 行（{(time.perf_counter() - started) * 1000:.1f} ms）')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+历史明细冷存储转移（cron 入口）
+把早于指定天数的销售、销售退货、入库、供应商退货明细分批转入归档表，并保留进退货日汇总。
+
+用法：
+    python -m tools.cold_tier
+    python -m tools.cold_tier --age-days 730 --batch-size 2000
+cron 示例（每周日凌晨）：
+    30 2 * * 0 cd /path/to/medicine_sql && python -m tools.cold_tier
+"""
+import argparse
+import time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把历史明细转入冷存储归档表')
+    parser.add_argument('--database-uri', help='目标数据库（默认使用 config.Config / DATABASE_URL）')
+    parser.add_argument('--age-days', type=int, help='转移早于该天数的明细（默认 config.COLD_TIER_AGE_DAYS）')
+    parser.add_argument('--batch-size', type=int, help='每批转移行数（默认 config.COLD_TIER_BATCH_SIZE）')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from services.cold_tier import tier_cold_data
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else {}
+    app = create_app(Config, **overrides)
+    with app.app_context():
+        started = time.perf_counter()
+        moved = tier_cold_data(args.age_days or app.config.get('COLD_TIER_AGE_DAYS', 365),
+                               args.batch_size or app.config.get('COLD_TIER_BATCH_SIZE', 5000),
+                               lambda done, total=None, message=None: message and print(message))
+        print(f'转移完成（{time.perf_counter() - started:.1f}s）：{moved}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+客户 RFM 分析（cron 入口，需安装 numpy、pandas）
+汇总上次运行之后的新销售与退货，更新每位客户的 R/F/M 评分与客户分群，并打印各分群人数。
+
+用法：
+    python -m tools.customer_rfm
+    python -m tools.customer_rfm --full
+cron 示例（每天凌晨）：
+    40 1 * * * cd /path/to/medicine_sql && python -m tools.customer_rfm
+"""
+import argparse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='增量更新客户 RFM 评分与分群')
+    parser.add_argument('--database-uri', help='目标数据库（默认使用 config.Config / DATABASE_URL）')
+    parser.add_argument('--full', action='store_true', help='清空后从全部历史明细重算')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from models import db
+    from services.customer_rfm import refresh, segment_summary
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else {}
+    app = create_app(Config, **overrides)
+    with app.app_context():
+        db.create_all()  # 首次运行时建立分析表
+        run = refresh(args.full, lambda done, total=None, message=None: message and print(message))
+        print(f'完成（{run.seconds}s）：{run.customers} 位客户，写入 {run.changed} 行')
+        for customer_type, segment, count, monetary in segment_summary():
+            print(f'  {customer_type:<4}{segment:<8}{count:>10}{float(monetary or 0):>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+数据库快照：保存 / 恢复 / 重置
+快照文件保存在 FIXTURE_SNAPSHOT_DIR（默认 instance/fixtures），文件名带表结构指纹，模型变化后需重新保存。
+
+用法：
+    python -m tools.fixtures reset                       # 有快照时恢复，否则重建、初始化并保存 seed 快照
+    python -m tools.fixtures capture --rebuild           # 重建并初始化基础数据后保存 seed 快照
+    python -m tools.fixtures capture --name demo         # 把当前数据库（如 gen_data 生成的演示数据）保存为 demo 快照
+    python -m tools.fixtures restore --name demo --database-uri sqlite:///instance/demo.db
+测试准备示例（每个用例前恢复，毫秒级）：
+    with app.app_context():
+        services.fixtures.reset()
+"""
+import argparse
+import os
+import sys
+import time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='保存或恢复数据库快照')
+    parser.add_argument('action', choices=['capture', 'restore', 'reset'],
+                        help='capture 保存快照，restore 恢复快照，reset 有快照时恢复否则重建并保存')
+    parser.add_argument('--database-uri', help='目标数据库（默认使用 config.Config / DATABASE_URL）')
+    parser.add_argument('--name', default='seed', help='快照名称（默认 seed：只含基础数据）')
+    parser.add_argument('--rebuild', action='store_true', help='capture 前先删除重建全部表并初始化基础数据')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from services import fixtures
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else {}
+    app = create_app(Config, **overrides)
+    with app.app_context():
+        if args.action == 'capture':
+            started = time.perf_counter()
+            if args.rebuild:
+                fixtures.rebuild()
+            path, seconds = fixtures.capture(args.name)
+            print(f'快照已保存：{path}（{os.path.getsize(path) / 1024:.0f} KB，'
+                  f'用时 {time.perf_counter() - started:.2f}s，其中复制 {seconds:.2f}s）')
+        elif args.action == 'restore':
+            try:
+                seconds = fixtures.restore(args.name)
+            except fixtures.SnapshotMissing as e:
+                print(f'快照不存在或表结构已变化：{e}，请先执行 capture')
+                sys.exit(1)
+            print(f'已从快照 {args.name} 恢复（{seconds:.2f}s）')
+        else:
+            restored, seconds = fixtures.reset(args.name)
+            print(f'数据库已{"从快照恢复" if restored else "重建并保存快照"}（{seconds:.2f}s）')
+
+
+if __name__ == '__main__':
+    main()
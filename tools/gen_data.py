@@ -0,0 +1,424 @@
+"""
+合成数据生成器
+按指定规模向任意已配置的数据库批量写入一套前后一致的业务数据：
+药品、客户、供应商、仓库、员工，以及入库/供应商退货/销售/销售退货/盘点流水。
+
+- 相同的随机种子 + 相同的起始数据库 => 完全相同的数据
+- 主键由生成器显式分配，流水之间的引用无需回查数据库
+- 按 chunk_size 分批 executemany 插入，百万级流水内存占用恒定
+- 最终库存 = 入库 - 供应商退货 - 销售 + 销售退货 + 盘点差异，保证不出现负库存
+
+用法：
+    python -m tools.gen_data --database-uri sqlite:///medicine_bench.db --create-tables \\
+        --drugs 2000 --customers 20000 --sales 1000000 --seed 42
+"""
+import argparse
+import itertools
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, insert
+
+from models import (
+    db,
+    DrugInfo,
+    EmployeeInfo,
+    CustomerInfo,
+    SupplierInfo,
+    Warehouse,
+    Inventory,
+    StockIn,
+    ReturnStock,
+    Sales,
+    SalesReturn,
+    InventoryCheck,
+)
+
+# 默认规模（可通过命令行参数覆盖）
+DEFAULT_SCALE = {
+    'drugs': 500,
+    'customers': 2000,
+    'suppliers': 50,
+    'warehouses': 3,
+    'employees': 30,
+    'stock_ins': 20000,
+    'sales': 200000,
+    'sales_returns': 4000,
+    'return_stocks': 1000,
+    'inventory_checks': 5000,
+}
+
+CATEGORIES = ['处方', '非处方']
+UNITS = ['盒', '瓶', '支', '袋', '板']
+SPECS = ['10mg*24片', '0.25g*12粒', '100ml', '5g*10袋', '20mg*30片']
+CUSTOMER_TYPES = ['零售', '批发']
+DEPARTMENTS = ['销售部', '仓储部', '财务部', '采购部']
+POSITIONS = ['店员', '主管', '仓管员', '会计']
+CHECK_REASONS = ['破损', '过期报损', '盘点录入误差', '串货']
+RETURN_REASONS = ['包装破损', '临近效期', '质量问题', '客户退单']
+
+
+def _next_id(column):
+    """返回某主键列的下一个可用值，生成器在此基础上连续分配主键"""
+    return (db.session.query(func.max(column)).scalar() or 0) + 1
+
+
+def _bulk_insert(model, rows):
+    """executemany 方式批量插入（不经过 ORM 单对象 flush）"""
+    if rows:
+        db.session.execute(insert(model), rows)
+
+
+class _DayPicker:
+    """按权重抽取业务日期：整体随时间缓慢增长，周末和月初客流更高"""
+
+    def __init__(self, rng, start_date, days):
+        self.rng = rng
+        self.dates = [start_date + timedelta(days=i) for i in range(days)]
+        weights = []
+        for i, day in enumerate(self.dates):
+            weight = 1.0 + 0.6 * i / max(days - 1, 1)
+            if day.weekday() >= 5:
+                weight *= 1.35
+            if day.day <= 3:
+                weight *= 1.15
+            weights.append(weight)
+        self.cum_weights = list(itertools.accumulate(weights))
+
+    def pick(self):
+        return self.rng.choices(self.dates, cum_weights=self.cum_weights)[0]
+
+
+def _popularity_weights(rng, n):
+    """类 Zipf 分布的热度权重：少数药品/客户贡献大部分流水"""
+    ranks = list(range(1, n + 1))
+    rng.shuffle(ranks)
+    return list(itertools.accumulate(1.0 / (rank ** 0.8) for rank in ranks))
+
+
+def generate_dataset(scale=None, seed=42, days=365, end_date=None, chunk_size=5000, log=print):
+    """在当前应用上下文中生成数据集，返回各表写入行数"""
+    scale = dict(DEFAULT_SCALE, **(scale or {}))
+    rng = random.Random(seed)
+    end_date = end_date or datetime.now().date()
+    start_date = end_date - timedelta(days=days - 1)
+    day_picker = _DayPicker(rng, start_date, days)
+    now = datetime.now()
+    counts = {}
+
+    def flush_chunks(model, rows, force=False):
+        if rows and (force or len(rows) >= chunk_size):
+            _bulk_insert(model, rows)
+            counts[model.__tablename__] = counts.get(model.__tablename__, 0) + len(rows)
+            rows.clear()
+
+    # ---------- 员工 ----------
+    emp_start = _next_id(EmployeeInfo.employee_id)
+    employee_ids = list(range(emp_start, emp_start + scale['employees']))
+    _bulk_insert(EmployeeInfo, [{
+        'employee_id': emp_id,
+        'name': f'员工{emp_id:06d}',
+        'department': rng.choice(DEPARTMENTS),
+        'position': rng.choice(POSITIONS),
+        'phone': f'139{emp_id:08d}',
+        'hire_date': start_date - timedelta(days=rng.randint(0, 2000)),
+        'account': f'emp{emp_id:06d}',
+        'password': '123456',
+        'status': '在职',
+        'create_time': now,
+        'update_time': now,
+    } for emp_id in employee_ids])
+    counts['employee_info'] = len(employee_ids)
+
+    # ---------- 仓库 ----------
+    wh_start = _next_id(Warehouse.warehouse_id)
+    warehouse_ids = list(range(wh_start, wh_start + scale['warehouses']))
+    _bulk_insert(Warehouse, [{
+        'warehouse_id': wh_id,
+        'name': f'仓库{wh_id:04d}',
+        'address': f'测试路{wh_id}号',
+        'manager_id': rng.choice(employee_ids),
+        'create_time': now,
+    } for wh_id in warehouse_ids])
+    counts['warehouse'] = len(warehouse_ids)
+
+    # ---------- 供应商 ----------
+    sup_start = _next_id(SupplierInfo.supplier_id)
+    supplier_ids = list(range(sup_start, sup_start + scale['suppliers']))
+    _bulk_insert(SupplierInfo, [{
+        'supplier_id': sup_id,
+        'name': f'供应商{sup_id:06d}',
+        'contact': f'联系人{sup_id}',
+        'phone': f'137{sup_id:08d}',
+        'address': f'工业园{sup_id}号',
+        'qualification_no': f'GSP{sup_id:08d}',
+        'create_time': now,
+        'update_time': now,
+    } for sup_id in supplier_ids])
+    counts['supplier_info'] = len(supplier_ids)
+
+    # ---------- 客户 ----------
+    cus_start = _next_id(CustomerInfo.customer_id)
+    customer_ids = list(range(cus_start, cus_start + scale['customers']))
+    customer_types = {}
+    rows = []
+    for cus_id in customer_ids:
+        customer_types[cus_id] = '批发' if rng.random() < 0.15 else '零售'
+        rows.append({
+            'customer_id': cus_id,
+            'name': f'客户{cus_id:07d}',
+            'type': customer_types[cus_id],
+            'contact': f'联系人{cus_id}',
+            'phone': f'138{cus_id:08d}',
+            'address': f'幸福路{cus_id}号',
+            'create_time': now,
+            'update_time': now,
+        })
+        flush_chunks(CustomerInfo, rows)
+    flush_chunks(CustomerInfo, rows, force=True)
+
+    # ---------- 药品 ----------
+    drug_start = _next_id(DrugInfo.drug_id)
+    drug_ids = list(range(drug_start, drug_start + scale['drugs']))
+    drug_suppliers = {}
+    drug_warehouse = {}
+    drug_prices = {}
+    rows = []
+    for index, drug_id in enumerate(drug_ids):
+        purchase_price = Decimal(rng.randint(100, 20000)) / 100
+        sale_price = (purchase_price * Decimal(str(round(rng.uniform(1.2, 1.6), 2)))).quantize(Decimal('0.01'))
+        drug_prices[drug_id] = (sale_price, purchase_price)
+        drug_suppliers[drug_id] = rng.sample(supplier_ids, k=min(len(supplier_ids), rng.randint(1, 3)))
+        # 每个药品固定存放在一个仓库，流水与库存一一对应
+        drug_warehouse[drug_id] = warehouse_ids[index % len(warehouse_ids)]
+        rows.append({
+            'drug_id': drug_id,
+            'name': f'测试药品{drug_id:06d}',
+            'spec': rng.choice(SPECS),
+            'manufacturer': f'制药厂{rng.randint(1, 200):03d}',
+            'approval_number': f'国药准字H{drug_id:08d}',
+            'category': rng.choice(CATEGORIES),
+            'unit': rng.choice(UNITS),
+            'purchase_price': purchase_price,
+            'sale_price': sale_price,
+            'shelf_life_months': rng.choice([12, 24, 36]),
+            'status': '在售',
+            'create_time': now,
+            'update_time': now,
+        })
+        flush_chunks(DrugInfo, rows)
+    flush_chunks(DrugInfo, rows, force=True)
+    db.session.commit()
+    log(f'基础数据完成：{counts}')
+
+    # ---------- 销售 + 销售退货 ----------
+    drug_cum = _popularity_weights(rng, len(drug_ids))
+    customer_cum = _popularity_weights(rng, len(customer_ids))
+    sold = defaultdict(int)
+    customer_returned = defaultdict(int)
+    return_prob = scale['sales_returns'] / scale['sales'] if scale['sales'] else 0
+    sales_id = _next_id(Sales.sales_id)
+    sales_return_id = _next_id(SalesReturn.sales_return_id)
+    sales_rows, return_rows = [], []
+    for _ in range(scale['sales']):
+        drug_id = rng.choices(drug_ids, cum_weights=drug_cum)[0]
+        customer_id = rng.choices(customer_ids, cum_weights=customer_cum)[0]
+        quantity = rng.randint(10, 200) if customer_types[customer_id] == '批发' else rng.randint(1, 5)
+        sales_date = day_picker.pick()
+        sales_rows.append({
+            'sales_id': sales_id,
+            'drug_id': drug_id,
+            'customer_id': customer_id,
+            'customer_type': customer_types[customer_id],
+            'quantity': quantity,
+            'unit_price': drug_prices[drug_id][0],
+            'unit_cost': drug_prices[drug_id][1],
+            'sales_date': sales_date,
+            'warehouse_id': drug_warehouse[drug_id],
+            'employee_id': rng.choice(employee_ids),
+            'create_time': now,
+        })
+        sold[drug_id] += quantity
+        if rng.random() < return_prob:
+            return_qty = rng.randint(1, quantity)
+            return_rows.append({
+                'sales_return_id': sales_return_id,
+                'sales_id': sales_id,
+                'quantity': return_qty,
+                'unit_price': drug_prices[drug_id][0],
+                'unit_cost': drug_prices[drug_id][1],
+                'reason': rng.choice(RETURN_REASONS),
+                'return_date': min(sales_date + timedelta(days=rng.randint(0, 14)), end_date),
+                'warehouse_id': drug_warehouse[drug_id],
+                'employee_id': rng.choice(employee_ids),
+                'create_time': now,
+            })
+            customer_returned[drug_id] += return_qty
+            sales_return_id += 1
+        sales_id += 1
+        # 退货引用销售主键，必须在同批销售写入之后再写
+        if len(sales_rows) >= chunk_size:
+            flush_chunks(Sales, sales_rows, force=True)
+            flush_chunks(SalesReturn, return_rows, force=True)
+            db.session.commit()
+    flush_chunks(Sales, sales_rows, force=True)
+    flush_chunks(SalesReturn, return_rows, force=True)
+    db.session.commit()
+    log(f'销售流水完成：sales={counts.get("sales", 0)} sales_return={counts.get("sales_return", 0)}')
+
+    # ---------- 入库 + 供应商退货 ----------
+    # 每个药品的入库总量 = 净销售量 + 余量，余量中的一部分用于供应商退货
+    rows_per_drug = {drug_id: 1 for drug_id in drug_ids} if scale['stock_ins'] >= len(drug_ids) else {}
+    need = {drug_id: max(sold[drug_id] - customer_returned[drug_id], 0) for drug_id in drug_ids}
+    need_cum = list(itertools.accumulate(need[drug_id] + 1 for drug_id in drug_ids))
+    for _ in range(scale['stock_ins'] - len(rows_per_drug)):
+        drug_id = rng.choices(drug_ids, cum_weights=need_cum)[0]
+        rows_per_drug[drug_id] = rows_per_drug.get(drug_id, 0) + 1
+
+    stock_in_id = _next_id(StockIn.stock_in_id)
+    return_stock_id = _next_id(ReturnStock.return_id)
+    supplier_return_prob = scale['return_stocks'] / scale['stock_ins'] if scale['stock_ins'] else 0
+    stock_rows, supplier_return_rows = [], []
+    stocked = defaultdict(int)
+    supplier_returned = defaultdict(int)
+    for drug_id in drug_ids:
+        n_rows = rows_per_drug.get(drug_id, 0)
+        if not n_rows:
+            continue
+        surplus = rng.randint(50, 500)
+        total = need[drug_id] + surplus
+        # 随机切分总量到各条入库记录
+        cuts = sorted(rng.randint(0, total) for _ in range(n_rows - 1))
+        quantities = [b - a for a, b in zip([0] + cuts, cuts + [total])]
+        for quantity in quantities:
+            quantity = max(quantity, 1)
+            supplier_id = rng.choice(drug_suppliers[drug_id])
+            stock_in_date = day_picker.pick()
+            stock_rows.append({
+                'stock_in_id': stock_in_id,
+                'drug_id': drug_id,
+                'supplier_id': supplier_id,
+                'quantity': quantity,
+                'stock_in_date': stock_in_date,
+                'warehouse_id': drug_warehouse[drug_id],
+                'employee_id': rng.choice(employee_ids),
+                'remark': None,
+                'create_time': now,
+            })
+            stocked[drug_id] += quantity
+            # 供应商退货只动用余量，不影响可售库存
+            available = min(quantity, surplus - supplier_returned[drug_id])
+            if available > 0 and rng.random() < supplier_return_prob:
+                return_qty = rng.randint(1, available)
+                supplier_return_rows.append({
+                    'return_id': return_stock_id,
+                    'drug_id': drug_id,
+                    'supplier_id': supplier_id,
+                    'quantity': return_qty,
+                    'reason': rng.choice(RETURN_REASONS),
+                    'return_date': min(stock_in_date + timedelta(days=rng.randint(1, 30)), end_date),
+                    'warehouse_id': drug_warehouse[drug_id],
+                    'employee_id': rng.choice(employee_ids),
+                    'create_time': now,
+                })
+                supplier_returned[drug_id] += return_qty
+                return_stock_id += 1
+            stock_in_id += 1
+            flush_chunks(StockIn, stock_rows)
+            flush_chunks(ReturnStock, supplier_return_rows)
+    flush_chunks(StockIn, stock_rows, force=True)
+    flush_chunks(ReturnStock, supplier_return_rows, force=True)
+    db.session.commit()
+    log(f'入库流水完成：stock_in={counts.get("stock_in", 0)} return_stock={counts.get("return_stock", 0)}')
+
+    # ---------- 盘点 ----------
+    on_hand = {
+        drug_id: stocked[drug_id] - supplier_returned[drug_id] - sold[drug_id] + customer_returned[drug_id]
+        for drug_id in drug_ids
+    }
+    last_check = {}
+    check_rows = []
+    for _ in range(scale['inventory_checks']):
+        drug_id = rng.choice(drug_ids)
+        checked = on_hand[drug_id]
+        diff = 0 if rng.random() < 0.8 else rng.randint(-3, 3)
+        actual = max(checked + diff, 0)
+        check_date = day_picker.pick()
+        check_rows.append({
+            'drug_id': drug_id,
+            'warehouse_id': drug_warehouse[drug_id],
+            'checked_quantity': checked,
+            'actual_quantity': actual,
+            'diff_reason': rng.choice(CHECK_REASONS) if actual != checked else None,
+            'check_date': check_date,
+            'employee_id': rng.choice(employee_ids),
+            'create_time': now,
+        })
+        on_hand[drug_id] = actual
+        last_check[drug_id] = max(last_check.get(drug_id, check_date), check_date)
+        flush_chunks(InventoryCheck, check_rows)
+    flush_chunks(InventoryCheck, check_rows, force=True)
+
+    # ---------- 库存 ----------
+    inventory_rows = []
+    for drug_id in drug_ids:
+        inventory_rows.append({
+            'drug_id': drug_id,
+            'warehouse_id': drug_warehouse[drug_id],
+            'quantity': on_hand[drug_id],
+            'location': f'{rng.choice("ABCDEF")}-{rng.randint(1, 20):02d}-{rng.randint(1, 10):02d}',
+            'last_check_date': last_check.get(drug_id),
+            'create_time': now,
+            'update_time': now,
+        })
+        flush_chunks(Inventory, inventory_rows)
+    flush_chunks(Inventory, inventory_rows, force=True)
+    db.session.commit()
+
+    # ---------- 销售多维汇总 ----------
+    from services import sales_cube
+    counts['sales_cube_daily'] = sales_cube.rebuild(start_date, end_date)
+    log(f'全部完成：{counts}')
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量生成医药管理系统合成数据')
+    parser.add_argument('--database-uri', help='目标数据库（默认使用 config.Config / DATABASE_URL）')
+    parser.add_argument('--create-tables', action='store_true', help='先执行 create_all 并初始化基础表')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--days', type=int, default=365, help='业务日期跨度（天，截止到 end-date）')
+    parser.add_argument('--end-date', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        help='最后一个业务日期（YYYY-MM-DD，默认今天）')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='每批插入行数')
+    for name, default in DEFAULT_SCALE.items():
+        parser.add_argument(f'--{name.replace("_", "-")}', type=int, default=default, dest=name,
+                            help=f'{name} 行数（默认 {default}）')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from models import init_basic_tables
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else {}
+    app = create_app(Config, **overrides)
+    with app.app_context():
+        if args.create_tables:
+            db.create_all()
+            init_basic_tables()
+        started = time.perf_counter()
+        generate_dataset(
+            scale={name: getattr(args, name) for name in DEFAULT_SCALE},
+            seed=args.seed,
+            days=args.days,
+            end_date=args.end_date,
+            chunk_size=args.chunk_size,
+        )
+        print(f'耗时 {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
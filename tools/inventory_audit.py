@@ -0,0 +1,157 @@
+"""
+库存核对（流水 vs 库存表）
+按仓库分区，由 --workers 个进程并行从入库/退货/销售/调拨/盘点流水推算每个 (药品, 仓库) 的应有数量，
+与库存表比较并输出差异报告；--fix 在一个事务内把库存改为应有数量（每条修正写入系统日志）。
+--purge 在核对后物理清理归档超过保留天数的基础资料（同后台 purge_archived 任务），再核对一次，
+清理使差异增加（删除了流水或库存）时报告新增差异并以退出码 2 结束，此时不执行 --fix。
+退出码：没有（未修正的）差异为 0，否则为 1，便于在 cron 中告警。
+
+用法：
+    python -m tools.inventory_audit
+    python -m tools.inventory_audit --workers 4 --csv instance/inventory_audit.csv
+    python -m tools.inventory_audit --fix --employee-id 1
+    python -m tools.inventory_audit --purge 30            # 核对 → 清理归档 30 天以上的记录 → 再核对
+cron 示例（每周日凌晨）：
+    30 3 * * 0 cd /path/to/medicine_sql && python -m tools.inventory_audit --csv instance/inventory_audit.csv
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+_app = None
+
+
+def _init_worker(overrides):
+    """工作进程初始化：每个进程建立自己的应用与数据库连接"""
+    global _app
+    from app import create_app
+    from config import Config
+
+    _app = create_app(Config, **overrides)
+
+
+def _audit(warehouse_id):
+    from services.inventory_audit import audit_partition
+
+    with _app.app_context():
+        return audit_partition(warehouse_id)
+
+
+def _label(warehouse_id):
+    return '未记录仓库' if warehouse_id is None else f'仓库 {warehouse_id}'
+
+
+def _scope(item):
+    """差异行的比较范围"""
+    return '全部仓库（含未记录仓库的流水）' if item.warehouse_id is None else _label(item.warehouse_id)
+
+
+def _write_csv(path, discrepancies, names):
+    from services.inventory_audit import COMPONENTS
+
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['drug_id', 'drug_name', 'warehouse_id', 'book', 'expected', 'diff', *COMPONENTS])
+        for item in discrepancies:
+            writer.writerow([item.drug_id, names.get(item.drug_id, ''),
+                             '' if item.warehouse_id is None else item.warehouse_id,
+                             '' if item.book is None else item.book, item.expected,
+                             item.expected - (item.book or 0), *(item.components[name] for name in COMPONENTS)])
+
+
+def _run(keys, workers, overrides):
+    """核对全部分区，返回各分区结果"""
+    results = []
+    if workers <= 1:
+        _init_worker(overrides)
+        for warehouse_id in keys:
+            results.append(_audit(warehouse_id))
+            print(f'  {_label(warehouse_id)}：{len(results[-1]["drugs"])} 种药品（{results[-1]["seconds"]}s）')
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(overrides,)) as pool:
+            futures = [pool.submit(_audit, warehouse_id) for warehouse_id in keys]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f'  {_label(result["warehouse_id"])}：{len(result["drugs"])} 种药品（{result["seconds"]}s）')
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按流水核对库存数量')
+    parser.add_argument('--database-uri', help='目标数据库（默认使用 config.Config / DATABASE_URL）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='并行核对的进程数（默认 CPU 核数，1 表示在当前进程内依次核对）')
+    parser.add_argument('--csv', help='把全部差异写入 CSV 文件')
+    parser.add_argument('--limit', type=int, default=50, help='终端只显示差异最大的前 N 行')
+    parser.add_argument('--fix', action='store_true', help='把库存改为应有数量（单个事务）')
+    parser.add_argument('--employee-id', type=int, help='修正记录到系统日志的操作人')
+    parser.add_argument('--purge', type=int, metavar='DAYS',
+                        help='核对后清理归档超过 DAYS 天的基础资料并再次核对，检查清理是否破坏流水')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from models import db, DrugInfo
+    from services.inventory_audit import apply_fixes, partitions, reconcile
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else {}
+    app = create_app(Config, **overrides)
+    with app.app_context():
+        keys = partitions()
+
+    started = time.perf_counter()
+    audited, discrepancies = reconcile(_run(keys, args.workers, overrides))
+    print(f'核对 {audited} 行（{len(keys) - 1} 个仓库，{args.workers} 个进程，'
+          f'{time.perf_counter() - started:.1f}s），差异 {len(discrepancies)} 行')
+
+    if args.purge is not None:
+        from services.archive import purge_archived
+
+        with app.app_context():
+            purged, kept = purge_archived(args.purge)
+        print('已清理：' + '，'.join(f'{entity} {count} 条' for entity, count in purged.items()) +
+              '；仍有流水而保留：' + '，'.join(f'{entity} {count} 条' for entity, count in kept.items()))
+        before = {(item.drug_id, item.warehouse_id): item for item in discrepancies}
+        audited, discrepancies = reconcile(_run(keys, args.workers, overrides))
+        introduced = [item for item in discrepancies if before.get((item.drug_id, item.warehouse_id)) != item]
+        print(f'清理后再次核对：差异 {len(discrepancies)} 行，其中清理新增 {len(introduced)} 行')
+        if introduced:
+            for item in introduced[:args.limit]:
+                print(f'  {item.drug_id:>8} {_scope(item):<10} 账面 {item.book}  应有 {item.expected}')
+            sys.exit(2)
+
+    with app.app_context():
+        ids = sorted({item.drug_id for item in discrepancies})
+        names = {}
+        for start in range(0, len(ids), 500):
+            names.update(db.session.query(DrugInfo.drug_id, DrugInfo.name).
+                         filter(DrugInfo.drug_id.in_(ids[start:start + 500])).all())
+        for item in discrepancies[:args.limit]:
+            book = '无记录' if item.book is None else item.book
+            print(f'  {item.drug_id:>8} {names.get(item.drug_id, ""):<12} {_scope(item):<10} '
+                  f'账面 {book:>8}  应有 {item.expected:>8}  差异 {item.expected - (item.book or 0):>+8}')
+        if len(discrepancies) > args.limit:
+            print(f'  ……其余 {len(discrepancies) - args.limit} 行见 --csv')
+        if args.csv:
+            _write_csv(args.csv, discrepancies, names)
+            print(f'差异报告已写入 {args.csv}')
+
+        remaining = len(discrepancies)
+        if args.fix and discrepancies:
+            fixed, skipped = apply_fixes(discrepancies, args.employee_id)
+            remaining = len(skipped)
+            print(f'已修正 {fixed} 行，跳过 {len(skipped)} 行')
+            for item, reason in skipped[:args.limit]:
+                print(f'  跳过 {item.drug_id} {_scope(item)}：{reason}')
+    sys.exit(1 if remaining else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+压力测试脚本
+以多线程并发访问正在运行的应用（python app.py / gunicorn），统计每个接口的延迟分位数。
+
+- 读请求：仪表盘、销售列表、库存列表、周报等热点页面
+- 写请求（--write-ratio > 0）：向销售登记接口提交表单，候选药品/客户从数据库抽样
+
+用法：
+    python -m tools.load_test --base-url http://127.0.0.1:5000 --concurrency 16 --requests 2000
+    python -m tools.load_test --duration 60 --write-ratio 0.2 --database-uri sqlite:///medicine_bench.db
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# 读接口：端点名 -> 路径
+READ_ENDPOINTS = {
+    'dashboard.index': '/',
+    'sales.sales_list': '/sales/sales',
+    'sales.return_list': '/sales/return',
+    'sales.finance_list': '/sales/finance',
+    'sales.report_week': '/sales/report/week',
+    'inventory.stock_list': '/inventory/stock',
+    'inventory.stock_in_list': '/inventory/stock_in',
+    'inventory.check_list': '/inventory/check',
+    'basic.drug_list': '/basic/drugs',
+}
+SALES_ADD_PATH = '/sales/sales/add'
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """POST 后的 302 不跟随，只统计写接口本身的耗时"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def percentile(sorted_values, pct):
+    """最近秩法分位数（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    """按端点汇总：请求数、错误数、吞吐、p50/p90/p99/max（毫秒）"""
+    report = {}
+    for endpoint in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(endpoint, []))
+        report[endpoint] = {
+            'count': len(values),
+            'errors': errors.get(endpoint, 0),
+            'rps': round(len(values) / elapsed, 2) if elapsed else 0,
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p90_ms': round(percentile(values, 90) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2) if values else 0,
+        }
+    return report
+
+
+def _load_write_candidates(database_uri, limit=500):
+    """从数据库抽样可售库存与客户，作为销售写请求的参数"""
+    from app import create_app
+    from config import Config
+    from models import db, Inventory, CustomerInfo
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': database_uri} if database_uri else {}
+    app = create_app(Config, **overrides)
+    with app.app_context():
+        stocks = db.session.query(Inventory.drug_id, Inventory.warehouse_id).\
+            filter(Inventory.quantity > 0).limit(limit).all()
+        customers = [row[0] for row in db.session.query(CustomerInfo.customer_id).limit(limit).all()]
+    if not stocks or not customers:
+        raise SystemExit('数据库中没有可用于销售的库存或客户，请先运行 tools.gen_data')
+    return [tuple(row) for row in stocks], customers
+
+
+def run(base_url, concurrency, total_requests=None, duration=None, write_ratio=0.0,
+        endpoints=None, database_uri=None, seed=0):
+    """执行压测并返回汇总报告"""
+    endpoints = endpoints or list(READ_ENDPOINTS)
+    stocks, customers = _load_write_candidates(database_uri) if write_ratio > 0 else ([], [])
+    opener = urllib.request.build_opener(_NoRedirect)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_ticket():
+        with lock:
+            if total_requests is not None and issued[0] >= total_requests:
+                return False
+            issued[0] += 1
+        return deadline is None or time.perf_counter() < deadline
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        while next_ticket():
+            if write_ratio > 0 and rng.random() < write_ratio:
+                endpoint = 'sales.sales_add'
+                drug_id, warehouse_id = rng.choice(stocks)
+                body = urllib.parse.urlencode({
+                    'drug_id': drug_id,
+                    'warehouse_id': warehouse_id,
+                    'customer_id': rng.choice(customers),
+                    'quantity': 1,
+                    'sales_date': datetime.now().strftime('%Y-%m-%d'),
+                }).encode()
+                req = urllib.request.Request(base_url + SALES_ADD_PATH, data=body)
+            else:
+                endpoint = rng.choice(endpoints)
+                req = urllib.request.Request(base_url + READ_ENDPOINTS[endpoint])
+            started = time.perf_counter()
+            try:
+                with opener.open(req, timeout=120) as resp:
+                    resp.read()
+                ok = True
+            except urllib.error.HTTPError as e:
+                # 写请求成功时返回 302（未跟随重定向）
+                ok = e.code in (301, 302, 303)
+            except (urllib.error.URLError, OSError):
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies[endpoint].append(elapsed)
+                else:
+                    errors[endpoint] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for worker_id in range(concurrency):
+            pool.submit(worker, worker_id)
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def print_report(report):
+    header = f'{"endpoint":<26}{"count":>8}{"err":>6}{"rps":>9}{"p50":>10}{"p90":>10}{"p99":>10}{"max":>10}'
+    print(header)
+    print('-' * len(header))
+    for endpoint, row in report.items():
+        print(f'{endpoint:<26}{row["count"]:>8}{row["errors"]:>6}{row["rps"]:>9}'
+              f'{row["p50_ms"]:>10}{row["p90_ms"]:>10}{row["p99_ms"]:>10}{row["max_ms"]:>10}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='并发压测 Flask 路由并统计延迟分位数')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发线程数')
+    parser.add_argument('--requests', type=int, help='总请求数（与 --duration 二选一）')
+    parser.add_argument('--duration', type=float, help='压测时长（秒）')
+    parser.add_argument('--write-ratio', type=float, default=0.0, help='销售写请求占比（0~1）')
+    parser.add_argument('--endpoints', nargs='*', choices=sorted(READ_ENDPOINTS), help='只压测指定的读接口')
+    parser.add_argument('--database-uri', help='抽样写请求参数所用的数据库（默认使用 config.Config）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_path', help='将报告另存为 JSON 文件')
+    args = parser.parse_args(argv)
+    if args.requests is None and args.duration is None:
+        args.requests = 1000
+
+    report = run(
+        args.base_url.rstrip('/'),
+        args.concurrency,
+        total_requests=args.requests,
+        duration=args.duration,
+        write_ratio=args.write_ratio,
+        endpoints=args.endpoints,
+        database_uri=args.database_uri,
+        seed=args.seed,
+    )
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+数据库结构升级
+项目通过 db.create_all() 建表，create_all 不会修改已存在的表；
+已有数据库缺少的新列、索引及历史数据回填由这里的升级步骤完成。
+每个步骤都先检查再执行，可重复运行：
+
+    python -m tools.migrations [--database-uri ...] [--only 步骤名]
+"""
+import argparse
+import time
+
+from sqlalchemy import inspect, text
+
+from models import (
+    db, Sales, SalesReturn, SalesCubeDaily, DrugInfo, CustomerInfo, SupplierInfo, EmployeeInfo, StockIn, ReturnStock,
+)
+
+# 升级步骤（按注册顺序执行）：[(名称, 函数)]
+MIGRATIONS = []
+# 回填时每批处理的主键区间大小，避免长时间锁表
+BATCH_SIZE = 10000
+
+
+def migration(name):
+    """注册升级步骤"""
+    def decorator(fn):
+        MIGRATIONS.append((name, fn))
+        return fn
+    return decorator
+
+
+def has_column(table, column):
+    return column in {col['name'] for col in inspect(db.engine).get_columns(table)}
+
+
+def has_index(table, name):
+    return name in {idx['name'] for idx in inspect(db.engine).get_indexes(table)}
+
+
+def add_column(table, column, ddl_type):
+    """列不存在时添加（先允许为空，回填后再收紧）"""
+    if not has_column(table, column):
+        db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl_type}'))
+        db.session.commit()
+        print(f'  + {table}.{column}')
+
+
+def create_model_index(model, name):
+    """按模型中声明的索引定义创建索引"""
+    if not has_index(model.__tablename__, name):
+        index = next(idx for idx in model.__table__.indexes if idx.name == name)
+        index.create(db.engine)
+        print(f'  + index {name}')
+
+
+def backfill(table, pk, sql, where):
+    """按主键区间分批执行 UPDATE 回填，每批单独提交"""
+    bounds = db.session.execute(text(f'SELECT MIN({pk}), MAX({pk}) FROM {table} WHERE {where}')).first()
+    if bounds[0] is None:
+        return 0
+    updated = 0
+    low = bounds[0]
+    while low <= bounds[1]:
+        result = db.session.execute(
+            text(f'{sql} WHERE {pk} >= :low AND {pk} < :high AND {where}'),
+            {'low': low, 'high': low + BATCH_SIZE}
+        )
+        db.session.commit()
+        updated += result.rowcount or 0
+        low += BATCH_SIZE
+    print(f'  ~ {table} 回填 {updated} 行')
+    return updated
+
+
+@migration('sales_unit_price')
+def _sales_unit_price():
+    """销售/销售退货记录成交单价与成本单价，回填历史数据并建立覆盖索引"""
+    for table in ('sales', 'sales_return'):
+        add_column(table, 'unit_price', 'NUMERIC(10, 2)')
+        add_column(table, 'unit_cost', 'NUMERIC(10, 2)')
+    # 历史销售按当前药品价格回填（此前价格未落库，这是能得到的最佳近似）
+    backfill(
+        'sales', 'sales_id',
+        'UPDATE sales SET '
+        'unit_price = (SELECT d.sale_price FROM drug_info d WHERE d.drug_id = sales.drug_id), '
+        'unit_cost = (SELECT d.purchase_price FROM drug_info d WHERE d.drug_id = sales.drug_id)',
+        'unit_price IS NULL'
+    )
+    # 退货沿用原销售单的价格
+    backfill(
+        'sales_return', 'sales_return_id',
+        'UPDATE sales_return SET '
+        'unit_price = (SELECT s.unit_price FROM sales s WHERE s.sales_id = sales_return.sales_id), '
+        'unit_cost = (SELECT s.unit_cost FROM sales s WHERE s.sales_id = sales_return.sales_id)',
+        'unit_price IS NULL'
+    )
+    if db.engine.dialect.name == 'mysql':
+        for table in ('sales', 'sales_return'):
+            db.session.execute(text(
+                f'ALTER TABLE {table} MODIFY unit_price DECIMAL(10, 2) NOT NULL, '
+                f'MODIFY unit_cost DECIMAL(10, 2) NOT NULL'
+            ))
+        db.session.commit()
+    create_model_index(Sales, 'ix_sales_date_amount')
+    create_model_index(SalesReturn, 'ix_sales_return_date_amount')
+
+
+@migration('sales_cube')
+def _sales_cube():
+    """销售记录出库仓库，并从历史明细初始化销售多维汇总表"""
+    add_column('sales', 'warehouse_id', 'INTEGER')
+    create_model_index(Sales, 'ix_sales_warehouse_id')
+    if not db.session.query(SalesCubeDaily.id).first():
+        from services import sales_cube
+        print(f'  ~ sales_cube_daily 初始化 {sales_cube.rebuild_all()} 个日桶')
+
+
+@migration('warehouse_update_time')
+def _warehouse_update_time():
+    """仓库表增加 update_time，供库存/仓库列表页生成 HTTP 缓存校验值"""
+    add_column('warehouse', 'update_time', 'DATETIME')
+    backfill('warehouse', 'warehouse_id', 'UPDATE warehouse SET update_time = create_time', 'update_time IS NULL')
+    if db.engine.dialect.name == 'mysql':
+        db.session.execute(text('ALTER TABLE warehouse MODIFY update_time DATETIME NOT NULL'))
+        db.session.commit()
+
+
+@migration('soft_delete')
+def _soft_delete():
+    """药品/客户/供应商/员工增加软删除标记与归档时间"""
+    for model in (DrugInfo, CustomerInfo, SupplierInfo, EmployeeInfo):
+        table = model.__tablename__
+        add_column(table, 'is_active', 'BOOLEAN NOT NULL DEFAULT 1')
+        add_column(table, 'deleted_time', 'DATETIME')
+        create_model_index(model, f'ix_{table}_is_active')
+
+
+@migration('movement_warehouse')
+def _movement_warehouse():
+    """入库、供应商退货、销售退货记录所属仓库（库存核对按 药品 × 仓库 汇总流水），回填可确定的历史仓库"""
+    for table in ('stock_in', 'return_stock', 'sales_return',
+                  'stock_in_archive', 'return_stock_archive', 'sales_return_archive'):
+        add_column(table, 'warehouse_id', 'INTEGER')
+    for model in (StockIn, ReturnStock, SalesReturn):
+        create_model_index(model, f'ix_{model.__tablename__}_warehouse_id')
+    # 只存放在一个仓库的药品，其历史入库、供应商退货与销售可确定仓库；其余留空（核对时按药品汇总比较）
+    single = 'drug_id IN (SELECT drug_id FROM inventory GROUP BY drug_id HAVING COUNT(*) = 1)'
+    filled_sales = 0
+    for table, pk in (('stock_in', 'stock_in_id'), ('return_stock', 'return_id'), ('sales', 'sales_id'),
+                      ('stock_in_archive', 'stock_in_id'), ('return_stock_archive', 'return_id'),
+                      ('sales_archive', 'sales_id')):
+        filled = backfill(
+            table, pk,
+            f'UPDATE {table} SET warehouse_id = '
+            f'(SELECT MIN(i.warehouse_id) FROM inventory i WHERE i.drug_id = {table}.drug_id)',
+            f'warehouse_id IS NULL AND {single}'
+        )
+        if table in ('sales', 'sales_archive'):
+            filled_sales += filled
+    # 销售退货回补到原销售单的出库仓库（此前仓库未落库，这是能得到的最佳近似）
+    for table, sales_table in (('sales_return', 'sales'), ('sales_return_archive', 'sales_archive')):
+        backfill(
+            table, 'sales_return_id',
+            f'UPDATE {table} SET warehouse_id = '
+            f'(SELECT s.warehouse_id FROM {sales_table} s WHERE s.sales_id = {table}.sales_id)',
+            'warehouse_id IS NULL'
+        )
+    if filled_sales:
+        # 销售多维汇总按出库仓库分桶，回填后重建
+        from services import sales_cube
+        print(f'  ~ sales_cube_daily 重建 {sales_cube.rebuild_all()} 个日桶')
+
+
+@migration('sales_cube_category')
+def _sales_cube_category():
+    """销售多维汇总表不再按药品分类分桶（查询时关联药品当前分类）：去掉分类列后从明细重建"""
+    if not has_column('sales_cube_daily', 'category'):
+        return
+    # 唯一约束随分类列变化，直接按模型重建表
+    SalesCubeDaily.__table__.drop(db.engine)
+    SalesCubeDaily.__table__.create(db.engine)
+    from services import sales_cube
+    print(f'  ~ sales_cube_daily 重建 {sales_cube.rebuild_all()} 个日桶')
+
+
+@migration('sales_customer_type')
+def _sales_customer_type():
+    """销售记录销售时的客户类型（销售多维汇总按它分桶，退货沿用原销售单），回填历史后重建汇总表"""
+    for table in ('sales', 'sales_archive'):
+        add_column(table, 'customer_type', 'VARCHAR(20)')
+    # 历史销售按当前客户类型回填（此前类型未落库，这是能得到的最佳近似）
+    filled = 0
+    for table in ('sales', 'sales_archive'):
+        filled += backfill(
+            table, 'sales_id',
+            f'UPDATE {table} SET customer_type = '
+            f"COALESCE((SELECT c.type FROM customer_info c WHERE c.customer_id = {table}.customer_id), '')",
+            'customer_type IS NULL'
+        )
+    if db.engine.dialect.name == 'mysql':
+        for table in ('sales', 'sales_archive'):
+            db.session.execute(text(f'ALTER TABLE {table} MODIFY customer_type VARCHAR(20) NOT NULL'))
+        db.session.commit()
+    if filled:
+        # 增量累加的日桶按销售时类型分桶，回填按当前类型，重建使汇总与明细一致
+        from services import sales_cube
+        print(f'  ~ sales_cube_daily 重建 {sales_cube.rebuild_all()} 个日桶')
+
+
+def run(only=None):
+    """依次执行升级步骤"""
+    for name, fn in MIGRATIONS:
+        if only and name not in only:
+            continue
+        started = time.perf_counter()
+        print(f'[{name}]')
+        fn()
+        print(f'  完成（{time.perf_counter() - started:.1f}s）')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='升级已有数据库的表结构并回填数据')
+    parser.add_argument('--database-uri', help='目标数据库（默认使用 config.Config / DATABASE_URL）')
+    parser.add_argument('--only', nargs='*', help='只执行指定步骤')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else {}
+    app = create_app(Config, **overrides)
+    with app.app_context():
+        # 新增的表由 create_all 创建，已有表的变化由升级步骤处理
+        db.create_all()
+        run(args.only)
+
+
+if __name__ == '__main__':
+    main()
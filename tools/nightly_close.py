@@ -0,0 +1,56 @@
+"""
+夜间日结（cron 入口）
+结算指定日期（默认昨天）：财务日报、当月月报、库存快照与参考数据缓存。
+同一天已完成的日结不会重复执行，可放心重复调度。
+
+cron 示例（每天 00:10）：
+    10 0 * * * cd /path/to/medicine_sql && python -m tools.nightly_close --warm-url http://127.0.0.1:5000
+
+说明：缓存为进程内缓存，cron 进程中的预热对 Web worker 无效，
+可通过 --warm-url 依次请求热点页面，让正在运行的 worker 完成预热。
+"""
+import argparse
+import urllib.request
+from datetime import datetime
+
+# --warm-url 时依次请求的页面
+WARM_PATHS = ['/', '/sales/report/week', '/sales/finance', '/sales/sales/add', '/inventory/stock_in/add']
+
+
+def warm_pages(base_url, paths=WARM_PATHS):
+    """请求热点页面以预热运行中 worker 的缓存，返回 [(路径, 状态码或错误)]"""
+    results = []
+    for path in paths:
+        try:
+            with urllib.request.urlopen(base_url.rstrip('/') + path, timeout=120) as resp:
+                resp.read()
+                results.append((path, resp.status))
+        except Exception as e:
+            results.append((path, str(e)))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='夜间日结：预计算日报/月报并预热缓存')
+    parser.add_argument('--date', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        help='结算日期（YYYY-MM-DD，默认昨天）')
+    parser.add_argument('--database-uri', help='目标数据库（默认使用 config.Config / DATABASE_URL）')
+    parser.add_argument('--warm-url', help='运行中应用的地址，日结后请求热点页面预热缓存')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from services.scheduler import run_nightly_close
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else {}
+    app = create_app(Config, JOB_RUN_INLINE=True, **overrides)
+    with app.app_context():
+        job, created = run_nightly_close(args.date)
+        print(f'任务 #{job.job_id} {job.status}：{job.message or ""}' + ('' if created else '（已存在，未重复执行）'))
+    if args.warm_url:
+        for path, status in warm_pages(args.warm_url):
+            print(f'预热 {path}: {status}')
+
+
+if __name__ == '__main__':
+    main()
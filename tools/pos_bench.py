@@ -0,0 +1,101 @@
+"""
+收银终端接入基准
+以 --terminals 个线程模拟收银终端，持续向 /sales/pos/transactions 提交每批 --batch 行的销售，
+报告入账行数/秒与请求延迟分位数；结束后把每个终端的第一批原样重发，校验全部按幂等键去重，
+并核对库存减少量与入账销售数量一致。
+
+对比组提交与逐请求提交：
+    python -m tools.pos_bench --database-uri sqlite:///instance/bench/bench_small_42.db
+    python -m tools.pos_bench --database-uri sqlite:///instance/bench/bench_small_42.db --no-group-commit
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+from datetime import date
+
+from sqlalchemy import func
+
+from tools.load_test import _load_write_candidates, percentile
+
+POS_PATH = '/sales/pos/transactions'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='收银终端批量接入吞吐基准')
+    parser.add_argument('--database-uri', required=True, help='已有数据的数据库（会写入销售记录，建议使用副本）')
+    parser.add_argument('--terminals', type=int, default=8, help='并发终端数')
+    parser.add_argument('--batch', type=int, default=50, help='每次提交的行数')
+    parser.add_argument('--duration', type=float, default=10, help='压测时长（秒）')
+    parser.add_argument('--no-group-commit', action='store_true', help='关闭组提交，每个请求单独提交')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from models import db, Inventory, Sales
+
+    app = create_app(Config, SQLALCHEMY_DATABASE_URI=args.database_uri,
+                     POS_GROUP_COMMIT=not args.no_group_commit, LIVE_FEED_ENABLED=False)
+    stocks, customers = _load_write_candidates(args.database_uri)
+    with app.app_context():
+        stock_before = db.session.query(func.sum(Inventory.quantity)).scalar() or 0
+        sales_before = db.session.query(func.count(Sales.sales_id)).scalar()
+
+    latencies, first_batches = [], {}
+    totals = {'accepted': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def terminal(number):
+        rng = random.Random(args.seed * 1000 + number)
+        client = app.test_client()
+        terminal_id = f'bench-{number}'
+        while time.perf_counter() < deadline:
+            sales = []
+            for _ in range(args.batch):
+                drug_id, warehouse_id = rng.choice(stocks)
+                sales.append({'key': uuid.uuid4().hex, 'drug_id': drug_id, 'warehouse_id': warehouse_id,
+                              'customer_id': rng.choice(customers), 'quantity': 1,
+                              'sales_date': date.today().isoformat()})
+            payload = {'terminal_id': terminal_id, 'sales': sales}
+            started = time.perf_counter()
+            response = client.post(POS_PATH, json=payload)
+            elapsed = time.perf_counter() - started
+            with lock:
+                first_batches.setdefault(terminal_id, payload)
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                    totals['accepted'] += response.json['accepted']
+                    totals['rejected'] += response.json['rejected']
+                else:
+                    totals['errors'] += 1
+
+    threads = [threading.Thread(target=terminal, args=(i,)) for i in range(args.terminals)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    client = app.test_client()
+    resent = [client.post(POS_PATH, json=payload).json for payload in first_batches.values()]
+    new_on_resend = sum(r['accepted'] - r['duplicates'] for r in resent)
+    with app.app_context():
+        stock_after = db.session.query(func.sum(Inventory.quantity)).scalar() or 0
+        sales_after = db.session.query(func.count(Sales.sales_id)).scalar()
+
+    latencies.sort()
+    mode = '逐请求提交' if args.no_group_commit else '组提交'
+    print(f'[{mode}] {args.terminals} 终端 × 每批 {args.batch} 行，{wall:.1f}s')
+    print(f'入账 {totals["accepted"]} 行（{totals["accepted"] / wall:.0f} 行/秒），拒绝 {totals["rejected"]} 行，'
+          f'失败请求 {totals["errors"]}')
+    print(f'请求延迟 p50 {percentile(latencies, 50) * 1000:.1f} ms，p99 {percentile(latencies, 99) * 1000:.1f} ms')
+    print(f'重发 {len(resent)} 批：新入账 {new_on_resend} 行（应为 0）')
+    print(f'销售记录增加 {sales_after - sales_before}，库存减少 {int(stock_before - stock_after)}')
+
+
+if __name__ == '__main__':
+    main()
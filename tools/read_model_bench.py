@@ -0,0 +1,136 @@
+"""
+列表读模型基准
+对比列表页两种取数方式：ORM 实体 + 关联名称（原写法） 与 列投影 namedtuple 读模型（services.read_models），
+分别测量查询耗时、每行常驻内存（tracemalloc）以及按行渲染表格的耗时。
+
+用法：
+    python -m tools.read_model_bench --database-uri sqlite:///instance/bench/bench_small_42.db
+    python -m tools.read_model_bench --database-uri sqlite:///instance/bench/bench_medium_42.db --repeat 5
+"""
+import argparse
+import gc
+import statistics
+import time
+import tracemalloc
+
+# 与模板相同的逐行输出（只保留单元格），分别以 ORM 实体和读模型的属性访问方式渲染
+SALES_ORM_TEMPLATE = (
+    '{% for sale, drug_name, customer_name, employee_name in rows %}<tr><td>#{{ sale.sales_id }}</td>'
+    '<td>{{ drug_name }}</td><td>{{ customer_name }}</td><td>{{ sale.quantity }}</td>'
+    '<td>{{ "%.2f"|format(sale.quantity * (sale.unit_price or 0)) }}</td><td>{{ sale.sales_date }}</td>'
+    '<td>{{ employee_name }}</td></tr>{% endfor %}'
+)
+SALES_ROW_TEMPLATE = (
+    '{% for sale in rows %}<tr><td>#{{ sale.sales_id }}</td>'
+    '<td>{{ sale.drug_name }}</td><td>{{ sale.customer_name }}</td><td>{{ sale.quantity }}</td>'
+    '<td>{{ "%.2f"|format(sale.quantity * (sale.unit_price or 0)) }}</td><td>{{ sale.sales_date }}</td>'
+    '<td>{{ sale.employee_name }}</td></tr>{% endfor %}'
+)
+STOCK_ORM_TEMPLATE = (
+    '{% for inventory, drug_name, unit, warehouse_name in rows %}<tr><td>{{ drug_name }}</td>'
+    '<td>{{ warehouse_name }}</td><td>{{ inventory.quantity }}</td><td>{{ unit }}</td>'
+    '<td>{{ inventory.location or "-" }}</td><td>{{ inventory.last_check_date or "-" }}</td></tr>{% endfor %}'
+)
+STOCK_ROW_TEMPLATE = (
+    '{% for inventory in rows %}<tr><td>{{ inventory.drug_name }}</td>'
+    '<td>{{ inventory.warehouse_name }}</td><td>{{ inventory.quantity }}</td><td>{{ inventory.unit }}</td>'
+    '<td>{{ inventory.location or "-" }}</td><td>{{ inventory.last_check_date or "-" }}</td></tr>{% endfor %}'
+)
+STOCK_IN_ORM_TEMPLATE = (
+    '{% for stock_in, drug_name, supplier_name, employee_name, purchase_price in rows %}'
+    '<tr><td>#{{ stock_in.stock_in_id }}</td><td>{{ drug_name }}</td><td>{{ supplier_name }}</td>'
+    '<td>{{ stock_in.quantity }}</td><td>{{ stock_in.stock_in_date }}</td><td>{{ employee_name }}</td>'
+    '<td>{{ stock_in.remark or "-" }}</td></tr>{% endfor %}'
+)
+STOCK_IN_ROW_TEMPLATE = (
+    '{% for stock_in in rows %}'
+    '<tr><td>#{{ stock_in.stock_in_id }}</td><td>{{ stock_in.drug_name }}</td><td>{{ stock_in.supplier_name }}</td>'
+    '<td>{{ stock_in.quantity }}</td><td>{{ stock_in.stock_in_date }}</td><td>{{ stock_in.employee_name }}</td>'
+    '<td>{{ stock_in.remark or "-" }}</td></tr>{% endfor %}'
+)
+
+
+def _orm_queries():
+    """原列表路由中的 ORM 查询"""
+    from models import db, Inventory, Sales, StockIn, DrugInfo, CustomerInfo, SupplierInfo, EmployeeInfo, Warehouse
+
+    return {
+        'sales_list': lambda: db.session.query(Sales, DrugInfo.name, CustomerInfo.name, EmployeeInfo.name).
+        join(DrugInfo, Sales.drug_id == DrugInfo.drug_id).
+        join(CustomerInfo, Sales.customer_id == CustomerInfo.customer_id).
+        join(EmployeeInfo, Sales.employee_id == EmployeeInfo.employee_id).
+        order_by(Sales.sales_date.desc()).all(),
+        'stock_list': lambda: db.session.query(Inventory, DrugInfo.name, DrugInfo.unit, Warehouse.name).
+        join(DrugInfo, Inventory.drug_id == DrugInfo.drug_id).
+        join(Warehouse, Inventory.warehouse_id == Warehouse.warehouse_id).all(),
+        'stock_in_list': lambda: db.session.query(StockIn, DrugInfo.name, SupplierInfo.name, EmployeeInfo.name,
+                                                  DrugInfo.purchase_price).
+        join(DrugInfo, StockIn.drug_id == DrugInfo.drug_id).
+        join(SupplierInfo, StockIn.supplier_id == SupplierInfo.supplier_id).
+        join(EmployeeInfo, StockIn.employee_id == EmployeeInfo.employee_id).all(),
+    }
+
+
+def _measure(fetch, template, repeat):
+    """返回 (行数, 查询中位耗时ms, 每行内存字节, 渲染中位耗时ms)"""
+    from models import db
+
+    fetch_times, render_times = [], []
+    rows = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        gc.collect()
+        started = time.perf_counter()
+        rows = fetch()
+        fetch_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        template.render(rows=rows)
+        render_times.append(time.perf_counter() - started)
+
+    # 内存：在空会话上重新取数，统计取数后仍被结果（及会话 identity map）持有的内存
+    db.session.expunge_all()
+    rows = None
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    rows = fetch()
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    count = len(rows)
+    return (count, statistics.median(fetch_times) * 1000, retained / count if count else 0,
+            statistics.median(render_times) * 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比 ORM 实体与列投影读模型的列表取数和渲染开销')
+    parser.add_argument('--database-uri', help='数据库（默认使用 config.Config / DATABASE_URL）')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from services import read_models
+
+    overrides = {'SQLALCHEMY_DATABASE_URI': args.database_uri} if args.database_uri else {}
+    app = create_app(Config, **overrides)
+    cases = {
+        'sales_list': (read_models.sales_rows, SALES_ORM_TEMPLATE, SALES_ROW_TEMPLATE),
+        'stock_list': (read_models.stock_rows, STOCK_ORM_TEMPLATE, STOCK_ROW_TEMPLATE),
+        'stock_in_list': (read_models.stock_in_rows, STOCK_IN_ORM_TEMPLATE, STOCK_IN_ROW_TEMPLATE),
+    }
+    header = f'{"list":<15}{"mode":<12}{"rows":>8}{"fetch_ms":>11}{"bytes/row":>11}{"render_ms":>11}'
+    print(header)
+    print('-' * len(header))
+    with app.app_context():
+        orm_queries = _orm_queries()
+        for name, (projection, orm_source, row_source) in cases.items():
+            for mode, fetch, source in (('orm', orm_queries[name], orm_source),
+                                        ('projection', projection, row_source)):
+                template = app.jinja_env.from_string(source)
+                count, fetch_ms, per_row, render_ms = _measure(fetch, template, args.repeat)
+                print(f'{name:<15}{mode:<12}{count:>8}{fetch_ms:>11.1f}{per_row:>11.0f}{render_ms:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
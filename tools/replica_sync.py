@@ -0,0 +1,44 @@
+"""
+本地只读副本同步（测试读写分离用）
+用 SQLite 在线备份接口把主库复制为副本文件，可按 --interval 循环执行以模拟复制延迟。
+
+用法：
+    python -m tools.replica_sync --source instance/medicine.db --target instance/replica.db
+    python -m tools.replica_sync --source instance/medicine.db --target instance/replica.db --interval 5
+启动应用时指定副本：
+    READ_REPLICA_URLS=sqlite:///instance/replica.db APP_CONFIG=sqlite python app.py
+"""
+import argparse
+import sqlite3
+import time
+
+
+def sync(source, target):
+    """把 source 完整复制到 target（主库可在复制期间继续写入），返回耗时秒数"""
+    started = time.perf_counter()
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把 SQLite 主库复制为本地只读副本')
+    parser.add_argument('--source', required=True, help='主库文件')
+    parser.add_argument('--target', required=True, help='副本文件')
+    parser.add_argument('--interval', type=float, help='循环同步间隔（秒），不指定时只同步一次')
+    args = parser.parse_args(argv)
+
+    while True:
+        print(f'同步完成（{sync(args.source, args.target):.2f}s）')
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+模板字节码缓存预热与对比
+部署后（或 gunicorn 启动前）把 templates/ 下全部模板编译写入 JINJA_BYTECODE_CACHE_DIR，
+新 worker 首次渲染时直接加载字节码；--compare 以全新的 Jinja 环境（模拟新启动的 worker）
+分别测量不使用字节码缓存逐个编译、以及从字节码缓存加载全部模板的耗时。
+
+用法：
+    python -m tools.template_cache
+    python -m tools.template_cache --compare --repeat 5
+"""
+import argparse
+import statistics
+import time
+
+from jinja2 import Environment
+
+
+def _load_all(app, bytecode_cache):
+    """以不共享内存缓存的新环境加载全部模板，返回耗时（秒）"""
+    env = Environment(loader=app.jinja_env.loader, extensions=list(app.jinja_env.extensions),
+                      autoescape=app.jinja_env.autoescape, bytecode_cache=bytecode_cache)
+    started = time.perf_counter()
+    for name in env.list_templates(extensions=('html',)):
+        env.get_template(name)
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='预热模板字节码缓存，并可对比 worker 冷启动编译耗时')
+    parser.add_argument('--compare', action='store_true', help='对比无缓存编译与加载字节码缓存的耗时')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from services.fragment_cache import precompile
+
+    app = create_app(Config)
+    cache = app.jinja_env.bytecode_cache
+    if cache is None:
+        print('未配置 JINJA_BYTECODE_CACHE_DIR，字节码缓存未启用')
+        return
+    count = precompile(app)
+    print(f'已编译 {count} 个模板 -> {app.config["JINJA_BYTECODE_CACHE_DIR"]}')
+    if args.compare:
+        cold = statistics.median(_load_all(app, None) for _ in range(args.repeat))
+        warm = statistics.median(_load_all(app, cache) for _ in range(args.repeat))
+        print(f'无字节码缓存: {cold * 1000:.1f} ms')
+        print(f'字节码缓存:   {warm * 1000:.1f} ms ({cold / warm:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()